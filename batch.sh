@@ -7,8 +7,8 @@ if [[ ${PIPESTATUS[0]} -ne 4 ]]; then
     exit 1
 fi
 
-OPTIONS=j:
-LONGOPTIONS=jobs:
+OPTIONS=j:p:s:
+LONGOPTIONS=jobs:,profile:,socket:
 
 ! PARSED=$(getopt --options=$OPTIONS --longoptions=$LONGOPTIONS --name "$0" -- "$@")
 if [[ ${PIPESTATUS[0]} -ne 0 ]]; then
@@ -18,6 +18,8 @@ fi
 eval set -- "$PARSED"
 
 JOBS=1
+PROFILE_ARGS=()
+SOCKET=""
 
 while true; do
     case "$1" in
@@ -30,6 +32,14 @@ while true; do
             exit 3
         fi
         ;;
+    -p | --profile)
+        PROFILE_ARGS=(--profile "$(realpath "$2")")
+        shift 2
+        ;;
+    -s | --socket)
+        SOCKET="$(realpath "$2")"
+        shift 2
+        ;;
     --)
         shift
         break
@@ -56,11 +66,28 @@ PYTHONPATH="$(cd "$(dirname "${BASH_SOURCE[0]}")" >/dev/null 2>&1 && pwd)"
 echo "Setting PYTHONPATH=${PYTHONPATH}..."
 export PYTHONPATH
 
-blender --background --python "${PYTHONPATH}/scripts/generate.py" -- "${CONFIG_FILE}"
+# Group the stage timings of every Blender process under a single run.
+NATURAL_PROFILE_RUN="$(basename "${CONFIG_FILE}" .json)-$(date +%Y%m%dT%H%M%S)-jobs-${JOBS}"
+export NATURAL_PROFILE_RUN
+
+# Run a script in a new Blender process, or as a job of the worker service started in Blender with
+# `blender --background --python scripts/worker.py -- --socket <socket> --jobs <jobs>`.
+run() {
+    local script="$1"
+    shift
+    if [[ -n $SOCKET ]]; then
+        python3 "${PYTHONPATH}/scripts/submit.py" --socket "$SOCKET" "$script" "$@"
+    else
+        blender --background --python "${PYTHONPATH}/scripts/${script}.py" -- "$@"
+    fi
+}
+
+run generate "${CONFIG_FILE}" --prune ${PROFILE_ARGS[@]+"${PROFILE_ARGS[@]}"}
 
 for ((job = 0; job < JOBS; job++)); do
     echo "Starting job $job..."
-    blender --background --python "${PYTHONPATH}/scripts/render.py" -- "${CONFIG_FILE/.json/-cylinders.json}" --job "$job" --jobs "$JOBS" "${CONFIG_FILE/.json/-job-$job.blend}" >/dev/null &
+    # Discard Blender's chatter on stdout, but keep the rate limited progress reports on stderr.
+    run render "${CONFIG_FILE/.json/-cylinders.json}" --job "$job" --jobs "$JOBS" --partition spatial "${CONFIG_FILE/.json/-job-$job.blend}" ${PROFILE_ARGS[@]+"${PROFILE_ARGS[@]}"} >/dev/null &
 done
 
 echo -n "Waiting for jobs..."
@@ -70,6 +97,6 @@ echo " done."
 CHUNKED_FILES=("${CONFIG_FILE/.json/-job-}"*".blend")
 echo "Joining" "${CHUNKED_FILES[@]}" "..."
 
-blender --background --python "${PYTHONPATH}/scripts/join.py" -- "${CHUNKED_FILES[@]}" "${CONFIG_FILE/.json/.blend}" >/dev/null
+run join "${CHUNKED_FILES[@]}" "${CONFIG_FILE/.json/.blend}" ${PROFILE_ARGS[@]+"${PROFILE_ARGS[@]}"}
 
 echo "Saving result to ${CONFIG_FILE/.json/.blend}..."
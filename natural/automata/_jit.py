@@ -0,0 +1,90 @@
+"""Defer importing numba and compiling kernels until they are first called."""
+import types
+
+# Kernels loop over `prange`, which is swapped for `numba.prange` when compiling them in parallel.
+prange = range
+
+
+class _LazyDispatcher:
+    """A stand-in for a numba dispatcher that is created on the first call."""
+
+    def __init__(self, func, options, name=None, overrides=None):
+        self.func = func
+        self.options = options
+        self.overrides = overrides
+        self.dispatcher = None
+        self.__name__ = func.__name__ if name is None else "{}[{}]".format(func.__name__, name)
+        self.__doc__ = func.__doc__
+
+    def materialize(self):
+        """Jit this function, along with every other lazy kernel in its module.
+
+        The module globals are replaced with the real dispatchers, so that kernels calling each
+        other resolve to compiled functions.
+        """
+        if self.dispatcher is None:
+            _materialize(self.func.__globals__)
+            # Specialized kernels are not module globals, so are compiled separately.
+            if self.dispatcher is None:
+                self.dispatcher = self._compile()
+        return self.dispatcher
+
+    def _compile(self):
+        import numba
+
+        func = self.func
+        overrides = dict(self.overrides or {})
+        if self.options.get("parallel"):
+            overrides["prange"] = numba.prange
+        if overrides:
+            namespace = dict(func.__globals__)
+            for name, value in overrides.items():
+                if isinstance(value, _LazyDispatcher):
+                    value = value.materialize()
+                namespace[name] = value
+            func = types.FunctionType(
+                func.__code__, namespace, func.__name__, func.__defaults__, func.__closure__
+            )
+            # Numba names its cache files after the qualified name, so each copy is cached apart.
+            func.__qualname__ = self.__name__
+        return numba.njit(**self.options)(func)
+
+    def __call__(self, *args):
+        return self.materialize()(*args)
+
+
+def _materialize(module):
+    for name, value in list(module.items()):
+        if isinstance(value, _LazyDispatcher) and value.overrides is None:
+            # Kernels imported from other modules may already have been compiled there.
+            if value.dispatcher is None:
+                value.dispatcher = value._compile()
+            module[name] = value.dispatcher
+
+
+def njit(**options):
+    """Decorate a function to be compiled with `numba.njit(**options)` when it is first called.
+
+    Lazy kernels may call each other, as long as they are module level functions.
+    """
+
+    def decorator(func):
+        return _LazyDispatcher(func, options)
+
+    return decorator
+
+
+def specialize(kernel, name, options=None, **overrides):
+    """Copy a lazy kernel, replacing the functions it calls by the given names.
+
+    Numba compiles the functions a kernel calls into it, so this compiles a separate copy of one
+    generic loop around each function it is given, rather than calling through a pointer.
+
+    :param kernel: The lazy kernel to copy. Keep a reference to it other than its module global,
+        which is replaced once the module is compiled.
+    :param name: A unique name for the copy, which it is cached under.
+    :param options: Options to compile the copy with instead of those of `kernel`, if not None.
+    :param overrides: The module globals to replace in the copy, often other lazy kernels.
+    """
+    options = kernel.options if options is None else {**kernel.options, **options}
+    return _LazyDispatcher(kernel.func, options, name, overrides)
@@ -0,0 +1,67 @@
+"""Track which tiles of an automaton's grid are still changing, so only those need updating.
+
+A tile is active if any of its cells changed by more than `epsilon` in the last step, or if it
+neighbors such a tile, since each cell only depends on the cells next to it. The other tiles are
+skipped and keep their values. With an `epsilon` of zero the skipped cells would not have changed
+anyway, so the result is exactly that of updating every cell.
+"""
+import numpy as np
+
+from ._jit import njit
+
+TILE = 32
+
+
+def check(epsilon, tile):
+    """Ensure the given activity tracking parameters are valid."""
+    if epsilon is not None and epsilon < 0:
+        raise ValueError("The activity epsilon must be non-negative, got {}".format(epsilon))
+    if tile < 1:
+        raise ValueError("The tile size must be positive, got {}".format(tile))
+
+
+def tiles(rows, cols, tile):
+    """Get an array with every tile covering a `rows` x `cols` grid marked active.
+
+    :param rows, cols: The number of cells to cover along each axis
+    :param tile: The number of cells along each side of a tile
+    """
+    return np.ones(((rows + tile - 1) // tile, (cols + tile - 1) // tile), dtype=np.bool_)
+
+
+@njit(cache=True)
+def dilate(changed, active, periodic_rows, periodic_cols):
+    """Mark the tiles that changed, and their eight neighbors, as active.
+
+    :param changed: Positive for the tiles with a cell that changed by more than the epsilon
+        during the last step.
+    :param active: The array to write the tiles to update next step to.
+    :param periodic_rows, periodic_cols: Whether the first and last rows, or columns, of tiles
+        neighbor each other.
+    """
+    rows, cols = changed.shape
+    active[:, :] = False
+    for row in range(rows):
+        for col in range(cols):
+            if changed[row, col] <= 0:
+                continue
+            for r in range(row - 1, row + 2):
+                if periodic_rows:
+                    r %= rows
+                elif not 0 <= r < rows:
+                    continue
+                for c in range(col - 1, col + 2):
+                    if periodic_cols:
+                        c %= cols
+                    elif not 0 <= c < cols:
+                        continue
+                    active[r, c] = True
+
+
+@njit(cache=True)
+def moved(new, old, lo, hi, epsilon):
+    """Check whether any of `new[lo:hi]` differs from `old[lo:hi]` by more than `epsilon`."""
+    for i in range(np.uintp(lo), np.uintp(hi)):
+        if abs(new[i] - old[i]) > epsilon:
+            return True
+    return False
@@ -0,0 +1,168 @@
+"""Save and restore solver state so long runs can be resumed."""
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from natural.progress import crossed
+
+
+def save_checkpoint(path, step, params, rng_state=None, **arrays):
+    """Write the given solver state to a compressed binary file.
+
+    The file is written to a temporary path and atomically moved into place, so an interrupted
+    write never clobbers the previous checkpoint.
+
+    :param path: The checkpoint filename. Should end in '.npz'.
+    :param step: The number of steps the solver has taken.
+    :param params: A JSON serializable dict of the solver parameters.
+    :param rng_state: The legacy NumPy RNG state tuple, as from `np.random.get_state()`.
+    :param arrays: The state arrays to save.
+    """
+    meta = {"step": int(step), "params": params}
+    if rng_state is not None:
+        name, keys, pos, has_gauss, cached_gaussian = rng_state
+        meta["rng"] = {
+            "name": name,
+            "pos": int(pos),
+            "has_gauss": int(has_gauss),
+            "cached_gaussian": float(cached_gaussian),
+        }
+        arrays["rng_keys"] = keys
+
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb") as outfile:
+            np.savez_compressed(outfile, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        # Leave no partial file behind, such as when the disk fills up.
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_checkpoint(path):
+    """Load the solver state written by `save_checkpoint`.
+
+    :param path: The checkpoint filename.
+    :returns: A dict with the 'step', 'params', and 'rng_state' keys, along with each saved array.
+    """
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        state = {name: data[name] for name in data.files if name not in ("meta", "rng_keys")}
+        rng_state = None
+        if "rng" in meta:
+            rng = meta["rng"]
+            rng_state = (
+                rng["name"],
+                data["rng_keys"],
+                rng["pos"],
+                rng["has_gauss"],
+                rng["cached_gaussian"],
+            )
+
+    state["step"] = meta["step"]
+    state["params"] = meta["params"]
+    state["rng_state"] = rng_state
+    return state
+
+
+def check_params(params, expected):
+    """Ensure the parameters a checkpoint was saved with match the requested parameters."""
+    for key, value in expected.items():
+        if key in params and params[key] != value:
+            raise ValueError(
+                "Checkpoint parameter '{}' = {} does not match {}".format(key, params[key], value)
+            )
+
+
+class Checkpointer:
+    """Periodically write solver state to disk from a background thread.
+
+    Calling a Checkpointer from the solver loop only copies the state arrays; the compression and
+    disk writes happen on a worker thread. If the worker falls behind, stale pending checkpoints
+    are replaced by newer ones rather than stalling the solver.
+    """
+
+    def __init__(self, path, every, start=0):
+        """Initialize a Checkpointer.
+
+        :param path: The checkpoint filename to (over)write.
+        :param every: Write a checkpoint every `every` steps.
+        :param start: The step the solver starts from, such as that of the checkpoint it resumes.
+        """
+        if every < 1:
+            raise ValueError("'every' must be a positive number of steps.")
+
+        self.path = path
+        self.every = every
+        self.params = {}
+        self.rng_state = None
+        self._last = start
+        self._error = None
+        self._pending = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            # Keep draining the queue after an error, so the solver never blocks on it.
+            if self._error is None:
+                step, arrays = item
+                try:
+                    save_checkpoint(self.path, step, self.params, self.rng_state, **arrays)
+                except Exception as error:
+                    self._error = error
+
+    def _check(self):
+        if self._error is not None:
+            message = "Failed to write a checkpoint to '{}'".format(self.path)
+            raise RuntimeError(message) from self._error
+
+    def _put(self, item):
+        while True:
+            try:
+                self._pending.put_nowait(item)
+                return
+            except queue.Full:
+                # Drop the stale checkpoint in favor of the newer one.
+                try:
+                    self._pending.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def __call__(self, step, force=False, **arrays):
+        """Checkpoint the given state if `step` reached the next checkpoint interval.
+
+        :param step: The number of steps the solver has taken.
+        :param force: Checkpoint regardless of the interval.
+        :param arrays: The state arrays to save. They are copied before returning.
+        """
+        self._check()
+        due = crossed(self._last, step, self.every)
+        self._last = step
+
+        if force or due:
+            self._put((step, {name: np.array(a, copy=True) for name, a in arrays.items()}))
+
+    def close(self):
+        """Wait for any pending checkpoint to be written and stop the worker thread.
+
+        :raises RuntimeError: If writing a checkpoint failed.
+        """
+        if self._thread.is_alive():
+            self._pending.put(None)
+            self._thread.join()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
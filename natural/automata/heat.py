@@ -1,30 +1,254 @@
-import numba
+import functools
+
 import numpy as np
 
+from ._jit import njit
+from .activity import TILE, check
+from .checkpoint import check_params, load_checkpoint
+from .precision import resolve
+from .stencil import FIXED, NO_FLUX, Stencil
+
+STENCILS = ("von-neumann", "diagonal")
+
+
+def _is_diagonal(stencil):
+    if stencil not in STENCILS:
+        raise ValueError("Unknown stencil '{}', expected one of {}".format(stencil, STENCILS))
+    return stencil == "diagonal"
+
+
+@njit(cache=True)
+def _adjacent(grid, out, row, col, params):
+    """Average the four adjacent neighbors of a cell."""
+    out[0, row, col] = params[0] * (
+        grid[0, row - 1, col]
+        + grid[0, row + 1, col]
+        + grid[0, row, col - 1]
+        + grid[0, row, col + 1]
+    )
+
+
+@njit(cache=True)
+def _diagonal(grid, out, row, col, params):
+    """Average the four diagonal neighbors of a cell."""
+    out[0, row, col] = params[0] * (
+        grid[0, row - 1, col + 1]
+        + grid[0, row - 1, col - 1]
+        + grid[0, row + 1, col + 1]
+        + grid[0, row + 1, col - 1]
+    )
+
+
+# The outer rows and columns of the domain are the halo. The left and right columns are held fixed,
+# and the top and bottom rows have no flux boundary conditions.
+_MODELS = {
+    "von-neumann": Stencil("heat-von-neumann", _adjacent, boundary=(NO_FLUX, FIXED)),
+    "diagonal": Stencil("heat-diagonal", _diagonal, boundary=(NO_FLUX, FIXED)),
+}
+# Each cell is the average of four of its neighbors.
+PARAMS = (0.25,)
+
+
+def step(grid, temp, stencil="von-neumann"):
+    """Perform one time step of a 2D diffusion CA from `grid` into `temp`.
+
+    The left and right columns are held fixed, and the top and bottom rows have no flux boundary
+    conditions. `grid` is left untouched, so callers can swap the two buffers between steps.
+
+    :param grid: The current state.
+    :param temp: The buffer to write the next state to. Its left and right columns must match
+        those of `grid`.
+    :param stencil: Either 'von-neumann' to average the four adjacent neighbors, or 'diagonal' to
+        average the four diagonal neighbors.
+    """
+    _is_diagonal(stencil)
+    _MODELS[stencil].advance(grid[np.newaxis], temp[np.newaxis], 1, PARAMS)
+
+
+def step_n(grid, n, stencil="von-neumann"):
+    """Perform `n` time steps of a 2D diffusion CA in place.
+
+    All `n` steps run in a single compiled kernel that ping-pongs between `grid` and one scratch
+    buffer, so there is at most one copy back into `grid` per call rather than one per step.
+
+    :param grid: The state to advance.
+    :param n: The number of time steps to take.
+    :param stencil: Either 'von-neumann' or 'diagonal'.
+    :returns: `grid`, for convenience.
+    """
+    _is_diagonal(stencil)
+    state = grid[np.newaxis]
+    result = _MODELS[stencil].advance(state, state.copy(), n, PARAMS)
+    if result is not state:
+        grid[:, :] = result[0]
+    return grid
+
+
+@functools.lru_cache(maxsize=8)
+def _eigenvalues(m, n, diagonal):
+    """Get the eigenvalues of the homogeneous update on an m x n interior.
+
+    The no flux rows make the update diagonal in the DCT-II basis along the rows, and the fixed
+    columns make it diagonal in the DST-I basis along the columns.
+    """
+    cy = np.cos(np.pi * np.arange(m) / m)[:, np.newaxis]
+    cx = np.cos(np.pi * np.arange(1, n + 1) / (n + 1))[np.newaxis, :]
+    return cy * cx if diagonal else 0.5 * (cy + cx)
+
+
+def _forward(x):
+    from scipy import fftpack
+
+    return fftpack.dst(fftpack.dct(x, type=2, axis=0), type=1, axis=1)
 
-@numba.njit(cache=True)
-def step(grid, temp):
-    """Perform one time step of a 2D diffusion CA."""
+
+def _inverse(x):
+    from scipy import fftpack
+
+    m, n = x.shape
+    return fftpack.dct(fftpack.dst(x, type=1, axis=1), type=3, axis=0) / (4 * m * (n + 1))
+
+
+def _spectral(grid, t, diagonal):
+    """Compute the state `t` steps after `grid`, or the steady state if `t` is None."""
     rows, cols = grid.shape
-    # Do not update any of the four boundaries.
-    for row in range(1, rows - 1):
-        for col in range(1, cols - 1):
-            left, right = col - 1, col + 1
-            top, bottom = row - 1, row + 1
-            # Perform a four neighbor average.
-            temp[row, col] = (
-                grid[top, right] + grid[top, left] + grid[bottom, right] + grid[bottom, left]
-            ) / 4
-    # Update the values of the top and bottom rows to have no flux boundary conditions.
-    temp[0, :] = temp[1, :]
-    temp[-1, :] = temp[-2, :]
-    grid[:, :] = temp[:, :]
-
-
-def istep(rows, cols, ymin, ymax):
-    domain = np.zeros((rows, cols))
-    domain[:, 0] = np.linspace(ymin, ymax, cols) * (10 - np.linspace(ymin, ymax, rows))
-    temporary = domain.copy()
+    # Take the first step explicitly. Afterwards, the ghost rows mirror their neighbors, including
+    # the corners of the fixed columns, and the update is a linear map with fixed boundary terms.
+    current = step_n(grid.copy(), 1, "diagonal" if diagonal else "von-neumann")
+    if rows < 3 or cols < 3 or t == 1:
+        return current
+
+    m, n = rows - 2, cols - 2
+    left, right = current[:, 0], current[:, -1]
+    # The contribution of the fixed columns to each interior update.
+    boundary = np.zeros((m, n), dtype=grid.dtype)
+    if diagonal:
+        boundary[:, 0] += 0.25 * (left[:-2] + left[2:])
+        boundary[:, -1] += 0.25 * (right[:-2] + right[2:])
+    else:
+        boundary[:, 0] += 0.25 * left[1:-1]
+        boundary[:, -1] += 0.25 * right[1:-1]
+
+    eigenvalues = _eigenvalues(m, n, diagonal)
+    steady = _forward(boundary) / (1 - eigenvalues)
+    if t is None:
+        spectrum = steady
+    else:
+        spectrum = steady + eigenvalues ** (t - 1) * (_forward(current[1:-1, 1:-1]) - steady)
+
+    current[1:-1, 1:-1] = _inverse(spectrum)
+    current[0, :] = current[1, :]
+    current[-1, :] = current[-2, :]
+    return current
+
+
+def fast_forward(grid, t, stencil="von-neumann"):
+    """Compute the state of the 2D diffusion CA `t` time steps after `grid`.
+
+    Rather than stepping `t` times, this diagonalizes the update with fast sine and cosine
+    transforms, so the cost is independent of `t`. The result matches `step_n` up to rounding.
+
+    :param grid: The initial state. Not modified.
+    :param t: The number of time steps to fast forward.
+    :param stencil: Either 'von-neumann' or 'diagonal'.
+    :returns: A new array with the state at time `t`.
+    """
+    diagonal = _is_diagonal(stencil)
+    if t < 1:
+        return grid.copy()
+    return _spectral(grid, t, diagonal)
+
+
+def steady_state(grid, stencil="von-neumann"):
+    """Compute the equilibrium the 2D diffusion CA converges to from `grid`.
+
+    :param grid: The initial state. Only its boundaries affect the result. Not modified.
+    :param stencil: Either 'von-neumann' or 'diagonal'.
+    :returns: A new array with the steady state.
+    """
+    return _spectral(grid, None, _is_diagonal(stencil))
+
+
+def initial(rows, cols, ymin, ymax, dtype=np.float64):
+    """Create the initial diffusion domain, with a heat source along the left boundary."""
+    domain = np.zeros((rows, cols), dtype=dtype)
+    domain[:, 0] = np.linspace(ymin, ymax, rows) * (10 - np.linspace(ymin, ymax, rows))
+    return domain
+
+
+def istep(
+    rows,
+    cols,
+    ymin,
+    ymax,
+    stencil="von-neumann",
+    stride=1,
+    solver="step",
+    checkpoint=None,
+    resume=None,
+    progress=None,
+    dtype=None,
+    epsilon=None,
+    tile=TILE,
+):
+    """Return an infinite iterator over the time steps of the 2D diffusion CA.
+
+    The yielded arrays are read-only views of the solver's internal buffers. They are only valid
+    until the iterator is advanced again; copy them to keep them around.
+
+    :param rows, cols: The domain size.
+    :param ymin, ymax: The domain y boundaries used to initialize the left boundary.
+    :param stencil: Either 'von-neumann' or 'diagonal'.
+    :param stride: The number of time steps to take between each yielded state.
+    :param solver: Either 'step' to repeatedly apply the CA, or 'spectral' to compute each yielded
+        state directly with `fast_forward`. The latter is much faster for large strides.
+    :param checkpoint: A `Checkpointer` to periodically save the domain with, if not None.
+    :param resume: The filename of a checkpoint to resume from, if not None. The iterator
+        continues from the step the checkpoint was saved at.
+    :param progress: A `Progress` to count the time steps with, if not None.
+    :param dtype: The floating point dtype to simulate in. Defaults to that of the checkpoint when
+        resuming, and otherwise to float32 for large domains and float64 for small ones.
+    :param epsilon: If not None, only update the tiles whose cells changed by more than `epsilon`
+        in the last step, and their neighbors. Zero gives exactly the same result as updating every
+        cell, and skips the parts of the domain the heat has not reached yet.
+    :param tile: The number of cells along each side of the tracked tiles.
+    """
+    diagonal = _is_diagonal(stencil)
+    if solver not in ("step", "spectral"):
+        raise ValueError("Unknown solver '{}'".format(solver))
+    check(epsilon, tile)
+    if epsilon is not None and solver == "spectral":
+        raise ValueError("Activity tracking requires the 'step' solver")
+    params = {"rows": rows, "cols": cols, "ymin": ymin, "ymax": ymax, "stencil": stencil}
+    if resume is not None:
+        state = load_checkpoint(resume)
+        check_params(state["params"], params)
+        dtype = resolve(dtype if dtype is not None else state["domain"].dtype, rows * cols)
+        domain, i = state["domain"].astype(dtype, copy=False), state["step"]
+    else:
+        domain = initial(rows, cols, ymin, ymax, resolve(dtype, rows * cols))
+        i = 0
+
+    if checkpoint is not None:
+        checkpoint.params = params
+
+    model = _MODELS[stencil]
+    grid, scratch = domain[np.newaxis], domain.copy()[np.newaxis]
+    active = model.tiles(grid, tile) if epsilon is not None else None
     while True:
-        step(domain, temporary)
-        yield domain
+        if solver == "spectral":
+            grid = _spectral(grid[0], stride, diagonal)[np.newaxis]
+        else:
+            result = model.advance(grid, scratch, stride, PARAMS, active, epsilon or 0, tile)
+            if result is not grid:
+                grid, scratch = scratch, grid
+        domain = grid[0]
+        i += stride
+        if checkpoint is not None:
+            checkpoint(i, domain=domain)
+        if progress is not None:
+            progress.update(stride)
+
+        view = domain.view()
+        view.flags.writeable = False
+        yield view
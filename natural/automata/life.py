@@ -0,0 +1,24 @@
+"""Conway's Game of Life."""
+import numpy as np
+
+from ._jit import njit
+from .stencil import PERIODIC, Stencil
+
+
+@njit(cache=True)
+def _life_cell(grid, out, row, col, params):
+    """Update a cell, which is born with three live neighbors, and survives with two or three."""
+    neighbors = (
+        (grid[0, row - 1, col - 1] + grid[0, row - 1, col] + grid[0, row - 1, col + 1])
+        + (grid[0, row, col - 1] + grid[0, row, col + 1])
+        + (grid[0, row + 1, col - 1] + grid[0, row + 1, col] + grid[0, row + 1, col + 1])
+    )
+    out[0, row, col] = neighbors == 3 or (neighbors == 2 and grid[0, row, col] != 0)
+
+
+LIFE = Stencil("life", _life_cell, boundary=PERIODIC)
+
+
+def random(rows, cols, density=0.5):
+    """Create a state with each cell alive with the given probability."""
+    return LIFE.pad((np.random.random((rows, cols)) < density).astype(np.uint8))
@@ -0,0 +1,22 @@
+"""Choose the floating point precision the automata simulate their grids in."""
+import numpy as np
+
+# Grids with at least this many cells default to single precision. The stencils are limited by
+# memory bandwidth, so halving the size of each cell nearly halves their time as well as memory.
+LARGE = 1 << 20
+DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+
+
+def resolve(dtype, cells):
+    """Get the dtype to simulate a grid with the given number of cells in.
+
+    :param dtype: The requested dtype, or None to use float32 for large grids and float64, which
+        is the reference to validate against, otherwise
+    :param cells: The number of cells in the grid
+    """
+    if dtype is None:
+        return DTYPES[0] if cells >= LARGE else DTYPES[1]
+    dtype = np.dtype(dtype)
+    if dtype not in DTYPES:
+        raise ValueError("Unsupported dtype '{}', expected float32 or float64".format(dtype))
+    return dtype
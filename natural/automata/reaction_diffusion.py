@@ -1,8 +1,17 @@
+import functools
+
 import numpy as np
 import scipy as sp
 
+from ._jit import njit
+from .activity import TILE, check, dilate, moved, tiles
+from .checkpoint import check_params, load_checkpoint
+from .precision import resolve
+from .stencil import NO_FLUX, PERIODIC, Stencil, five_point
+
 
-def laplacian(N):
+@functools.lru_cache(maxsize=2)
+def laplacian(N, dtype=int):
     """Compute a matrix that performs the discretized Laplacian in 2D.
 
     c.f. https://stackoverflow.com/a/34905913
@@ -14,8 +23,13 @@ def laplacian(N):
     SciPy ecosystem.
 
     Note that this matrix will be N**2 x N**2, and operates on the *flattened* vectors u and v.
+    Give it the same `dtype` as those vectors, since SciPy promotes the product to the wider of the
+    two dtypes, so an integer matrix would turn single precision concentrations into doubles.
+
+    The matrix is cached, so that long lived processes only build it once per grid size, and must
+    not be modified.
     """
-    e = np.ones(N ** 2, dtype=int)
+    e = np.ones(N ** 2, dtype=dtype)
     # The upper and lower corners of the L_0 blocks.
     # e2 = np.array(([1] + [0] * (N - 1)) * N)
     # e3 = np.array(([0] * (N - 1) + [1]) * N)
@@ -28,9 +42,13 @@ def laplacian(N):
     )
 
 
-def init(N, scale, r, u0, v0):
-    """Initialize the U, V concentrations."""
-    u, v = np.ones((N, N)), np.zeros((N, N))
+def init(N, scale, r, u0, v0, dtype=np.float64):
+    """Initialize the U, V concentrations.
+
+    The random numbers are drawn in double precision whatever the `dtype`, so that the same seed
+    gives the same initial state in each precision.
+    """
+    u, v = np.ones((N, N), dtype=dtype), np.zeros((N, N), dtype=dtype)
     u += scale * np.random.random((N, N))
     v += scale * np.random.random((N, N))
     c = N // 2
@@ -40,7 +58,128 @@ def init(N, scale, r, u0, v0):
     return u, v
 
 
-def gray_scott(N, iters, ru, rv, f, k, scale, r, u0, v0):
+@njit(cache=True)
+def _laplacian_at(x, i, N, centre, side):
+    """Compute the `i`th element of the product of the scaled `laplacian(N)` with `x`.
+
+    The terms are summed in the order SciPy sums the diagonals of the product, so the result
+    matches it exactly, including the wrapping around the edges of the flattened grid.
+    """
+    n = N * N
+    total = centre * x[i]
+    if i >= 1:
+        total += side * x[i - 1]
+    if i + 1 < n:
+        total += side * x[i + 1]
+    if i >= N:
+        total += side * x[i - N]
+    if i + N < n:
+        total += side * x[i + N]
+    if i >= n - N:
+        total += side * x[i - (n - N)]
+    if i < N:
+        total += side * x[i + (n - N)]
+    return total
+
+
+@njit(cache=True)
+def _react(u, v, nu, nv, i, lu, lv, constants):
+    """Update the concentrations of cell `i`, given the Laplacians of U and V there.
+
+    This performs the same operations as the dense update in `gray_scott` in the same order.
+    """
+    f, fk, one, tiny = constants[4], constants[5], constants[6], constants[7]
+    uvv = u[i] * (v[i] * v[i])
+    nu[i] = u[i] + ((lu - uvv) + f * (one - u[i]))
+    value = v[i] + ((lv + uvv) - fk * v[i])
+    nv[i] = 0 if abs(value) < tiny else value
+
+
+@njit(cache=True)
+def _step_active(u, v, nu, nv, N, tile, active, changed, constants, epsilon):
+    """Perform one iteration of the Gray-Scott model, only updating the active tiles.
+
+    The flattened U and V are read from `u` and `v`, and the next iteration is written to `nu` and
+    `nv`. Afterwards, `active` holds the tiles to update next iteration, and the tiles that went
+    quiescent are copied back into `u` and `v` so that both buffers agree on them.
+
+    :param constants: The U and V Laplacian diagonals, the feed rate, the sum of the feed and kill
+        rates, one, and the magnitude below which V is flushed to zero, all in the grid's dtype.
+    """
+    cu, su, cv, sv = constants[0], constants[1], constants[2], constants[3]
+    tiles_y, tiles_x = active.shape
+    # Unsigned indices spare numba from checking for negative indices, which would keep the
+    # inner loop from being vectorized.
+    one, width = np.uintp(1), np.uintp(N)
+    for tr in range(tiles_y):
+        for tc in range(tiles_x):
+            changed[tr, tc] = 0 if active[tr, tc] else -1
+
+        for row in range(tr * tile, min((tr + 1) * tile, N)):
+            start = 0
+            while start < tiles_x:
+                if not active[tr, start]:
+                    start += 1
+                    continue
+                end = start + 1
+                while end < tiles_x and active[tr, end]:
+                    end += 1
+                lo, hi = row * N + start * tile, row * N + min(end * tile, N)
+                if row == 0 or row == N - 1:
+                    # The first and last rows wrap around to each other.
+                    for i in range(lo, hi):
+                        lu = _laplacian_at(u, i, N, cu, su)
+                        lv = _laplacian_at(v, i, N, cv, sv)
+                        _react(u, v, nu, nv, i, lu, lv, constants)
+                else:
+                    for i in range(np.uintp(lo), np.uintp(hi)):
+                        lu = (
+                            ((cu * u[i] + su * u[i - one]) + su * u[i + one]) + su * u[i - width]
+                        ) + su * u[i + width]
+                        lv = (
+                            ((cv * v[i] + sv * v[i - one]) + sv * v[i + one]) + sv * v[i - width]
+                        ) + sv * v[i + width]
+                        _react(u, v, nu, nv, i, lu, lv, constants)
+                # Only look for a change in each tile until the first one is found.
+                for tc in range(start, end):
+                    if changed[tr, tc] != 0:
+                        continue
+                    lo, hi = row * N + tc * tile, row * N + min((tc + 1) * tile, N)
+                    if moved(nu, u, lo, hi, epsilon) or moved(nv, v, lo, hi, epsilon):
+                        changed[tr, tc] = 1
+                start = end
+
+    # The flattened grid wraps around both horizontally and vertically.
+    dilate(changed, active, True, True)
+    for tr in range(tiles_y):
+        for tc in range(tiles_x):
+            if changed[tr, tc] < 0 or active[tr, tc]:
+                continue
+            for row in range(tr * tile, min((tr + 1) * tile, N)):
+                lo, hi = row * N + tc * tile, row * N + min((tc + 1) * tile, N)
+                u[lo:hi] = nu[lo:hi]
+                v[lo:hi] = nv[lo:hi]
+
+
+def gray_scott(
+    N,
+    iters,
+    ru,
+    rv,
+    f,
+    k,
+    scale,
+    r,
+    u0,
+    v0,
+    checkpoint=None,
+    resume=None,
+    progress=None,
+    dtype=None,
+    epsilon=None,
+    tile=TILE,
+    frames=None,
+):
     """Run the Gray-Scott model with the given parameters.
 
     :param N: The domain size.
@@ -52,16 +191,122 @@ def gray_scott(N, iters, ru, rv, f, k, scale, r, u0, v0):
     :param scale: The scale of the random initialization
     :param r: The size of the center, high concentration, initialization, if not None
     :param u0, v0: The center initial concentrations of U and V
+    :param checkpoint: A `Checkpointer` to periodically save the model state with, if not None
+    :param resume: The filename of a checkpoint to resume the model from, if not None
+    :param progress: A `Progress` to count the iterations with, if not None
+    :param dtype: The floating point dtype to simulate in. Defaults to that of the checkpoint when
+        resuming, and otherwise to float32 for large grids and float64 for small ones
+    :param epsilon: If not None, only update the tiles with a cell whose concentrations changed by
+        more than `epsilon` in the last iteration, and their neighbors. Zero gives exactly the same
+        result as updating every cell, while skipping the quiescent parts of the grid
+    :param tile: The number of cells along each side of the tracked tiles
+    :param frames: A `natural.frames.FrameWriter` to periodically write the U concentration with,
+        if not None
     :returns: a tuple of (u, v) concentration matrices
     """
-    u, v = init(N, scale=scale, r=r, u0=u0, v0=v0)
-    L = laplacian(N)
+    check(epsilon, tile)
+    params = {
+        "N": N,
+        "ru": ru,
+        "rv": rv,
+        "f": f,
+        "k": k,
+        "scale": scale,
+        "r": r,
+        "u0": u0,
+        "v0": v0,
+    }
+    if resume is not None:
+        state = load_checkpoint(resume)
+        check_params(state["params"], params)
+        dtype = resolve(dtype if dtype is not None else state["u"].dtype, N * N)
+        u, v = state["u"].astype(dtype), state["v"].astype(dtype)
+        start = state["step"]
+        rng_state = state["rng_state"]
+    else:
+        rng_state = np.random.get_state()
+        dtype = resolve(dtype, N * N)
+        u, v = init(N, scale=scale, r=r, u0=u0, v0=v0, dtype=dtype)
+        start = 0
+
+    if checkpoint is not None:
+        checkpoint.params = params
+        checkpoint.rng_state = rng_state
+
+    if progress is not None and progress.total is None:
+        progress.total = iters - start
+
     u = u.reshape(N * N)
     v = v.reshape(N * N)
+    # Where V dies out, single precision soon underflows into subnormal numbers, which are far
+    # slower to compute with. Flush them to zero instead.
+    tiny = np.finfo(dtype).tiny if dtype == np.float32 else None
 
-    for _ in range(iters):
-        uvv = u * v ** 2
-        u += ru * L @ u - uvv + f * (1 - u)
-        v += rv * L @ v + uvv - (f + k) * v
+    # The neighbors of the first and last rows are only tracked properly on larger grids.
+    if epsilon is not None and N > 2:
+        active = tiles(N, N, tile)
+        changed = np.empty(active.shape, dtype=np.int8)
+        nu, nv = u.copy(), v.copy()
+        constants = np.array(
+            [*(ru * np.array([-4, 1], dtype)), *(rv * np.array([-4, 1], dtype)), f, f + k, 1, 0],
+            dtype=dtype,
+        )
+        constants[-1] = 0 if tiny is None else tiny
+        threshold = dtype.type(epsilon)
+    else:
+        active = None
+        # Scale the Laplacian once, rather than building a new sparse matrix every iteration.
+        Lu = ru * laplacian(N, dtype)
+        Lv = rv * laplacian(N, dtype)
+
+    for i in range(start, iters):
+        if active is not None:
+            _step_active(u, v, nu, nv, N, tile, active, changed, constants, threshold)
+            u, nu, v, nv = nu, u, nv, v
+        else:
+            uvv = u * v ** 2
+            u += Lu @ u - uvv + f * (1 - u)
+            v += Lv @ v + uvv - (f + k) * v
+            if tiny is not None:
+                v[np.abs(v) < tiny] = 0
+
+        if checkpoint is not None:
+            checkpoint(i + 1, u=u.reshape((N, N)), v=v.reshape((N, N)))
+        if frames is not None:
+            frames(i + 1, u.reshape((N, N)))
+        if progress is not None:
+            progress.update()
 
     return u.reshape((N, N)), v.reshape((N, N))
+
+
+@njit(cache=True)
+def _gray_scott_cell(grid, out, row, col, params):
+    """Update the U and V concentrations of a cell of the Gray-Scott model.
+
+    :param params: The U and V diffusion rates, the feed rate, and the kill rate.
+    """
+    ru, rv, f, k = params[0], params[1], params[2], params[3]
+    u, v = grid[0, row, col], grid[1, row, col]
+    uvv = u * v * v
+    out[0, row, col] = u + ((ru * five_point(grid, 0, row, col) - uvv) + (f - f * u))
+    out[1, row, col] = v + ((rv * five_point(grid, 1, row, col) + uvv) - (f + k) * v)
+
+
+@njit(cache=True)
+def _fitzhugh_nagumo_cell(grid, out, row, col, params):
+    """Update the activator U and inhibitor V of a cell of the FitzHugh-Nagumo model.
+
+    :param params: The U and V diffusion rates, the inhibitor time scale tau, the activator
+        offset k, and the time step.
+    """
+    a, b, tau, k, dt = params[0], params[1], params[2], params[3], params[4]
+    u, v = grid[0, row, col], grid[1, row, col]
+    out[0, row, col] = u + dt * ((a * five_point(grid, 0, row, col) + u - u * u * u) - v + k)
+    out[1, row, col] = v + (dt / tau) * ((b * five_point(grid, 1, row, col) + u) - v)
+
+
+# Unlike `gray_scott`, whose flattened Laplacian joins the end of each row to the start of the
+# next, these wrap around the grid in both directions.
+GRAY_SCOTT = Stencil("gray-scott", _gray_scott_cell, fields=2, boundary=PERIODIC)
+FITZHUGH_NAGUMO = Stencil("fitzhugh-nagumo", _fitzhugh_nagumo_cell, fields=2, boundary=NO_FLUX)
@@ -0,0 +1,269 @@
+"""Declare cellular automata and reaction-diffusion models by how each cell is updated.
+
+A model's state is a (fields, rows, cols) array, with a one cell halo around the cells being
+simulated. A model supplies an `update(grid, out, row, col, params)` kernel that writes the next
+state of the cell at `grid[:, row, col]` to `out[:, row, col]`, reading the cells around it. The
+drivers here loop the update over the grid and fill the halo from the boundary conditions after
+each step. A separate copy of the drivers is compiled around each model's update, so that numba can
+inline and vectorize it, and each copy is cached under the model's name.
+"""
+import numpy as np
+
+from ._jit import njit, prange, specialize
+from .activity import TILE, dilate, moved, tiles
+
+FIXED, NO_FLUX, PERIODIC = "fixed", "no-flux", "periodic"
+BOUNDARIES = (FIXED, NO_FLUX, PERIODIC)
+_CODES = {FIXED: 0, NO_FLUX: 1, PERIODIC: 2}
+_NO_FLUX, _PERIODIC = _CODES[NO_FLUX], _CODES[PERIODIC]
+
+
+# The slot `_sweep` calls the update through. It is not a kernel: `Stencil` compiles a copy of the
+# drivers with the slot replaced by its model's update, so these drivers never run as they are.
+_update = None
+
+
+@njit(cache=True)
+def five_point(grid, field, row, col):
+    """Compute the five point Laplacian of a field at the given cell, in the grid's dtype."""
+    centre = grid[field, row, col]
+    sides = (grid[field, row - 1, col] + grid[field, row + 1, col]) + (
+        grid[field, row, col - 1] + grid[field, row, col + 1]
+    )
+    return sides - ((centre + centre) + (centre + centre))
+
+
+@njit(cache=True)
+def _fill(grid, boundary_rows, boundary_cols):
+    """Fill the halo of the grid from the cells next to it.
+
+    Fixed boundaries are left as they are. The rows are filled after the columns, so they set the
+    corners.
+    """
+    fields, rows, cols = grid.shape
+    for field in range(fields):
+        if boundary_cols == _NO_FLUX:
+            for row in range(1, rows - 1):
+                grid[field, row, 0] = grid[field, row, 1]
+                grid[field, row, cols - 1] = grid[field, row, cols - 2]
+        elif boundary_cols == _PERIODIC:
+            for row in range(1, rows - 1):
+                grid[field, row, 0] = grid[field, row, cols - 2]
+                grid[field, row, cols - 1] = grid[field, row, 1]
+
+        if boundary_rows == _NO_FLUX:
+            grid[field, 0, :] = grid[field, 1, :]
+            grid[field, rows - 1, :] = grid[field, rows - 2, :]
+        elif boundary_rows == _PERIODIC:
+            grid[field, 0, :] = grid[field, rows - 2, :]
+            grid[field, rows - 1, :] = grid[field, 1, :]
+
+
+@njit(cache=True)
+def _halo_changed(grid, out, tile, changed, epsilon):
+    """Mark the tiles next to the halo cells that changed by more than `epsilon` as changed.
+
+    Halo cells can change without the cells next to them, such as the corners of a no flux row
+    mirroring a fixed column.
+    """
+    fields, rows, cols = grid.shape
+    tiles_y, tiles_x = changed.shape
+    for field in range(fields):
+        for col in range(cols):
+            tc = min(max(col - 1, 0) // tile, tiles_x - 1)
+            if abs(out[field, 0, col] - grid[field, 0, col]) > epsilon:
+                changed[0, tc] = 1
+            if abs(out[field, rows - 1, col] - grid[field, rows - 1, col]) > epsilon:
+                changed[tiles_y - 1, tc] = 1
+        for row in range(1, rows - 1):
+            tr = (row - 1) // tile
+            if abs(out[field, row, 0] - grid[field, row, 0]) > epsilon:
+                changed[tr, 0] = 1
+            if abs(out[field, row, cols - 1] - grid[field, row, cols - 1]) > epsilon:
+                changed[tr, tiles_x - 1] = 1
+
+
+@njit(cache=True)
+def _sweep(grid, out, row, lo, hi, params):
+    """Update the cells `lo` to `hi` of a row.
+
+    This is compiled on its own so that its loop is vectorized however the drivers are optimized.
+    Clamping `lo` lets numba prove the columns next to each cell are not negative, so it does not
+    check for negative indices either.
+    """
+    lo = max(lo, 1)
+    for col in range(hi - lo):
+        _update(grid, out, row, lo + col, params)
+
+
+@njit(cache=True)
+def _run(grid, out, n, params, boundary_rows, boundary_cols):
+    """Perform `n` steps, swapping the buffers after each one.
+
+    :returns: Whichever of the two buffers holds the final state.
+    """
+    fields, rows, cols = grid.shape
+    for _ in range(n):
+        for row in prange(1, rows - 1):
+            _sweep(grid, out, row, 1, cols - 1, params)
+        _fill(out, boundary_rows, boundary_cols)
+        grid, out = out, grid
+    return grid
+
+
+@njit(cache=True)
+def _run_tiled(grid, out, n, params, boundary_rows, boundary_cols, tile, active, epsilon):
+    """Perform `n` steps, only updating the tiles that are still changing.
+
+    A tile's cells in both buffers are kept equal while it is inactive, so that either can be
+    skipped. `active` is updated in place, so it can be passed to the next call.
+
+    :returns: Whichever of the two buffers holds the final state.
+    """
+    fields, rows, cols = grid.shape
+    tiles_y, tiles_x = active.shape
+    changed = np.empty(active.shape, dtype=np.int8)
+    for _ in range(n):
+        # Each band of tiles is swept row by row, updating each run of active tiles in one loop.
+        for tr in prange(tiles_y):
+            for tc in range(tiles_x):
+                changed[tr, tc] = 0 if active[tr, tc] else -1
+            for row in range(1 + tr * tile, min(1 + (tr + 1) * tile, rows - 1)):
+                start = 0
+                while start < tiles_x:
+                    if not active[tr, start]:
+                        start += 1
+                        continue
+                    end = start + 1
+                    while end < tiles_x and active[tr, end]:
+                        end += 1
+                    _sweep(grid, out, row, 1 + start * tile, min(1 + end * tile, cols - 1), params)
+                    # Only look for a change in each tile until the first one is found.
+                    for tc in range(start, end):
+                        lo, hi = 1 + tc * tile, min(1 + (tc + 1) * tile, cols - 1)
+                        for field in range(fields):
+                            if changed[tr, tc] == 0 and moved(
+                                out[field, row], grid[field, row], lo, hi, epsilon
+                            ):
+                                changed[tr, tc] = 1
+                    start = end
+
+        _fill(out, boundary_rows, boundary_cols)
+        _halo_changed(grid, out, tile, changed, epsilon)
+        dilate(changed, active, boundary_rows == _PERIODIC, boundary_cols == _PERIODIC)
+        # Copy the final values of the tiles that just went quiescent into the other buffer.
+        for tr in range(tiles_y):
+            r0, r1 = 1 + tr * tile, min(1 + (tr + 1) * tile, rows - 1)
+            for tc in range(tiles_x):
+                if changed[tr, tc] >= 0 and not active[tr, tc]:
+                    c0, c1 = 1 + tc * tile, min(1 + (tc + 1) * tile, cols - 1)
+                    grid[:, r0:r1, c0:c1] = out[:, r0:r1, c0:c1]
+        grid, out = out, grid
+    return grid
+
+
+# Keep the lazy kernels to copy, since their module globals are replaced once they are compiled.
+_KERNELS = (_sweep, _run, _run_tiled)
+
+
+class Stencil:
+    """A model that updates each cell of a grid from the cells within one of it."""
+
+    def __init__(self, name, update, fields=1, boundary=PERIODIC, parallel=False):
+        """Declare a model.
+
+        :param name: A unique name for the model, which its compiled drivers are cached under.
+        :param update: A lazy kernel `update(grid, out, row, col, params)` that writes the next
+            state of the cell `grid[:, row, col]` to `out[:, row, col]`. `params` is an array of
+            the model parameters in the grid's dtype.
+        :param fields: The number of fields the state has, such as the U and V concentrations.
+        :param boundary: One of BOUNDARIES, or a (rows, cols) pair of them. Fixed boundaries
+            keep their halo, no flux boundaries mirror the cells next to them, and periodic
+            boundaries wrap around to the other side of the grid.
+        :param parallel: Whether to update the rows or bands of tiles in parallel threads.
+        """
+        if isinstance(boundary, str):
+            boundary = (boundary, boundary)
+        for condition in boundary:
+            if condition not in BOUNDARIES:
+                raise ValueError(
+                    "Unknown boundary '{}', expected one of {}".format(condition, BOUNDARIES)
+                )
+        self.name = name
+        self.update = update
+        self.fields = fields
+        self.boundary = tuple(boundary)
+        self.parallel = parallel
+        self.codes = tuple(_CODES[condition] for condition in self.boundary)
+
+        sweep, run, run_tiled = _KERNELS
+        sweep = specialize(sweep, name, _update=update)
+        if parallel:
+            name += "-parallel"
+        options = {"parallel": True} if parallel else None
+        self._run = specialize(run, name, options, _sweep=sweep)
+        self._run_tiled = specialize(run_tiled, name, options, _sweep=sweep)
+
+    def pad(self, *fields, value=0):
+        """Create a state from a 2D array for each field, and fill its halo.
+
+        :param fields: The initial values of each field, all of the same shape.
+        :param value: The value to hold the fixed boundaries at.
+        """
+        if len(fields) != self.fields:
+            raise ValueError("Expected {} fields, got {}".format(self.fields, len(fields)))
+        rows, cols = np.shape(fields[0])
+        grid = np.full((self.fields, rows + 2, cols + 2), value, dtype=np.result_type(*fields))
+        grid[:, 1:-1, 1:-1] = fields
+        _fill(grid, *self.codes)
+        return grid
+
+    def advance(self, grid, out, n, params=(), active=None, epsilon=0, tile=TILE):
+        """Perform `n` steps of the model, swapping `grid` and `out` after each one.
+
+        The halo of `grid` is used as it is for the first step.
+
+        :param grid: The current state.
+        :param out: A buffer for the next state. Its fixed boundaries must match those of `grid`.
+        :param n: The number of steps to take.
+        :param params: The model parameters, which are converted to the grid's dtype.
+        :param active: If not None, the tiles from `tiles` to update, which is updated to the
+            tiles that are still changing afterwards.
+        :param epsilon: The largest change that leaves a tile quiescent. Zero gives the same
+            result as updating every cell.
+        :param tile: The number of cells along each side of the tiles in `active`.
+        :returns: Whichever of the two buffers holds the final state.
+        """
+        params = np.asarray(params, dtype=grid.dtype)
+        if active is None or active.size == 0:
+            return self._run(grid, out, n, params, *self.codes)
+        threshold = grid.dtype.type(epsilon)
+        return self._run_tiled(grid, out, n, params, *self.codes, tile, active, threshold)
+
+    def tiles(self, grid, tile=TILE):
+        """Get an array with every tile covering the cells of the grid marked active."""
+        _, rows, cols = grid.shape
+        return tiles(rows - 2, cols - 2, tile)
+
+    def iterate(self, grid, params=(), stride=1, epsilon=None, tile=TILE):
+        """Return an infinite iterator over the states of the model.
+
+        The yielded arrays are read-only views of the internal buffers. They are only valid until
+        the iterator is advanced again; copy them to keep them around.
+
+        :param grid: The initial state, such as from `pad`. Not modified.
+        :param params: The model parameters.
+        :param stride: The number of steps to take between each yielded state.
+        :param epsilon: If not None, only update the tiles that changed by more than `epsilon` in
+            the last step, and their neighbors.
+        :param tile: The number of cells along each side of the tracked tiles.
+        """
+        grid, out = grid.copy(), grid.copy()
+        active = self.tiles(grid, tile) if epsilon is not None else None
+        while True:
+            result = self.advance(grid, out, stride, params, active, epsilon or 0, tile)
+            if result is not grid:
+                grid, out = out, grid
+            view = grid.view()
+            view.flags.writeable = False
+            yield view
@@ -0,0 +1,248 @@
+"""Render simulation states to animation frames, and write them out from a background thread.
+
+Plotting each frame with matplotlib costs far more than stepping the simulations, so frames are
+mapped straight to RGB through a colormap lookup table, and written as numbered PNG images or
+piped into an ffmpeg process while the solver keeps stepping.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import numpy as np
+
+from natural.image import colormap, to_uint8, write_png
+from natural.progress import crossed
+
+
+class Renderer:
+    """Map 2D arrays to 8 bit RGB images through a precomputed colormap lookup table."""
+
+    def __init__(self, cmap="jet", vmin=None, vmax=None, scale=1, n=256):
+        """Initialize a Renderer.
+
+        :param cmap: The colormap name, as accepted by `natural.image.colormap`
+        :param vmin, vmax: The values mapped to the first and last colors. Those left as None are
+            set from the extremes of the first frame, so the colors do not flicker between frames.
+        :param scale: Repeat each cell this many times along each axis, for small grids.
+        :param n: The number of colors in the lookup table
+        """
+        if scale < 1:
+            raise ValueError("The frame scale must be a positive integer, got {}".format(scale))
+        self.lut = to_uint8(colormap(cmap, n))
+        self.vmin = vmin
+        self.vmax = vmax
+        self.scale = int(scale)
+
+    def __call__(self, values):
+        """Render the given array.
+
+        :param values: A 2D array
+        :returns: A (rows * scale, cols * scale, 3) array of 8 bit RGB colors
+        """
+        values = np.asarray(values)
+        if self.vmin is None:
+            self.vmin = float(np.nanmin(values))
+        if self.vmax is None:
+            self.vmax = float(np.nanmax(values))
+
+        n = len(self.lut)
+        span = self.vmax - self.vmin
+        # Single precision is plenty to pick one of a few hundred colors, and halves the traffic.
+        index = np.subtract(values, self.vmin, dtype=np.float32)
+        index *= (n - 1) / span if span > 0 else 0.0
+        # Casting NaN to an integer is undefined, so draw any NaN with the first color.
+        np.nan_to_num(index, copy=False, nan=0.0, posinf=n - 1, neginf=0.0)
+        np.clip(index, 0, n - 1, out=index)
+        image = self.lut[index.astype(np.intp)]
+
+        if self.scale > 1:
+            image = np.repeat(np.repeat(image, self.scale, axis=0), self.scale, axis=1)
+        return image
+
+
+class PNGSequence:
+    """Write frames as numbered PNG images to a directory."""
+
+    def __init__(self, directory, pattern="frame-{:05d}.png"):
+        """Initialize a PNGSequence, creating the directory if need be.
+
+        :param directory: The directory to write the frames to
+        :param pattern: The filename of each frame, formatted with the frame number
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.pattern = pattern
+        self.count = 0
+
+    def write(self, frame):
+        write_png(os.path.join(self.directory, self.pattern.format(self.count)), frame)
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class FFmpegPipe:
+    """Encode frames to a video by piping them to ffmpeg as raw RGB."""
+
+    def __init__(self, filename, fps=30, codec="libx264", ffmpeg="ffmpeg"):
+        """Initialize an FFmpegPipe. The encoder is started once the first frame's size is known.
+
+        :param filename: The video file to write, whose extension picks the container format
+        :param fps: The number of frames per second
+        :param codec: The ffmpeg video codec to encode with
+        :param ffmpeg: The ffmpeg executable
+        """
+        self.executable = shutil.which(ffmpeg)
+        if self.executable is None:
+            raise RuntimeError("Could not find '{}' to encode videos with".format(ffmpeg))
+        self.filename = filename
+        self.fps = fps
+        self.codec = codec
+        self.count = 0
+        self._process = None
+
+    def _start(self, height, width):
+        command = [
+            self.executable,
+            "-loglevel",
+            "error",
+            "-y",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "rgb24",
+            "-s",
+            "{}x{}".format(width, height),
+            "-r",
+            str(self.fps),
+            "-i",
+            "-",
+            "-c:v",
+            self.codec,
+            # Most players require the chroma subsampled format, which requires an even size.
+            "-pix_fmt",
+            "yuv420p",
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            self.filename,
+        ]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.shape = (height, width, 3)
+
+    def write(self, frame):
+        if self._process is None:
+            self._start(*frame.shape[:2])
+        if frame.shape != self.shape:
+            raise ValueError("Expected a {} frame, got {}".format(self.shape, frame.shape))
+        self._process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        self.count += 1
+
+    def close(self):
+        if self._process is None:
+            return
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise RuntimeError(
+                "ffmpeg exited with status {} encoding '{}'".format(
+                    self._process.returncode, self.filename
+                )
+            )
+
+
+class FrameWriter:
+    """Periodically render and write the simulation state from a background thread.
+
+    Calling a FrameWriter from the solver loop only copies the state; the rendering and encoding
+    happen on a worker thread. Unlike checkpoints, no frame is dropped, so the solver waits if the
+    worker falls more than a few frames behind.
+    """
+
+    def __init__(self, sink, renderer, every=1, pending=8, start=0):
+        """Initialize a FrameWriter.
+
+        :param sink: A `PNGSequence` or `FFmpegPipe` to write the rendered frames to.
+        :param renderer: A `Renderer` to map each state to a frame.
+        :param every: Write a frame every `every` steps.
+        :param pending: The number of copied states that may wait to be rendered.
+        :param start: The step the solver starts from, such as that of the checkpoint it resumes.
+        """
+        if every < 1:
+            raise ValueError("'every' must be a positive number of steps.")
+
+        self.sink = sink
+        self.renderer = renderer
+        self.every = every
+        self._last = start
+        self._error = None
+        self._pending = queue.Queue(maxsize=pending)
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self):
+        while True:
+            values = self._pending.get()
+            if values is None:
+                break
+            # Keep draining the queue after an error, so the solver never blocks on it.
+            if self._error is None:
+                try:
+                    self.sink.write(self.renderer(values))
+                except Exception as error:
+                    self._error = error
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError("Failed to write a frame") from self._error
+
+    def __call__(self, step, values, force=False):
+        """Write a frame of the given state if `step` reached the next frame interval.
+
+        :param step: The number of steps the solver has taken.
+        :param values: The 2D array to render. It is copied before returning.
+        :param force: Write a frame regardless of the interval.
+        """
+        self._check()
+        due = crossed(self._last, step, self.every)
+        self._last = step
+
+        if force or due:
+            self._pending.put(np.array(values, copy=True))
+
+    def close(self):
+        """Wait for the pending frames to be written, and finish the output."""
+        if self._thread.is_alive():
+            self._pending.put(None)
+            self._thread.join()
+            self.sink.close()
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def frame_writer(frames=None, video=None, fps=30, every=1, start=0, **kwargs):
+    """Create a `FrameWriter` for the given script options, if either output was requested.
+
+    :param frames: The directory to write PNG frames to, if not None
+    :param video: The video file to encode the frames to, if not None
+    :param fps: The video frame rate
+    :param every: Write a frame every `every` steps
+    :param start: The step the solver starts from
+    :param kwargs: Passed to `Renderer`
+    :returns: A `FrameWriter`, or None if neither `frames` nor `video` were given
+    """
+    if frames is not None and video is not None:
+        raise ValueError("Write either PNG frames or a video, not both")
+    if frames is not None:
+        sink = PNGSequence(frames)
+    elif video is not None:
+        sink = FFmpegPipe(video, fps)
+    else:
+        return None
+    return FrameWriter(sink, Renderer(**kwargs), every, start=start)
@@ -0,0 +1,121 @@
+"""Map arrays to colors and write images with NumPy alone, without matplotlib."""
+import struct
+import zlib
+
+import numpy as np
+
+# The (position, r, g, b) control points of the matplotlib "jet" colormap.
+_JET = np.array(
+    [
+        (0.0, 0.0, 0.0, 0.5),
+        (0.11, 0.0, 0.0, 1.0),
+        (0.125, 0.0, 0.0, 1.0),
+        (0.34, 0.0, 0.86, 1.0),
+        (0.35, 0.0, 0.9, 1.0),
+        (0.375, 0.0, 1.0, 0.9),
+        (0.64, 0.9, 1.0, 0.0),
+        (0.65, 0.9, 1.0, 0.0),
+        (0.66, 1.0, 0.9, 0.0),
+        (0.89, 1.0, 0.0, 0.0),
+        (0.91, 0.9, 0.0, 0.0),
+        (1.0, 0.5, 0.0, 0.0),
+    ]
+)
+
+
+def cubehelix(n=256, start=0.0, rot=0.4, gamma=1.0, hue=0.8, light=0.85, dark=0.1, reverse=True):
+    """Build a cubehelix colormap lookup table, with seaborn's `cubehelix_palette` defaults.
+
+    c.f. Green, D. A., 2011, Bulletin of the Astronomical Society of India, 39, 289
+
+    :returns: An (n, 3) array of RGB colors in [0, 1]
+    """
+    x = np.linspace(light, dark, n) if not reverse else np.linspace(dark, light, n)
+    xg = x ** gamma
+    a = hue * xg * (1 - xg) / 2
+    phi = 2 * np.pi * (start / 3 + rot * x)
+    lut = np.empty((n, 3))
+    for i, (p0, p1) in enumerate(((-0.14861, 1.78277), (-0.29227, -0.90649), (1.97294, 0.0))):
+        lut[:, i] = xg + a * (p0 * np.cos(phi) + p1 * np.sin(phi))
+    return np.clip(lut, 0, 1)
+
+
+def colormap(name, n=256):
+    """Get the lookup table for a named colormap.
+
+    :param name: One of 'cubehelix', 'jet', or 'gray'
+    :param n: The number of colors in the lookup table
+    :returns: An (n, 3) array of RGB colors in [0, 1]
+    """
+    if name == "cubehelix":
+        return cubehelix(n)
+    x = np.linspace(0, 1, n)
+    if name == "jet":
+        return np.stack([np.interp(x, _JET[:, 0], _JET[:, i]) for i in (1, 2, 3)], axis=-1)
+    if name == "gray":
+        return np.stack([x, x, x], axis=-1)
+    raise ValueError("Unknown colormap '{}'".format(name))
+
+
+def apply_colormap(values, lut, vmin=None, vmax=None):
+    """Map the given values to colors through a colormap lookup table.
+
+    :param values: An array of values
+    :param lut: An (n, 3) lookup table, as from `colormap`
+    :param vmin, vmax: The values mapped to the first and last colors, defaulting to the extremes
+    :returns: An array of RGB colors in [0, 1] with an extra trailing axis
+    """
+    vmin = np.nanmin(values) if vmin is None else vmin
+    vmax = np.nanmax(values) if vmax is None else vmax
+    n = len(lut)
+    scale = (n - 1) / (vmax - vmin) if vmax > vmin else 0.0
+    index = np.clip((values - vmin) * scale, 0, n - 1).astype(np.intp)
+    return lut[index]
+
+
+def to_uint8(image):
+    """Convert an image with values in [0, 1] to 8 bit integers."""
+    return (np.clip(image, 0, 1) * 255 + 0.5).astype(np.uint8)
+
+
+def write_png(filename, image):
+    """Write a grayscale, RGB, or RGBA image to a PNG file.
+
+    :param filename: The file to write
+    :param image: A (height, width), (height, width, 3), or (height, width, 4) array. Floating
+        point images are assumed to be in [0, 1].
+    """
+    image = np.asarray(image)
+    if image.dtype != np.uint8:
+        image = to_uint8(image)
+
+    if image.ndim == 2:
+        color_type = 0
+        image = image[..., np.newaxis]
+    elif image.shape[-1] == 3:
+        color_type = 2
+    elif image.shape[-1] == 4:
+        color_type = 6
+    else:
+        raise ValueError("Images must be grayscale, RGB, or RGBA.")
+
+    height, width, _ = image.shape
+    # Prefix each scanline with the 'None' filter type.
+    raw = np.zeros((height, 1 + width * image.shape[-1]), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, -1)
+
+    def chunk(kind, data):
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    with open(filename, "wb") as outfile:
+        outfile.write(b"\x89PNG\r\n\x1a\n")
+        outfile.write(
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        )
+        outfile.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        outfile.write(chunk(b"IEND", b""))
@@ -1,3 +1,5 @@
 """Create random fractal landscapes."""
-from .random_displacement import rand_displacement_1d, rand_displacement_2d
+from .random_displacement import diamond_square, rand_displacement_1d, rand_displacement_2d
+from .tiled import TiledLandscape
+from .batch import generate_batch, igenerate_batch
 from .plotting import plot_displacement_1d, plot_displacement_2d
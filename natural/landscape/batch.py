@@ -0,0 +1,130 @@
+import collections
+import concurrent.futures
+import functools
+import itertools
+import os
+
+import numpy as np
+
+from natural.progress import Progress
+
+from .random_displacement import rand_displacement_1d, rand_displacement_2d, squares
+
+
+def _generate(params, job, one, algorithm, wrap, queue):
+    """Generate a single heightmap. Module level so the process pool can pickle it.
+
+    :param job: The index of the heightmap, which identifies its progress
+    :param queue: The queue of a `Monitor` to forward the subdivided squares to, if not None
+    """
+    if one:
+        return rand_displacement_1d(**params)
+    if queue is None:
+        return rand_displacement_2d(**params, algorithm=algorithm, wrap=wrap)
+    with Progress(squares(params["recursions"]), queue=queue, job=job) as progress:
+        return rand_displacement_2d(**params, algorithm=algorithm, wrap=wrap, progress=progress)
+
+
+def _counted(heightmaps, progress):
+    """Count each heightmap with the given `Progress` as it is yielded, if it is not None."""
+    for heightmap in heightmaps:
+        if progress is not None:
+            progress.update()
+        yield heightmap
+
+
+def _ordered(pool, worker, params, window):
+    """Run the worker on each of the params in the pool, yielding the results in order.
+
+    Unlike `Executor.map`, at most `window` heightmaps are queued or kept waiting to be yielded,
+    so one slow heightmap does not leave the rest of the batch finished in memory.
+    """
+    pending = collections.deque()
+    try:
+        for job, p in enumerate(params):
+            pending.append(pool.submit(worker, p, job))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Skip the heightmaps that were never started if the caller stops early.
+        for future in pending:
+            future.cancel()
+
+
+def igenerate_batch(
+    params, one=False, algorithm="midpoint", wrap=False, jobs=None, progress=None, monitor=None
+):
+    """Generate many heightmaps across a pool of processes, yielding them in order.
+
+    Every heightmap draws from its own RandomState seeded with its 'seed' parameter, so the results
+    do not depend on the number of jobs or the order the heightmaps are generated in.
+
+    :param params: An iterable of dicts with 'recursions', 'scale', 'seed', and optionally 'hurst'
+        keys, as passed to `rand_displacement_1d` or `rand_displacement_2d`
+    :param one: Whether to generate 1D heightmaps, defaults to False
+    :param algorithm: The 2D algorithm to use, defaults to 'midpoint'
+    :param wrap: Whether to make tileable 2D heightmaps, defaults to False
+    :param jobs: The number of processes to use, defaults to the number of CPUs. If 1, generate
+        the heightmaps in this process. Up to twice as many heightmaps are held in memory at once.
+    :param progress: A `Progress` to count the generated heightmaps with, if not None
+    :param monitor: A `Monitor` to forward the squares subdivided while generating each 2D
+        heightmap to, if not None. Unless `jobs` is 1, its queue must be a
+        `multiprocessing.Manager().Queue()`, which the worker processes can share
+    """
+    queue = monitor.queue if monitor is not None else None
+    worker = functools.partial(_generate, one=one, algorithm=algorithm, wrap=wrap, queue=queue)
+    if jobs == 1:
+        yield from _counted(map(worker, params, itertools.count()), progress)
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from _counted(_ordered(pool, worker, params, 2 * jobs), progress)
+
+
+def generate_batch(
+    params,
+    one=False,
+    algorithm="midpoint",
+    wrap=False,
+    jobs=None,
+    filename=None,
+    progress=None,
+    monitor=None,
+):
+    """Generate many heightmaps across a pool of processes.
+
+    :param params: A sequence of heightmap parameter dicts. See `igenerate_batch`
+    :param one: Whether to generate 1D heightmaps, defaults to False
+    :param algorithm: The 2D algorithm to use, defaults to 'midpoint'
+    :param wrap: Whether to make tileable 2D heightmaps, defaults to False
+    :param jobs: The number of processes to use, defaults to the number of CPUs
+    :param filename: If not None, stream the heightmaps into a memory-mapped .npy file as they are
+        generated rather than holding them in memory. Every heightmap must have the same size.
+    :param progress: A `Progress` to count the generated heightmaps with, if not None
+    :param monitor: A `Monitor` to forward the progress within each heightmap to, if not None. See
+        `igenerate_batch`
+    :returns: The heightmaps stacked along a new first axis
+    """
+    params = list(params)
+    if not params:
+        raise ValueError("At least one set of parameters is required.")
+    if len({p["recursions"] for p in params}) > 1:
+        raise ValueError("Every heightmap must have the same number of recursions to be stacked.")
+
+    N = 2 ** params[0]["recursions"] + 1
+    shape = (len(params), N) if one else (len(params), N, N)
+    if filename is not None:
+        out = np.lib.format.open_memmap(filename, mode="w+", dtype=np.float64, shape=shape)
+    else:
+        out = np.empty(shape)
+
+    heightmaps = igenerate_batch(params, one, algorithm, wrap, jobs, progress, monitor)
+    for i, heightmap in enumerate(heightmaps):
+        out[i] = heightmap
+
+    if filename is not None:
+        out.flush()
+    return out
@@ -0,0 +1,47 @@
+import numpy as np
+
+from natural.mesh import write_mesh
+
+from .raster import decimate
+
+
+def triangulate(Z, size=10.0, resolution=None, sealevel=None):
+    """Triangulate a 2D heightmap into a regular grid of triangles.
+
+    :param Z: The 2D heightmap
+    :param size: The width of the square the heightmap spans, defaults to 10 to match the plots
+    :param resolution: Decimate the heightmap to at most this many cells per side, if not None
+    :param sealevel: Clamp heights below the sea level up to it, if not None
+    :returns: A tuple of an (n, 3) float32 vertex array and an (m, 3) uint32 face array
+    """
+    if resolution is not None:
+        Z = decimate(Z, resolution)
+    if sealevel is not None:
+        Z = np.maximum(Z, sealevel)
+
+    rows, cols = Z.shape
+    y, x = np.meshgrid(
+        np.linspace(0, size, rows, dtype=np.float32),
+        np.linspace(0, size, cols, dtype=np.float32),
+        indexing="ij",
+    )
+    vertices = np.stack([x, y, Z.astype(np.float32)], axis=-1).reshape(-1, 3)
+
+    # Split each grid cell into two counterclockwise triangles, so the normals face up.
+    index = np.arange(rows * cols, dtype=np.uint32).reshape(rows, cols)
+    a, b = index[:-1, :-1], index[:-1, 1:]
+    c, d = index[1:, :-1], index[1:, 1:]
+    faces = np.stack([np.stack([a, b, d], axis=-1), np.stack([a, d, c], axis=-1)], axis=-2)
+    faces = faces.reshape(-1, 3)
+    return vertices, faces
+
+
+def save_mesh(filename, Z, size=10.0, resolution=None, sealevel=None):
+    """Triangulate a heightmap and write it to a PLY, STL, or OBJ file.
+
+    :param filename: The file to write. The format is picked from the extension
+    :param Z: The 2D heightmap
+    :param size, resolution, sealevel: See `triangulate`
+    """
+    vertices, faces = triangulate(Z, size=size, resolution=resolution, sealevel=sealevel)
+    write_mesh(filename, vertices, faces)
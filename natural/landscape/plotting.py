@@ -1,7 +1,8 @@
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-from mpl_toolkits.mplot3d import Axes3D
+
+from natural.plotting import configure
+
+from .raster import decimate
 
 
 def __check_1d_args(xs, label):
@@ -35,6 +36,9 @@ def plot_displacement_1d(xs, labels=None, title=None, filename=None, gui=False):
     :param filename: The filename to save the plot to, defaults to None
     :param gui: Whether to open a GUI window with the plot, defaults to False
     """
+    configure()
+    import matplotlib.pyplot as plt
+
     plt.clf()
 
     single = __check_1d_args(xs, labels)
@@ -69,15 +73,25 @@ def plot_displacement_1d(xs, labels=None, title=None, filename=None, gui=False):
         plt.show()
 
 
-def plot_displacement_2d(Z, title=None, filename=None, gui=False):
+def plot_displacement_2d(Z, title=None, filename=None, gui=False, resolution=None):
     """Plot the given 2D fractal heightmap.
 
     :param Z: The 2D heightmap to plot
     :param filename: The filename to save the plot to, defaults to None
     :param gui: Whether to open a GUI window with the plot, defaults to False
+    :param resolution: Decimate the heightmap to at most this many cells per side before
+        plotting, if not None. Defaults to plotting the full heightmap.
     """
+    configure()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from mpl_toolkits.mplot3d import Axes3D
+
     plt.clf()
 
+    if resolution is not None:
+        Z = decimate(Z, resolution)
+
     nx, ny = Z.shape
     X, Y = np.meshgrid(np.linspace(0, 10, nx), np.linspace(0, 10, ny))
     floor = Z.min()
@@ -1,65 +1,260 @@
+import functools
+
 import numpy as np
 
+# The number of quadtree levels to displace at once with array operations. The levels above this
+# are visited one square at a time, which bounds the memory used by the temporary arrays.
+VECTORIZED_LEVELS = 10
+
+
+def _random_state(seed):
+    """Get a RandomState for the given seed, without touching the global RNG."""
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+
+def squares(recursions):
+    """Count the squares the 2D algorithms subdivide, which they report their progress in."""
+    return (4 ** recursions - 1) // 3
+
+
+def _deviations(recursions, scale, hurst):
+    """Calculate the diminishing standard deviation of the displacement at each level."""
+    return [
+        np.sqrt((scale ** 2 / (2 ** (2 * l * hurst))) * (1 - 2 ** (2 * hurst - 2)))
+        for l in range(recursions)
+    ]
+
 
 # TODO: Allow initialization of array?
 def rand_displacement_1d(recursions, scale, seed, hurst=0.5):
     """Generate a 1D heightmap using the random midpoint displacement algorithm.
 
+    Each level of subdivision is displaced at once with strided slices. The random draws are made
+    in one batch and permuted into the depth-first order a recursive implementation would draw
+    them in, so a given seed always produces the same heightmap.
+
     :param recursions: The number of recursive subdivisions to make
     :param scale: The vertical scale of the generated landscape
-    :param seed: The random seed to use
+    :param seed: The random seed to use, or a np.random.RandomState to draw from
     :param hurst: The Hurst roughness exponent, defaults to 0.5
     :returns: A 1D array of heights
     """
-    np.random.seed(seed)
+    rng = _random_state(seed)
     N = 2 ** recursions
     x = np.zeros(N + 1)
-    x[0], x[N] = scale * np.random.randn(2)
+    x[0], x[N] = scale * rng.randn(2)
+    var = _deviations(recursions, scale, hurst)
+    noise = rng.randn(N - 1)
 
-    # Calculate the diminishing variance.
-    var = [
-        np.sqrt((scale ** 2 / (2 ** (2 * l * hurst))) * (1 - 2 ** (2 * hurst - 2)))
-        for l in range(recursions)
-    ]
+    for level in range(1, recursions + 1):
+        k = 2 ** (level - 1)
+        h = N // k
+        # Find the depth-first index of each midpoint on this level.
+        p = np.arange(k)
+        order = np.full(k, level - 1, dtype=np.int64)
+        for j in range(1, level):
+            order += ((p >> (level - 1 - j)) & 1) * (2 ** (recursions - j) - 1)
 
-    def _recurse(t0, t2, level):
-        """Recursively subdivide and perturb the midpoint with diminishing variance.
+        x[h // 2 :: h] = 0.5 * (x[0:N:h] + x[h::h]) + var[level - 1] * noise[order]
 
-        :param t0: The left endpoint
-        :param t2: The right endpoint
-        :param level: The recursive level
-        """
-        # NOTE: t1 will always be an integer because N is a power of 2.
-        t1 = (t0 + t2) // 2
-        x[t1] = 0.5 * (x[t0] + x[t2]) + var[level - 1] * np.random.randn()
+    return x
 
-        if level < recursions:
-            _recurse(t0, t1, level + 1)
-            _recurse(t1, t2, level + 1)
 
-    _recurse(0, N, 1)
-    return x
+@functools.lru_cache(maxsize=4)
+def _quadtree_layout(levels):
+    """Find the depth-first visit order of each square in a quadtree with the given depth.
+
+    Squares are subdivided into their top left, bottom left, bottom right, and top right children,
+    in that order.
+
+    :returns: A list with a (2**d, 2**d) array of visit indices for each depth d.
+    """
+    sizes = [(4 ** (levels - j) - 1) // 3 for j in range(levels + 1)]
+    layout = []
+    for d in range(levels):
+        k = 2 ** d
+        rows, cols = np.arange(k)[:, np.newaxis], np.arange(k)[np.newaxis, :]
+        order = np.zeros((k, k), dtype=np.int64)
+        for j in range(1, d + 1):
+            rbit = (rows >> (d - j)) & 1
+            cbit = (cols >> (d - j)) & 1
+            child = np.where(rbit == 0, 3 * cbit, 1 + cbit)
+            order += 1 + child * sizes[j]
+        layout.append(order)
+    return layout
+
+
+def _interleave(c0, c1, c2, c3):
+    """Lay out the given per-child arrays in the positions of each square's four children."""
+    k = c0.shape[0]
+    out = np.empty((2 * k, 2 * k))
+    out[0::2, 0::2] = c0
+    out[1::2, 0::2] = c1
+    out[1::2, 1::2] = c2
+    out[0::2, 1::2] = c3
+    return out
+
+
+def _displace_square(X, x0, y0, size, var, noise):
+    """Recursively displace the given square level by level with array operations.
+
+    Squares sharing an edge each displace its midpoint, and the square visited last in depth-first
+    order overwrites the other. However, each square's children always use the values their parent
+    computed, so the corners are tracked per square rather than read back from `X`.
+
+    :param X: The heightmap to fill in
+    :param x0, y0: The upper left corner of the square
+    :param size: The width of the square. Must be a power of two
+    :param var: The standard deviation at each level, starting with this square's
+    :param noise: The square's random draws, in depth-first order
+    """
+    V = X[x0 : x0 + size + 1, y0 : y0 + size + 1]
+    noise = noise.reshape(-1, 5)
+    c00, c02 = V[:1, :1], V[:1, -1:]
+    c20, c22 = V[-1:, :1], V[-1:, -1:]
+
+    layout = _quadtree_layout(size.bit_length() - 1)
+    for d, order in enumerate(layout):
+        k = 2 ** d
+        h = size // k
+        half = h // 2
+        z = var[d] * noise[order]
+
+        top = 0.5 * (c00 + c02) + z[..., 0]
+        left = 0.5 * (c00 + c20) + z[..., 1]
+        bottom = 0.5 * (c20 + c22) + z[..., 2]
+        right = 0.5 * (c02 + c22) + z[..., 3]
+        center = 0.25 * (top + left + bottom + right) + z[..., 4]
+
+        # Resolve the shared edges in favor of whichever square was visited last.
+        H = np.empty((k + 1, k))
+        H[0], H[-1] = top[0], bottom[-1]
+        H[1:-1] = np.where(order[:-1, :] > order[1:, :], bottom[:-1, :], top[1:, :])
+        W = np.empty((k, k + 1))
+        W[:, 0], W[:, -1] = left[:, 0], right[:, -1]
+        W[:, 1:-1] = np.where(order[:, :-1] > order[:, 1:], right[:, :-1], left[:, 1:])
+
+        V[0::h, half::h] = H
+        V[half::h, 0::h] = W
+        V[half::h, half::h] = center
+
+        if d + 1 < len(layout):
+            c00, c02, c20, c22 = (
+                _interleave(c00, left, center, top),
+                _interleave(top, center, right, c02),
+                _interleave(left, c20, bottom, center),
+                _interleave(center, bottom, c22, right),
+            )
+
+
+def diamond_square(recursions, scale, seed, hurst=0.5, wrap=False, progress=None):
+    """Generate a 2D heightmap using the diamond-square algorithm.
+
+    Unlike `rand_displacement_2d`, every point is displaced exactly once. Each level first displaces
+    the square centers from their four corners (the diamond step), and then the edge midpoints from
+    their two corners and two adjacent centers (the square step). Every step of each level draws its
+    random numbers in one batch.
+
+    :param recursions: The number of recursive subdivisions to make
+    :param scale: The vertical scale of the generated landscape
+    :param seed: The random seed to use, or a np.random.RandomState to draw from
+    :param hurst: The Hurst roughness exponent, defaults to 0.5
+    :param wrap: Whether to wrap the boundaries around to make a tileable heightmap. If so, the last
+        row and column duplicate the first, so tile with `X[:-1, :-1]`
+    :param progress: A `Progress` to count the subdivided squares with, if not None
+    :returns: A 2D square matrix of heights
+    """
+    rng = _random_state(seed)
+    N = 2 ** recursions
+    X = np.zeros((N + 1, N + 1))
+    if wrap:
+        X[0, 0] = X[0, -1] = X[-1, 0] = X[-1, -1] = scale * rng.randn()
+    else:
+        X[0, 0], X[0, -1], X[-1, 0], X[-1, -1] = scale * rng.randn(4)
+    var = _deviations(recursions, scale, hurst)
+
+    for level in range(1, recursions + 1):
+        k = 2 ** (level - 1)
+        h = N // k
+        half = h // 2
+        # The square step points are spaced closer by a factor of sqrt(2).
+        diamond_sd = var[level - 1]
+        square_sd = diamond_sd * 2 ** (-hurst / 2)
+
+        # The diamond step.
+        C = 0.25 * (X[0:-1:h, 0:-1:h] + X[0:-1:h, h::h] + X[h::h, 0:-1:h] + X[h::h, h::h])
+        C += diamond_sd * rng.randn(k, k)
+        X[half::h, half::h] = C
+
+        # The square step, for the midpoints of the horizontal and then vertical edges.
+        if wrap:
+            H = X[0:-1:h, 0:-1:h] + X[0:-1:h, h::h] + C + np.roll(C, 1, axis=0)
+            H = 0.25 * H + square_sd * rng.randn(k, k)
+            X[0:-1:h, half::h] = H
+            X[-1, half::h] = H[0]
+
+            W = X[0:-1:h, 0:-1:h] + X[h::h, 0:-1:h] + C + np.roll(C, 1, axis=1)
+            W = 0.25 * W + square_sd * rng.randn(k, k)
+            X[half::h, 0:-1:h] = W
+            X[half::h, -1] = W[:, 0]
+        else:
+            H = X[0::h, 0:-1:h] + X[0::h, h::h]
+            H[:-1] += C
+            H[1:] += C
+            count = np.full((k + 1, 1), 4.0)
+            count[0] = count[-1] = 3.0
+            X[0::h, half::h] = H / count + square_sd * rng.randn(k + 1, k)
+
+            W = X[0:-1:h, 0::h] + X[h::h, 0::h]
+            W[:, :-1] += C
+            W[:, 1:] += C
+            count = np.full((1, k + 1), 4.0)
+            count[:, 0] = count[:, -1] = 3.0
+            X[half::h, 0::h] = W / count + square_sd * rng.randn(k, k + 1)
+
+        if progress is not None:
+            progress.update(k * k)
+
+    return X
 
 
 # TODO: Allow initialization of array?
-def rand_displacement_2d(recursions, scale, seed, hurst=0.5):
+def rand_displacement_2d(
+    recursions, scale, seed, hurst=0.5, algorithm="midpoint", wrap=False, progress=None
+):
     """Generate a 2D heightmap using the random midpoint displacement algorithm.
 
+    The bottom `VECTORIZED_LEVELS` levels of each square are displaced at once with array
+    operations, drawing each square's random numbers in one batch. The draws are consumed in the
+    same depth-first order as a recursive implementation, so a given seed always produces the same
+    heightmap.
+
     :param recursions: The number of recursive subdivisions to make
     :param scale: The vertical scale of the generated landscape
-    :param seed: The random seed to use
+    :param seed: The random seed to use, or a np.random.RandomState to draw from
     :param hurst: The Hurst roughness exponent, defaults to 0.5
+    :param algorithm: Either 'midpoint' or 'diamond-square', defaults to 'midpoint'. The latter
+        delegates to `diamond_square`
+    :param wrap: Whether to make a tileable heightmap. Only supported by 'diamond-square'
+    :param progress: A `Progress` to count the subdivided squares with, if not None. There are
+        `squares(recursions)` of them
     :returns: A 2D square matrix of heights
     """
-    np.random.seed(seed)
+    if algorithm == "diamond-square":
+        return diamond_square(recursions, scale, seed, hurst, wrap=wrap, progress=progress)
+    if algorithm != "midpoint":
+        raise ValueError("Unknown algorithm '{}'".format(algorithm))
+    if wrap:
+        raise ValueError("Only the 'diamond-square' algorithm supports wrapping.")
+
+    rng = _random_state(seed)
     N = 2 ** recursions
     X = np.zeros((N + 1, N + 1))
     # Initialize the four corners to get started.
-    X[0, 0], X[0, -1], X[-1, 0], X[-1, -1] = scale * np.random.randn(4)
-    var = [
-        np.sqrt((scale ** 2 / (2 ** (2 * l * hurst))) * (1 - 2 ** (2 * hurst - 2)))
-        for l in range(recursions)
-    ]
+    X[0, 0], X[0, -1], X[-1, 0], X[-1, -1] = scale * rng.randn(4)
+    var = _deviations(recursions, scale, hurst)
 
     def _recurse(x0, y0, x2, y2, level):
         """Recursively quadsect and perturb the five midpoints with diminishing variance.
@@ -68,25 +263,31 @@ def rand_displacement_2d(recursions, scale, seed, hurst=0.5):
         :param x2, y2: The coordinates of the lower right corner to subdivide
         :param level: The recursive level
         """
+        levels = recursions - level + 1
+        if levels <= VECTORIZED_LEVELS:
+            noise = rng.randn(5 * squares(levels))
+            _displace_square(X, x0, y0, x2 - x0, var[level - 1 :], noise)
+            if progress is not None:
+                progress.update(squares(levels))
+            return
+
         x1 = (x0 + x2) // 2
         y1 = (y0 + y2) // 2
+        z = var[level - 1] * rng.randn(5)
+        if progress is not None:
+            progress.update()
 
-        # TODO: Do this if they're unset to allow initialization.
-        X[x0, y1] = 0.5 * (X[x0, y0] + X[x0, y2]) + var[level - 1] * np.random.randn()
-        X[x1, y0] = 0.5 * (X[x0, y0] + X[x2, y0]) + var[level - 1] * np.random.randn()
-        X[x2, y1] = 0.5 * (X[x2, y0] + X[x2, y2]) + var[level - 1] * np.random.randn()
-        X[x1, y2] = 0.5 * (X[x0, y2] + X[x2, y2]) + var[level - 1] * np.random.randn()
-
-        X[x1, y1] = (
-            0.25 * (X[x0, y1] + X[x1, y0] + X[x2, y1] + X[x1, y2])
-            + var[level - 1] * np.random.randn()
-        )
+        X[x0, y1] = 0.5 * (X[x0, y0] + X[x0, y2]) + z[0]
+        X[x1, y0] = 0.5 * (X[x0, y0] + X[x2, y0]) + z[1]
+        X[x2, y1] = 0.5 * (X[x2, y0] + X[x2, y2]) + z[2]
+        X[x1, y2] = 0.5 * (X[x0, y2] + X[x2, y2]) + z[3]
+        X[x1, y1] = 0.25 * (X[x0, y1] + X[x1, y0] + X[x2, y1] + X[x1, y2]) + z[4]
 
-        if level < recursions:
-            _recurse(x0, y0, x1, y1, level + 1)
-            _recurse(x1, y0, x2, y1, level + 1)
-            _recurse(x1, y1, x2, y2, level + 1)
-            _recurse(x0, y1, x1, y2, level + 1)
+        _recurse(x0, y0, x1, y1, level + 1)
+        _recurse(x1, y0, x2, y1, level + 1)
+        _recurse(x1, y1, x2, y2, level + 1)
+        _recurse(x0, y1, x1, y2, level + 1)
 
-    _recurse(0, 0, N, N, 1)
+    if recursions > 0:
+        _recurse(0, 0, N, N, 1)
     return X
@@ -0,0 +1,73 @@
+import numpy as np
+
+from natural.image import apply_colormap, colormap, write_png
+
+
+def decimate(Z, resolution):
+    """Subsample a heightmap so neither side has more than `resolution` cells between its points.
+
+    The stride is the smallest power of two that does so, so the corners of 2**n + 1 point
+    heightmaps are always kept, and a resolution of 256 decimates them to 257 points per side.
+
+    :param Z: The 1D or 2D heightmap to decimate
+    :param resolution: The maximum number of cells per side
+    :returns: A strided view of the heightmap
+    """
+    stride = 1
+    while (max(Z.shape) - 1) // stride > max(resolution, 1):
+        stride *= 2
+    return Z[tuple(slice(None, None, stride) for _ in Z.shape)]
+
+
+def hillshade(Z, azimuth=315, altitude=45, spacing=1.0):
+    """Compute the Lambertian shading of a heightmap lit by a distant light.
+
+    :param Z: The 2D heightmap
+    :param azimuth: The compass direction of the light, in degrees
+    :param altitude: The angle of the light above the horizon, in degrees
+    :param spacing: The horizontal distance between adjacent points
+    :returns: An array of intensities in [0, 1] with the same shape as `Z`
+    """
+    dzdy, dzdx = np.gradient(Z, spacing)
+    azimuth, altitude = np.radians(azimuth), np.radians(altitude)
+    light = (
+        np.cos(altitude) * np.sin(azimuth),
+        -np.cos(altitude) * np.cos(azimuth),
+        np.sin(altitude),
+    )
+    shade = (-dzdx * light[0] - dzdy * light[1] + light[2]) / np.sqrt(1 + dzdx ** 2 + dzdy ** 2)
+    return np.clip(shade, 0, 1)
+
+
+def render_heightmap(
+    Z, resolution=None, cmap="cubehelix", shade=True, azimuth=315, altitude=45, ambient=0.35
+):
+    """Render a heightmap as a colormapped, optionally hillshaded, RGB image.
+
+    :param Z: The 2D heightmap
+    :param resolution: Decimate the heightmap to at most this many cells per side, if not None
+    :param cmap: The colormap name, as accepted by `natural.image.colormap`
+    :param shade: Whether to hillshade the image
+    :param azimuth, altitude: The direction of the light, in degrees
+    :param ambient: The fraction of the light that is unaffected by the shading
+    :returns: A (height, width, 3) array of RGB colors in [0, 1]
+    """
+    if resolution is not None:
+        Z = decimate(Z, resolution)
+
+    image = apply_colormap(Z, colormap(cmap))
+    if shade:
+        # Scale the spacing so the relief looks the same regardless of the resolution.
+        intensity = hillshade(Z, azimuth, altitude, spacing=10 / (Z.shape[0] - 1))
+        image *= ambient + (1 - ambient) * intensity[..., np.newaxis]
+    return image
+
+
+def save_heightmap(filename, Z, **kwargs):
+    """Render a heightmap to a PNG file without matplotlib.
+
+    :param filename: The PNG file to write
+    :param Z: The 2D heightmap
+    :param kwargs: Passed to `render_heightmap`
+    """
+    write_png(filename, render_heightmap(Z, **kwargs))
@@ -0,0 +1,135 @@
+import numpy as np
+
+from .random_displacement import _deviations, rand_displacement_2d
+
+
+def _displace_edge(x, var, rng):
+    """Displace the interior of a 1D profile with fixed endpoints, one level at a time."""
+    N = len(x) - 1
+    for level, sd in enumerate(var, 1):
+        k = 2 ** (level - 1)
+        h = N // k
+        x[h // 2 :: h] = 0.5 * (x[0:N:h] + x[h::h]) + sd * rng.randn(k)
+
+
+def _displace_interior(X, var, rng):
+    """Displace the interior of a 2D heightmap with fixed boundaries, one level at a time.
+
+    Every interior point is displaced exactly once, so squares sharing an edge agree on it.
+    """
+    N = X.shape[0] - 1
+    for level, sd in enumerate(var, 1):
+        k = 2 ** (level - 1)
+        h = N // k
+        half = h // 2
+        # The boundary edge midpoints are given, so only displace the interior edges.
+        if k > 1:
+            X[h:-1:h, half::h] = 0.5 * (X[h:-1:h, 0:-1:h] + X[h:-1:h, h::h]) + sd * rng.randn(
+                k - 1, k
+            )
+            X[half::h, h:-1:h] = 0.5 * (X[0:-1:h, h:-1:h] + X[h::h, h:-1:h]) + sd * rng.randn(
+                k, k - 1
+            )
+        X[half::h, half::h] = 0.25 * (
+            X[0:-1:h, half::h] + X[h::h, half::h] + X[half::h, 0:-1:h] + X[half::h, h::h]
+        ) + sd * rng.randn(k, k)
+
+
+class TiledLandscape:
+    """Generate a 2D random midpoint displacement heightmap one tile at a time.
+
+    The tile corners come from a coarse heightmap with one point per tile. Each tile edge is then
+    displaced as a 1D profile seeded by the edge's position, so the two tiles sharing an edge always
+    agree on it, and finally each tile's interior is displaced with a seed from the tile's position.
+    Any tile can therefore be generated on demand, independently of the rest of the heightmap.
+    """
+
+    _HORIZONTAL, _VERTICAL, _INTERIOR = range(3)
+
+    def __init__(self, recursions, scale, seed, hurst=0.5, tile_recursions=8):
+        """Initialize a TiledLandscape.
+
+        :param recursions: The number of recursive subdivisions of the whole heightmap
+        :param scale: The vertical scale of the generated landscape
+        :param seed: The integer random seed to use
+        :param hurst: The Hurst roughness exponent, defaults to 0.5
+        :param tile_recursions: The number of subdivisions within each tile, defaults to 8
+        """
+        if not 0 < tile_recursions <= recursions:
+            raise ValueError("'tile_recursions' must be between 1 and 'recursions'.")
+
+        self.seed = seed
+        self.tile_size = 2 ** tile_recursions
+        self.tiles = 2 ** (recursions - tile_recursions)
+        self.size = self.tiles * self.tile_size + 1
+        self._var = _deviations(recursions, scale, hurst)[recursions - tile_recursions :]
+        self.corners = rand_displacement_2d(recursions - tile_recursions, scale, seed, hurst)
+
+    def _rng(self, kind, row, col):
+        return np.random.RandomState([self.seed, kind, row, col])
+
+    def _edge(self, kind, row, col):
+        """Generate the edge starting at the given tile corner, going right or down."""
+        x = np.zeros(self.tile_size + 1)
+        x[0] = self.corners[row, col]
+        x[-1] = self.corners[(row, col + 1) if kind == self._HORIZONTAL else (row + 1, col)]
+        _displace_edge(x, self._var, self._rng(kind, row, col))
+        return x
+
+    def tile(self, row, col):
+        """Generate the tile in the given row and column.
+
+        Adjacent tiles share their boundary rows and columns.
+
+        :returns: A (tile_size + 1, tile_size + 1) array of heights
+        """
+        if not (0 <= row < self.tiles and 0 <= col < self.tiles):
+            raise IndexError("Tile ({}, {}) is out of bounds.".format(row, col))
+
+        X = np.zeros((self.tile_size + 1, self.tile_size + 1))
+        X[0, :] = self._edge(self._HORIZONTAL, row, col)
+        X[-1, :] = self._edge(self._HORIZONTAL, row + 1, col)
+        X[:, 0] = self._edge(self._VERTICAL, row, col)
+        X[:, -1] = self._edge(self._VERTICAL, row, col + 1)
+        _displace_interior(X, self._var, self._rng(self._INTERIOR, row, col))
+        return X
+
+    def window(self, row0, row1, col0, col1, out=None):
+        """Generate the heights in `[row0, row1) x [col0, col1)`, one overlapping tile at a time.
+
+        :param out: The array to write the window to, if not None
+        :returns: A (row1 - row0, col1 - col0) array of heights
+        """
+        if not (0 <= row0 < row1 <= self.size and 0 <= col0 < col1 <= self.size):
+            raise IndexError("The window is out of bounds.")
+
+        if out is None:
+            out = np.empty((row1 - row0, col1 - col0))
+
+        T = self.tile_size
+        # Tiles overlap on their boundaries, so the last row and column belong to the last tile.
+        for row in range(row0 // T, min((row1 - 1) // T, self.tiles - 1) + 1):
+            for col in range(col0 // T, min((col1 - 1) // T, self.tiles - 1) + 1):
+                r0, r1 = max(row0, row * T), min(row1, (row + 1) * T + 1)
+                c0, c1 = max(col0, col * T), min(col1, (col + 1) * T + 1)
+                tile = self.tile(row, col)
+                out[r0 - row0 : r1 - row0, c0 - col0 : c1 - col0] = tile[
+                    r0 - row * T : r1 - row * T, c0 - col * T : c1 - col * T
+                ]
+        return out
+
+    def save(self, filename):
+        """Generate every tile into a memory-mapped .npy file, without holding the whole map.
+
+        :param filename: The .npy file to write
+        :returns: The memory-mapped heightmap
+        """
+        X = np.lib.format.open_memmap(
+            filename, mode="w+", dtype=np.float64, shape=(self.size, self.size)
+        )
+        T = self.tile_size
+        for row in range(self.tiles):
+            for col in range(self.tiles):
+                X[row * T : (row + 1) * T + 1, col * T : (col + 1) * T + 1] = self.tile(row, col)
+            X.flush()
+        return X
@@ -1,3 +1,3 @@
-"""Implements 3D Lindenmayer systems in Blender."""
+"""Implements 3D Lindenmayer systems, drawn in Blender or rendered headlessly."""
 from .grammar import Grammar
 from .graphics import Graphics
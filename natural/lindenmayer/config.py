@@ -0,0 +1,53 @@
+"""Build L-systems from the JSON configurations in data/, and load the cylinders they generate."""
+import itertools
+import json
+
+from .grammar import Grammar
+from .graphics import Graphics
+from .instancing import flatten
+
+
+def graphics_from_config(config):
+    """Create the `Graphics` that interprets the given configuration's L-strings."""
+    return Graphics(
+        unit=config["unit"],
+        angle=config["angle"],
+        radius=config["radius"],
+        proportion=config["proportion"],
+        randomness=config["randomness"],
+        pipe=config.get("pipe"),
+        taper=config.get("taper"),
+    )
+
+
+def expand(config):
+    """Apply the configuration's rules to its axiom for its number of iterations.
+
+    :returns: The final L-string, skipping all the intermediate forms.
+    """
+    lstrings = Grammar(config["rules"]).iapply(config["axiom"])
+    return next(itertools.islice(lstrings, config["iterations"], config["iterations"] + 1))
+
+
+def cylinders_from_config(config, progress=None):
+    """Compute the cylinders for the given L-system configuration.
+
+    :param config: The configuration, as loaded from one of the JSON files in data/
+    :param progress: A `natural.progress.Progress` to count the interpreted commands with
+    """
+    return graphics_from_config(config).compute(expand(config), progress)
+
+
+def load_cylinders(filename):
+    """Load the cylinders of a configuration, or of the cylinders or instances generate.py dumps.
+
+    :param filename: The JSON file to load
+    :returns: A list of cylinders, as from `Graphics.compute`
+    """
+    with open(filename, "r") as infile:
+        data = json.load(infile)
+    if isinstance(data, list):
+        return data
+    if "prototypes" in data:
+        return flatten(data)
+    return cylinders_from_config(data)
@@ -0,0 +1,216 @@
+"""Export Lindenmayer cylinders as triangle meshes with NumPy alone, without Blender."""
+import json
+import os
+import struct
+
+import numpy as np
+
+from natural.mesh import write_mesh, write_ply
+
+from .raster import MATERIALS
+
+
+def frames(starts, ends):
+    """Get an orthonormal frame around the axis of each cylinder.
+
+    :param starts, ends: The (n, 3) end points of each cylinder
+    :returns: A tuple of the (n, 3) unit axes and two (n, 3) unit vectors perpendicular to them,
+        such that u x v = axis
+    """
+    axis = ends - starts
+    length = np.linalg.norm(axis, axis=1, keepdims=True)
+    axis = np.where(length > 0, axis / np.where(length > 0, length, 1), (0.0, 0.0, 1.0))
+    # Cross with the coordinate axis least parallel to the cylinder, to stay well conditioned.
+    helper = np.zeros_like(axis)
+    helper[np.arange(len(axis)), np.argmin(np.abs(axis), axis=1)] = 1
+    u = np.cross(axis, helper)
+    u /= np.linalg.norm(u, axis=1, keepdims=True)
+    v = np.cross(axis, u)
+    return axis, u, v
+
+
+def cylinder_mesh(starts, ends, radii, sides=8, caps=True):
+    """Build the triangle mesh of many cylinders at once.
+
+    Each cylinder is a ring of vertices around each end, with smooth radial normals. The caps are
+    triangle fans over the ring vertices, so they add no vertices.
+
+    :param starts, ends: The (n, 3) end points of each cylinder
+    :param radii: The (n,) radius of each cylinder
+    :param sides: The number of vertices around each ring
+    :param caps: Whether to close the ends of the cylinders
+    :returns: A tuple of (2 * n * sides, 3) float32 vertices and normals, and (m, 3) uint32 faces
+    """
+    n = len(starts)
+    axis, u, v = frames(np.asarray(starts, dtype=float), np.asarray(ends, dtype=float))
+    theta = 2 * np.pi * np.arange(sides) / sides
+    # The (n, sides, 3) outward unit normals around each cylinder.
+    normals = (
+        np.cos(theta)[:, np.newaxis] * u[:, np.newaxis, :]
+        + np.sin(theta)[:, np.newaxis] * v[:, np.newaxis, :]
+    )
+    offsets = np.asarray(radii, dtype=float)[:, np.newaxis, np.newaxis] * normals
+    vertices = np.stack(
+        [starts[:, np.newaxis, :] + offsets, ends[:, np.newaxis, :] + offsets], axis=1
+    )
+    normals = np.broadcast_to(normals[:, np.newaxis], vertices.shape)
+
+    # The local indices of the bottom and top rings, with the faces counterclockwise from outside.
+    i = np.arange(sides)
+    j = (i + 1) % sides
+    bottom, top = i, sides + i
+    local = [
+        np.stack([bottom, bottom[j], top[j]], axis=-1),
+        np.stack([bottom, top[j], top], axis=-1),
+    ]
+    if caps:
+        fan = np.arange(1, sides - 1)
+        local.append(np.stack([np.zeros_like(fan), fan + 1, fan], axis=-1))
+        local.append(np.stack([np.full_like(fan, sides), sides + fan, sides + fan + 1], axis=-1))
+    local = np.concatenate(local)
+
+    base = 2 * sides * np.arange(n, dtype=np.uint32)
+    faces = local.astype(np.uint32)[np.newaxis] + base[:, np.newaxis, np.newaxis]
+    return (
+        vertices.reshape(-1, 3).astype(np.float32),
+        normals.reshape(-1, 3).astype(np.float32),
+        faces.reshape(-1, 3),
+    )
+
+
+def groups(cylinders, sides=8, caps=True):
+    """Build one mesh per material.
+
+    :param cylinders: A list of cylinders, as from `Graphics.compute`
+    :param sides, caps: See `cylinder_mesh`
+    :returns: A list of (material, (r, g, b), vertices, normals, faces) tuples
+    """
+    starts = np.array([c["from"] for c in cylinders], dtype=float).reshape(-1, 3)
+    ends = np.array([c["to"] for c in cylinders], dtype=float).reshape(-1, 3)
+    radii = np.array([c["radius"] for c in cylinders], dtype=float)
+    materials = np.array([c["material"] for c in cylinders])
+
+    meshes = []
+    for material in np.unique(materials):
+        selected = materials == material
+        meshes.append(
+            (str(material), MATERIALS.get(material, (0.5, 0.5, 0.5)))
+            + cylinder_mesh(starts[selected], ends[selected], radii[selected], sides, caps)
+        )
+    return meshes
+
+
+def write_glb(filename, meshes):
+    """Write meshes to a binary glTF file, as one primitive per material.
+
+    glTF is Y up, so the scene is rotated from Blender's Z up convention like Blender's own
+    exporter does.
+
+    :param filename: The .glb file to write
+    :param meshes: A list of (material, (r, g, b), vertices, normals, faces) tuples
+    :raises ValueError: If the meshes have no faces, since a glTF buffer can not be empty.
+    """
+    if not any(len(faces) for *_, faces in meshes):
+        raise ValueError("No faces to write to '{}'".format(filename))
+    gltf = {
+        "asset": {"version": "2.0", "generator": "natural.lindenmayer.export"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "rotation": [-np.sqrt(0.5), 0.0, 0.0, np.sqrt(0.5)]}],
+        "meshes": [{"primitives": []}],
+        "materials": [],
+        "accessors": [],
+        "bufferViews": [],
+        "buffers": [],
+    }
+    blobs = []
+    offset = 0
+
+    def add(array, target, component, kind, bounds=False):
+        nonlocal offset
+        data = np.ascontiguousarray(array).tobytes()
+        gltf["bufferViews"].append(
+            {"buffer": 0, "byteOffset": offset, "byteLength": len(data), "target": target}
+        )
+        accessor = {
+            "bufferView": len(gltf["bufferViews"]) - 1,
+            "componentType": component,
+            "count": len(array) if kind != "SCALAR" else array.size,
+            "type": kind,
+        }
+        if bounds:
+            accessor["min"] = array.min(axis=0).tolist()
+            accessor["max"] = array.max(axis=0).tolist()
+        gltf["accessors"].append(accessor)
+        # Keep every buffer view four byte aligned.
+        padding = -len(data) % 4
+        blobs.append(data + b"\0" * padding)
+        offset += len(data) + padding
+        return len(gltf["accessors"]) - 1
+
+    for material, color, vertices, normals, faces in meshes:
+        if not len(faces):
+            continue
+        gltf["materials"].append(
+            {
+                "name": material,
+                "pbrMetallicRoughness": {
+                    "baseColorFactor": list(color) + [1.0],
+                    "metallicFactor": 0.0,
+                    "roughnessFactor": 1.0,
+                },
+            }
+        )
+        gltf["meshes"][0]["primitives"].append(
+            {
+                "attributes": {
+                    "POSITION": add(vertices.astype("<f4"), 34962, 5126, "VEC3", bounds=True),
+                    "NORMAL": add(normals.astype("<f4"), 34962, 5126, "VEC3"),
+                },
+                "indices": add(faces.astype("<u4"), 34963, 5125, "SCALAR"),
+                "material": len(gltf["materials"]) - 1,
+            }
+        )
+    gltf["buffers"].append({"byteLength": offset})
+
+    header = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+    with open(filename, "wb") as outfile:
+        outfile.write(struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(header) + 8 + offset))
+        outfile.write(struct.pack("<I4s", len(header), b"JSON"))
+        outfile.write(header)
+        outfile.write(struct.pack("<I4s", offset, b"BIN\0"))
+        for blob in blobs:
+            outfile.write(blob)
+
+
+def export(cylinders, filename, sides=8, caps=True):
+    """Export cylinders to a mesh file, picking the format from the filename's extension.
+
+    Binary glTF files get a primitive per material, and PLY files get per vertex colors. STL and
+    OBJ files have no materials.
+
+    :param cylinders: A list of cylinders, as from `Graphics.compute`
+    :param filename: The .glb, .ply, .stl, or .obj file to write
+    :param sides, caps: See `cylinder_mesh`
+    """
+    meshes = groups(cylinders, sides, caps)
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".glb":
+        write_glb(filename, meshes)
+        return
+
+    # The other formats take a single mesh, so renumber each group's faces after the previous ones.
+    counts = np.cumsum([0] + [len(mesh[2]) for mesh in meshes[:-1]])
+    vertices = np.concatenate([mesh[2] for mesh in meshes] or [np.empty((0, 3), np.float32)])
+    faces = np.concatenate(
+        [mesh[4] + np.uint32(count) for mesh, count in zip(meshes, counts)]
+        or [np.empty((0, 3), np.uint32)]
+    )
+    if extension == ".ply":
+        colors = np.concatenate(
+            [np.tile(mesh[1], (len(mesh[2]), 1)) for mesh in meshes] or [np.empty((0, 3))]
+        )
+        write_ply(filename, vertices, faces, colors=colors)
+    else:
+        write_mesh(filename, vertices, faces)
@@ -41,3 +41,27 @@ class Grammar:
         while True:
             axiom = self.apply(axiom)
             yield axiom
+
+    def iexpand(self, axiom, iterations):
+        """Iterate over the symbols of the axiom with the rules applied `iterations` times.
+
+        The symbols are expanded depth first, so only one production per iteration is held at a
+        time instead of the whole string.
+        """
+        self.__check_text_symbols(axiom)
+        checked = set()
+        # The productions being expanded, with the position and iterations left of each.
+        stack = [(axiom, 0, iterations)]
+        while stack:
+            text, position, depth = stack.pop()
+            for i in range(position, len(text)):
+                symbol = text[i]
+                if depth > 0 and symbol in self.productions:
+                    production = self.productions[symbol]
+                    if symbol not in checked:
+                        self.__check_text_symbols(production)
+                        checked.add(symbol)
+                    stack.append((text, i + 1, depth))
+                    stack.append((production, 0, depth - 1))
+                    break
+                yield symbol
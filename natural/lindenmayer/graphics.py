@@ -2,9 +2,10 @@ import json
 
 import numpy as np
 
-import bpy
-from mathutils import Vector
+from natural.profiling import stage
+from natural.progress import Progress
 
+from .hierarchy import depths, leaves, unique
 from .turtle import Turtle
 
 
@@ -22,11 +23,23 @@ class Graphics:
     """
 
     @staticmethod
-    def __check_args(radius, proportion):
+    def __check_args(radius, proportion, pipe, taper):
         if radius is not None and proportion is not None:
             raise ValueError("`radius` and `proportion` are mutually exclusive.")
-
-    def __init__(self, unit, angle, material=None, radius=None, proportion=None, randomness=None):
+        if sum(model is not None for model in (proportion, pipe, taper)) > 1:
+            raise ValueError("`proportion`, `pipe`, and `taper` are mutually exclusive.")
+
+    def __init__(
+        self,
+        unit,
+        angle,
+        material=None,
+        radius=None,
+        proportion=None,
+        randomness=None,
+        pipe=None,
+        taper=None,
+    ):
         """Initialize a Graphics object to draw command strings for fractals.
 
         If neither a radius or a proportionality constant is given, default to a constant radius
@@ -35,22 +48,31 @@ class Graphics:
         :param unit: The length of each 'forward' command.
         :param angle: The angle of each 'rotate' and 'bend' command. In radians.
         :param material: The Blender material to make each cylinder object with, defaults to None.
-        :param radius: The radius of each cylinder. Mutually exclusive with `proportion`.
+        :param radius: The radius of each cylinder. Mutually exclusive with `proportion`. With
+        `pipe` or `taper`, the radius of the outermost cylinders or the roots, respectively.
         :param proportion: Make each cylinder's radius proportional to its length. Mutually
         exclusive with `radius`.
         :param randomness: If not None, the std deviation to randomly apply to each turtle move.
+        :param pipe: If not None, the exponent e of the pipe model, where the radius r of each
+        cylinder satisfies r^e = sum(r_child^e) over its children. Leonardo's rule has e = 2.
+        :param taper: If not None, scale the radius by this factor for each cylinder between a
+        cylinder and its root.
         """
-        self.__check_args(radius, proportion)
+        self.__check_args(radius, proportion, pipe, taper)
 
         self.material = material
         self.radius = radius if radius is not None else 0.2
         self.proportion = proportion
+        self.pipe = pipe
+        self.taper = taper
         # TODO: Should the same amount of randomness be applied to the angles as the linear steps?
         self.randomness = randomness
         self.unit = unit
         self.angle = angle
 
-        self.turtle = Turtle()
+        # The turtle carries the last segment drawn, so '[' and ']' save and restore the branch
+        # point with the orientation.
+        self.turtle = Turtle(radius=self.radius)
 
         self.mappings = {
             # Bind the distance and angle parameters to the turtle methods.
@@ -68,15 +90,20 @@ class Graphics:
             "]": self.turtle.pop,
         }
 
-    def compute(self, commands):
-        """Generate the 3D cylinders from the given graphics commands.
+    def _interpret(self, commands, progress=None):
+        """Interpret the given graphics commands, yielding each cylinder as it is drawn.
 
-        :param commands: A string of successive graphics commands.
-        :returns: A dictionary of (length, [{cyl 1}, {cyl 2}, ...]) pairs.
+        :param commands: An iterable of successive graphics commands.
+        :param progress: A `Progress` to count the interpreted commands with, if not None.
+        :returns: An iterator of (start, end, length, parent) tuples, where the parent is the index
+        of the cylinder this one branches from, or -1.
         """
-        cylinders = []
+        count = 0
+        self.turtle.segment = -1
         commands = iter(commands)
         for command in commands:
+            if progress is not None:
+                progress.update()
             perturbation = (
                 np.random.normal(scale=self.randomness) if self.randomness is not None else 0
             )
@@ -93,21 +120,14 @@ class Graphics:
                 except StopIteration:
                     # We've consumed the last command.
                     break
+                if progress is not None:
+                    progress.update()
             end = self.turtle.position
 
             if length > 0:
-                if self.proportion is not None:
-                    self.radius = self.proportion * length
-
-                cylinders.append(
-                    {
-                        "from": start,
-                        "to": end,
-                        "radius": self.radius,
-                        "material": "Branch" if length > 1 else "Leaf",
-                        "length": length,
-                    }
-                )
+                yield start, end, length, self.turtle.segment
+                self.turtle.segment = count
+                count += 1
             if command in ("f", "g"):
                 self.mappings[command](self.unit)
 
@@ -119,7 +139,91 @@ class Graphics:
                 else:
                     self.mappings[command]()
 
-        return [dict(t) for t in {tuple(d.items()) for d in cylinders}]
+    def compute(self, commands, progress=None):
+        """Generate the 3D cylinders from the given graphics commands.
+
+        :param commands: A string of successive graphics commands.
+        :param progress: A `Progress` to count the interpreted commands with, if not None.
+        :returns: A list of unique cylinders, each with the index of the 'parent' cylinder it
+        branches from, or -1.
+        """
+        cylinders = []
+        parents = []
+        for start, end, length, parent in self._interpret(commands, progress):
+            parents.append(parent)
+            cylinders.append(
+                {
+                    "from": start,
+                    "to": end,
+                    "material": "Branch" if length > 1 else "Leaf",
+                    "length": length,
+                }
+            )
+
+        with stage("dedup", cylinders=len(cylinders)):
+            cylinders, parents = unique(cylinders, parents)
+        with stage("radii", cylinders=len(cylinders)):
+            lengths = np.array([c["length"] for c in cylinders], dtype=float)
+            for cylinder, radius, parent in zip(
+                cylinders, self.radii(lengths, parents).tolist(), parents.tolist()
+            ):
+                cylinder["radius"] = radius
+                cylinder["parent"] = parent
+        return cylinders
+
+    def icompute(self, commands, chunksize=1 << 12, progress=None):
+        """Generate the 3D cylinders from the given graphics commands in blocks of arrays.
+
+        Only one block of cylinders is held in memory at a time, so with commands from
+        `Grammar.iexpand` the memory used doesn't grow with the size of the fractal. Unlike
+        `compute`, duplicate cylinders are kept, since finding them takes every cylinder at once.
+        For the same reason, the `pipe` and `taper` radius models are unsupported.
+
+        :param commands: An iterable of successive graphics commands.
+        :param chunksize: The number of cylinders in each block, except for the last.
+        :param progress: A `Progress` to count the interpreted commands with, if not None.
+        :returns: An iterator of dicts with the 'from' and 'to' points, 'radius', 'material',
+        'length', and 'parent' index of each cylinder of a block, as arrays. The parents index
+        every cylinder yielded so far, not just those in the same block.
+        """
+        if self.pipe is not None or self.taper is not None:
+            raise ValueError("The radius models need the whole hierarchy at once.")
+
+        block = []
+        for cylinder in self._interpret(commands, progress):
+            block.append(cylinder)
+            if len(block) == chunksize:
+                yield self._block(block)
+                block.clear()
+        if block:
+            yield self._block(block)
+
+    def _block(self, cylinders):
+        starts, ends, lengths, parents = zip(*cylinders)
+        lengths = np.array(lengths, dtype=float)
+        parents = np.array(parents, dtype=int)
+        return {
+            "from": np.array(starts, dtype=float),
+            "to": np.array(ends, dtype=float),
+            "radius": self.radii(lengths, parents),
+            "material": np.where(lengths > 1, "Branch", "Leaf"),
+            "length": lengths,
+            "parent": parents,
+        }
+
+    def radii(self, lengths, parents):
+        """Compute the radius of each cylinder from its length and the branching hierarchy.
+
+        :param lengths: The length of each cylinder.
+        :param parents: The index of each cylinder's parent, or -1.
+        """
+        if self.proportion is not None:
+            return self.proportion * lengths
+        if self.pipe is not None:
+            return self.radius * leaves(parents) ** (1 / self.pipe)
+        if self.taper is not None:
+            return self.radius * self.taper ** depths(parents)
+        return np.full(len(lengths), float(self.radius))
 
     @staticmethod
     def dump(data, path):
@@ -129,7 +233,7 @@ class Graphics:
                 json.dump(data, outfile)
 
     @staticmethod
-    def draw(cylinders, filename):
+    def draw(cylinders, filename, progress=None):
         """Draw the given cylinders.
 
         Use a template cylinder for each length to avoid a scene update for each cylinder.
@@ -137,85 +241,174 @@ class Graphics:
         c.f. https://blender.stackexchange.com/questions/7358/python-performance-with-blender-operators
 
         :param cylinders: A dict of (length, [{cyl}, ...]) pairs.
+        :param progress: A `Progress` to count the drawn cylinders with, defaults to one writing to
+        stderr.
         """
+        # Only drawing needs Blender, so computing and rendering the cylinders work without it.
+        import bpy
+        from mathutils import Vector
+
         bpy.ops.wm.read_factory_settings(use_empty=True)
         objs = []
         count = 1
 
         c_count = sum(len(clist) for clist in cylinders.values())
+        if progress is None:
+            progress = Progress(c_count, label="draw")
+        elif progress.total is None:
+            progress.total = c_count
+
+        with stage("loop", cylinders=c_count):
+            # The cylinders dict has form {length: [cylinders]}
+            for length, cylinder_list in cylinders.items():
+                # Generate ONE cylinder to duplicate in the appropriate position.
+                template_dict = cylinder_list[0]
+
+                v = Vector(
+                    tuple(c1 - c2 for c1, c2 in zip(template_dict["from"], template_dict["to"]))
+                )
+
+                # The primitive_cylinder_add forces a scene update. Cylinders of the same length may
+                # still differ in radius, so each duplicate scales a template of unit radius.
+                bpy.ops.mesh.primitive_cylinder_add(
+                    radius=1.0, depth=v.magnitude, location=(10.0, 10.0, 10.0)
+                )
+                if template_dict["material"] == "Leaf":
+                    mat = bpy.data.materials.new("material_leaf")
+                    mat.diffuse_color = (0.0, 102 / 255, 0.0)
+                elif template_dict["material"] == "Branch":
+                    mat = bpy.data.materials.new("material_branch")
+                    mat.diffuse_color = (51 / 255, 26 / 255, 0.0)
+
+                template = bpy.context.active_object
+                template.name = "template_" + str(length)
+                # print("Template name: ", template.name)
+                template.active_material = mat
+                template.rotation_mode = "QUATERNION"
+                template.rotation_quaternion = (1, 0, 0, 0)
+
+                # Copy it for the number of items in the dictionary list
+                for cylinder in cylinder_list:
+                    duplicate = template.copy()
+                    # also duplicate mesh, remove for linked duplicate
+                    duplicate.data = duplicate.data.copy()
+
+                    center = Vector(
+                        tuple((c1 + c2) / 2 for c1, c2 in zip(cylinder["from"], cylinder["to"]))
+                    )
+                    v = Vector(tuple(c1 - c2 for c1, c2 in zip(cylinder["from"], cylinder["to"])))
+                    u = Vector((0, 0, v.magnitude))
+                    q = u.rotation_difference(v)
+                    duplicate.location = center
+                    duplicate.rotation_quaternion = (q.w, q.x, q.y, q.z)
+                    duplicate.scale = (cylinder["radius"], cylinder["radius"], 1.0)
+                    objs.append(duplicate)
+
+                    progress.update()
+                    count += 1
+
+                    # Every so often, add the objects to the scene and join them together.
+                    if count % 200 == 0:
+                        bpy.ops.object.select_all(action="DESELECT")
+                        # Add the objects to the scene and join them together.
+                        for obj in objs:
+                            bpy.context.scene.objects.link(obj)
+                            obj.select = True
+                        bpy.context.scene.objects.active = objs[0]
+                        bpy.ops.object.join()
+                        bpy.ops.object.select_all(action="DESELECT")
+                        objs.clear()
+
+                # Delete the template cylinder.
+                template.select = True
+                bpy.ops.object.delete()
+        progress.close()
+
+        print("Linking remaining objects.")
+        with stage("join"):
+            # Add any remaining objects to the scene.
+            for obj in objs:
+                bpy.context.scene.objects.link(obj)
+
+            # Join the objects together, update the scene, and smooth the cylinders.
+            bpy.context.scene.objects.active = objs[0]
+            bpy.ops.object.select_all(action="SELECT")
+            bpy.ops.object.join()
+            bpy.context.scene.update()
+            bpy.ops.object.shade_smooth()
+            bpy.ops.object.select_all(action="DESELECT")
+
+        print("Saving scene to '" + filename + "'")
+        with stage("save"):
+            bpy.ops.wm.save_mainfile(filepath=filename)
 
-        # The cylinders dict has form {length: [cylinders]}
-        for length, cylinder_list in cylinders.items():
-            # Generate ONE cylinder to duplicate in the appropriate position.
-            template_dict = cylinder_list[0]
+    @staticmethod
+    def draw_instanced(hierarchy, filename, sides=16):
+        """Draw a hierarchy of instanced prototypes, as from `instancing.instance`.
 
-            v = Vector(tuple(c1 - c2 for c1, c2 in zip(template_dict["from"], template_dict["to"])))
+        Each prototype becomes a group holding one mesh of its own cylinders, and an empty that
+        duplicates the group of each prototype it instances. So the scene only stores each
+        prototype's geometry once, however many times it is repeated.
 
-            # The primitive_cylinder_add forces a scene update.
-            bpy.ops.mesh.primitive_cylinder_add(
-                radius=template_dict["radius"], depth=v.magnitude, location=(10.0, 10.0, 10.0)
-            )
-            if template_dict["material"] == "Leaf":
-                mat = bpy.data.materials.new("material_leaf")
-                mat.diffuse_color = (0.0, 102 / 255, 0.0)
-            elif template_dict["material"] == "Branch":
-                mat = bpy.data.materials.new("material_branch")
-                mat.diffuse_color = (51 / 255, 26 / 255, 0.0)
-
-            template = bpy.context.active_object
-            template.name = "template_" + str(length)
-            # print("Template name: ", template.name)
-            template.active_material = mat
-            template.rotation_mode = "QUATERNION"
-            template.rotation_quaternion = (1, 0, 0, 0)
-
-            # Copy it for the number of items in the dictionary list
-            for cylinder in cylinder_list:
-                duplicate = template.copy()
-                # also duplicate mesh, remove for linked duplicate
-                duplicate.data = duplicate.data.copy()
-
-                center = Vector(
-                    tuple((c1 + c2) / 2 for c1, c2 in zip(cylinder["from"], cylinder["to"]))
-                )
-                v = Vector(tuple(c1 - c2 for c1, c2 in zip(cylinder["from"], cylinder["to"])))
-                u = Vector((0, 0, v.magnitude))
-                q = u.rotation_difference(v)
-                duplicate.location = center
-                duplicate.rotation_quaternion = (q.w, q.x, q.y, q.z)
-                objs.append(duplicate)
-
-                print("\rprogress: {}% ({})".format(100 * count // c_count, count), end="")
-                count += 1
+        :param hierarchy: A dict of the 'root' instance and the list of 'prototypes'.
+        :param filename: The Blender file to save.
+        :param sides: The number of sides of each cylinder.
+        """
+        import bpy
+        from mathutils import Matrix
+
+        from .export import groups
 
-                # Every so often, add the objects to the scene and join them together.
-                if count % 200 == 0:
-                    bpy.ops.object.select_all(action="DESELECT")
-                    # Add the objects to the scene and join them together.
-                    for obj in objs:
-                        bpy.context.scene.objects.link(obj)
-                        obj.select = True
-                    bpy.context.scene.objects.active = objs[0]
-                    bpy.ops.object.join()
-                    bpy.ops.object.select_all(action="DESELECT")
-                    objs.clear()
-
-            # Delete the template cylinder.
-            template.select = True
-            bpy.ops.object.delete()
-
-        print("\nLinking remaining objects.")
-        # Add any remaining objects to the scene.
-        for obj in objs:
-            bpy.context.scene.objects.link(obj)
-
-        # Join the objects together, update the scene, and smooth the cylinders.
-        bpy.context.scene.objects.active = objs[0]
-        bpy.ops.object.select_all(action="SELECT")
-        bpy.ops.object.join()
-        bpy.context.scene.update()
-        bpy.ops.object.shade_smooth()
-        bpy.ops.object.select_all(action="DESELECT")
-
-        print("\nSaving scene to '" + filename + "'")
-        bpy.ops.wm.save_mainfile(filepath=filename)
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+        materials = {}
+        prototypes = []
+
+        with stage("loop", prototypes=len(hierarchy["prototypes"])):
+            # Prototypes only instance earlier prototypes, so their groups already exist.
+            for i, prototype in enumerate(hierarchy["prototypes"]):
+                name = "prototype_{}_{}_{}".format(i, prototype["symbol"], prototype["depth"])
+                group = bpy.data.groups.new(name)
+                meshes = groups(prototype["cylinders"], sides) if prototype["cylinders"] else []
+                if meshes:
+                    mesh = bpy.data.meshes.new(name)
+                    offsets = np.cumsum([0] + [len(m[2]) for m in meshes[:-1]])
+                    co = np.concatenate([m[2] for m in meshes])
+                    faces = np.concatenate([m[4] + offset for m, offset in zip(meshes, offsets)])
+                    slots = np.repeat(np.arange(len(meshes)), [len(m[4]) for m in meshes])
+
+                    mesh.vertices.add(len(co))
+                    mesh.vertices.foreach_set("co", co.ravel())
+                    mesh.loops.add(faces.size)
+                    mesh.loops.foreach_set("vertex_index", faces.ravel())
+                    mesh.polygons.add(len(faces))
+                    mesh.polygons.foreach_set("loop_start", np.arange(0, faces.size, 3))
+                    mesh.polygons.foreach_set("loop_total", np.full(len(faces), 3))
+                    mesh.polygons.foreach_set("material_index", slots)
+                    mesh.polygons.foreach_set("use_smooth", np.ones(len(faces), dtype=bool))
+                    for material, color, *_ in meshes:
+                        if material not in materials:
+                            materials[material] = bpy.data.materials.new(
+                                "material_" + material.lower()
+                            )
+                            materials[material].diffuse_color = color
+                        mesh.materials.append(materials[material])
+                    mesh.update(calc_edges=True)
+                    group.objects.link(bpy.data.objects.new(name, mesh))
+
+                for child in prototype["instances"]:
+                    empty = bpy.data.objects.new(name + "_instance", None)
+                    empty.dupli_type = "GROUP"
+                    empty.dupli_group = prototypes[child["prototype"]]
+                    empty.matrix_world = Matrix(child["transform"])
+                    group.objects.link(empty)
+                prototypes.append(group)
+
+        root = bpy.data.objects.new("root", None)
+        root.dupli_type = "GROUP"
+        root.dupli_group = prototypes[hierarchy["root"]["prototype"]]
+        root.matrix_world = Matrix(hierarchy["root"]["transform"])
+        bpy.context.scene.objects.link(root)
+
+        print("Saving scene to '" + filename + "'")
+        with stage("save"):
+            bpy.ops.wm.save_mainfile(filepath=filename)
@@ -0,0 +1,104 @@
+"""Compute properties of the branching hierarchy of cylinders from their parent index arrays.
+
+A cylinder's parent is the cylinder it branches from, or -1 for the roots. Every parent comes before
+its children, so the hierarchy can be reduced a level at a time without any per cylinder Python.
+"""
+import numpy as np
+
+
+def keys(cylinders, tolerance=1e-9):
+    """Get a hashable key for each cylinder, equal for cylinders that only differ by rounding.
+
+    The turtle reaches the same cylinder along different paths, whose end points differ in the last
+    few bits. So the end points are snapped to a grid `tolerance` times the extent of the scene.
+
+    :param cylinders: A list of cylinder dicts
+    :param tolerance: The grid spacing, relative to the largest coordinate
+    """
+    if not cylinders:
+        return []
+    ends = np.array([(c["from"], c["to"]) for c in cylinders], dtype=float)
+    spacing = tolerance * max(np.abs(ends).max(), 1.0)
+    snapped = np.round(ends / spacing).astype(np.int64).reshape(len(cylinders), -1).tolist()
+    return [
+        (tuple(ends),) + tuple((k, v) for k, v in c.items() if k not in ("from", "to"))
+        for ends, c in zip(snapped, cylinders)
+    ]
+
+
+def unique(cylinders, parents):
+    """Remove duplicate cylinders, keeping the first of each, and point parents at the kept ones.
+
+    :param cylinders: A list of cylinder dicts
+    :param parents: The index of each cylinder's parent, or -1
+    :returns: The unique cylinders, in their original order, and an array of their parents
+    """
+    first = {}
+    remap = np.array([first.setdefault(key, i) for i, key in enumerate(keys(cylinders))], dtype=int)
+    keep = remap == np.arange(len(remap))
+    index = np.cumsum(keep) - 1
+
+    parents = np.asarray(parents, dtype=int)[keep]
+    has_parent = parents >= 0
+    parents[has_parent] = index[remap[parents[has_parent]]]
+    return [c for c, kept in zip(cylinders, keep) if kept], parents
+
+
+def reparent(parents, keep):
+    """Point the parents of the kept cylinders at their nearest kept ancestors.
+
+    Dropping a cylinder attaches its children to its own parent, or the nearest kept one above it.
+    The ancestors are found by pointer jumping, like `depths`.
+
+    :param parents: The index of each cylinder's parent, or -1
+    :param keep: A boolean mask of the cylinders to keep
+    :returns: An array of the kept cylinders' parents, indexing the kept cylinders
+    """
+    parents = np.asarray(parents, dtype=int)
+    keep = np.asarray(keep, dtype=bool)
+    # The nearest kept cylinder at or above each cylinder, or -1.
+    nearest = np.where(keep, np.arange(len(parents)), parents)
+    while True:
+        dropped = np.flatnonzero(nearest >= 0)
+        dropped = dropped[~keep[nearest[dropped]]]
+        if not len(dropped):
+            break
+        nearest[dropped] = nearest[nearest[dropped]]
+
+    index = np.cumsum(keep) - 1
+    parents = parents[keep]
+    has_parent = parents >= 0
+    parents[has_parent] = nearest[parents[has_parent]]
+    has_parent = parents >= 0
+    parents[has_parent] = index[parents[has_parent]]
+    return parents
+
+
+def depths(parents):
+    """Count the ancestors of each cylinder by pointer jumping, in log(depth) vectorized steps."""
+    parents = np.asarray(parents, dtype=int)
+    depth = (parents >= 0).astype(int)
+    ancestors = parents.copy()
+    while True:
+        valid = np.flatnonzero(ancestors >= 0)
+        if not len(valid):
+            return depth
+        # Both right hand sides read the values from before this step.
+        depth[valid] += depth[ancestors[valid]]
+        ancestors[valid] = ancestors[ancestors[valid]]
+
+
+def leaves(parents):
+    """Count the leaves in the subtree of each cylinder, including itself if it is a leaf.
+
+    The counts are summed into the parents a level at a time, from the deepest level up.
+    """
+    parents = np.asarray(parents, dtype=int)
+    count = (np.bincount(parents[parents >= 0], minlength=len(parents)) == 0).astype(float)
+    depth = depths(parents)
+    order = np.argsort(-depth, kind="mergesort")
+    levels = np.split(order, np.flatnonzero(np.diff(depth[order])) + 1)
+    for level in levels:
+        level = level[parents[level] >= 0]
+        np.add.at(count, parents[level], count[level])
+    return count
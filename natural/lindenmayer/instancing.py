@@ -0,0 +1,210 @@
+"""Interpret L-systems as a hierarchy of instanced subtrees instead of a flat list of cylinders.
+
+Every occurrence of a symbol with `depth` iterations left to apply expands to the same string, so
+its cylinders are the same up to the rigid transform of the turtle where it starts. Each such
+(symbol, depth) subtree is interpreted once, as a prototype in its own local frame, and every
+occurrence of it becomes an instance: a 4x4 transform of the prototype.
+"""
+import numpy as np
+
+from .hierarchy import keys
+from .turtle import Turtle
+
+# Graphics.compute merges runs of these commands into a single cylinder.
+FORWARD = frozenset("FG")
+# The private use characters that stand in for a prototype's instances in its command string.
+_PLACEHOLDER = 0xF0000
+_MAX_PLACEHOLDERS = 0x10FFFF - _PLACEHOLDER + 1
+
+
+class Instancer:
+    """Build the prototypes of an L-system's repeated subtrees.
+
+    A subtree is only instanced when that gives the same cylinders as interpreting it in place.
+    Its brackets must balance, so it leaves the turtle's stack as it found it. And it must not
+    start or end with a forward command next to another forward command, which `Graphics.compute`
+    would merge into one cylinder across the subtree's boundary. Other subtrees are inlined.
+    """
+
+    def __init__(self, productions, graphics):
+        """Initialize an Instancer.
+
+        :param productions: The production rules, as given to `Grammar`
+        :param graphics: The `Graphics` to interpret the commands with. Its turtle is reused.
+        """
+        if graphics.randomness is not None:
+            raise ValueError("Subtrees can only be instanced without randomness.")
+        if graphics.pipe is not None or graphics.taper is not None:
+            # A subtree's radii would depend on where it is, not just what it expands to.
+            raise ValueError("Subtrees can only be instanced with constant or proportional radii.")
+        self.productions = productions
+        self.graphics = graphics
+        self.prototypes = []
+        # The local transform of the turtle at the end of each prototype.
+        self.ends = []
+        self.ids = {}
+        self.summaries = {}
+
+    def _expands(self, symbol, depth):
+        return depth > 0 and symbol in self.productions
+
+    def summary(self, symbol, depth):
+        """Summarize the string `symbol` expands to after `depth` more iterations.
+
+        :returns: A tuple of its first and last characters (None if it is empty), its net bracket
+            depth, the lowest bracket depth it reaches, and whether it draws any cylinders
+        """
+        if not self._expands(symbol, depth):
+            net = {"[": 1, "]": -1}.get(symbol, 0)
+            return symbol, symbol, net, min(net, 0), symbol in FORWARD
+
+        key = (symbol, depth)
+        if key not in self.summaries:
+            first, last, net, lowest, draws = None, None, 0, 0, False
+            for child in self.productions[symbol]:
+                c_first, c_last, c_net, c_lowest, c_draws = self.summary(child, depth - 1)
+                first = first if first is not None else c_first
+                last = c_last if c_last is not None else last
+                lowest = min(lowest, net + c_lowest)
+                net += c_net
+                draws = draws or c_draws
+            self.summaries[key] = (first, last, net, lowest, draws)
+        return self.summaries[key]
+
+    def _commands(self, text, depth, instances):
+        """Expand `text` by `depth` iterations, leaving placeholders for the instanced subtrees.
+
+        :param instances: The list to append the prototype index of each placeholder to
+        :returns: The command string to interpret
+        """
+        summaries = [self.summary(symbol, depth) for symbol in text]
+        parts = []
+        for i, symbol in enumerate(text):
+            if not self._expands(symbol, depth):
+                parts.append(symbol)
+                continue
+
+            first, last, net, lowest, draws = summaries[i]
+            # Characters outside of `text` are unknown, so assume they are forward commands.
+            before = next((s[1] for s in reversed(summaries[:i]) if s[1] is not None), "F")
+            after = next((s[0] for s in summaries[i + 1 :] if s[0] is not None), "F")
+            if (
+                draws
+                and net == 0
+                and lowest == 0
+                and not (first in FORWARD and before in FORWARD)
+                and not (last in FORWARD and after in FORWARD)
+            ):
+                instances.append(self.prototype(symbol, depth))
+                if len(instances) > _MAX_PLACEHOLDERS:
+                    raise ValueError("Too many instances in a single prototype.")
+                parts.append(chr(_PLACEHOLDER + len(instances) - 1))
+            else:
+                parts.append(self._commands(self.productions[symbol], depth - 1, instances))
+        return "".join(parts)
+
+    def _interpret(self, commands, instances, symbol, depth):
+        """Interpret a prototype's commands in its local frame and add it to the prototypes."""
+        graphics = self.graphics
+        turtle = graphics.turtle
+        placed = []
+
+        def place(child):
+            def apply():
+                placed.append({"prototype": child, "transform": turtle.mat.tolist()})
+                turtle.mat = turtle.mat @ self.ends[child]
+
+            return apply
+
+        placeholders = {chr(_PLACEHOLDER + i): place(child) for i, child in enumerate(instances)}
+        graphics.mappings.update(placeholders)
+        turtle.mat = np.identity(4)
+        turtle.depth = 0
+        try:
+            cylinders = graphics.compute(commands)
+        finally:
+            for placeholder in placeholders:
+                del graphics.mappings[placeholder]
+
+        self.prototypes.append(
+            {"symbol": symbol, "depth": depth, "cylinders": cylinders, "instances": placed}
+        )
+        self.ends.append(turtle.mat)
+        return len(self.prototypes) - 1
+
+    def prototype(self, symbol, depth):
+        """Get the index of the prototype of `symbol` expanded by `depth` iterations."""
+        key = (symbol, depth)
+        if key not in self.ids:
+            instances = []
+            commands = self._commands(self.productions[symbol], depth - 1, instances)
+            self.ids[key] = self._interpret(commands, instances, symbol, depth)
+        return self.ids[key]
+
+    def root(self, axiom, iterations):
+        """Build the prototypes of the given axiom expanded by `iterations` iterations.
+
+        :returns: A dict with the 'root' instance, whose transform is the turtle's initial frame,
+            and the list of 'prototypes'. Each prototype has its 'symbol', 'depth', local
+            'cylinders', and the 'instances' of other prototypes it contains. Prototypes only
+            instance earlier prototypes.
+        """
+        instances = []
+        commands = self._commands(axiom, iterations, instances)
+        root = self._interpret(commands, instances, axiom, iterations)
+        return {
+            "root": {"prototype": root, "transform": Turtle().mat.tolist()},
+            "prototypes": self.prototypes,
+        }
+
+
+def instance(productions, graphics, axiom, iterations):
+    """Interpret an L-system as a hierarchy of instanced prototypes. See `Instancer.root`."""
+    return Instancer(productions, graphics).root(axiom, iterations)
+
+
+def world_transforms(hierarchy):
+    """Compose the instance transforms down the hierarchy.
+
+    :returns: A list of (k, 4, 4) arrays with the world transform of each of the k placements of
+        every prototype
+    """
+    prototypes = hierarchy["prototypes"]
+    placements = [[] for _ in prototypes]
+    placements[hierarchy["root"]["prototype"]].append(
+        np.array(hierarchy["root"]["transform"])[np.newaxis]
+    )
+    transforms = [None] * len(prototypes)
+    # Prototypes only instance earlier prototypes, so every parent is finished before its children.
+    for i in reversed(range(len(prototypes))):
+        transforms[i] = np.concatenate(placements[i]) if placements[i] else np.empty((0, 4, 4))
+        for child in prototypes[i]["instances"]:
+            placements[child["prototype"]].append(transforms[i] @ np.array(child["transform"]))
+    return transforms
+
+
+def flatten(hierarchy):
+    """Expand a hierarchy of instanced prototypes back into a flat list of unique cylinders.
+
+    The cylinders have no 'parent' indices, since those are local to each prototype.
+    """
+    cylinders = []
+    for prototype, transform in zip(hierarchy["prototypes"], world_transforms(hierarchy)):
+        local = prototype["cylinders"]
+        if not local or not len(transform):
+            continue
+        rotation, translation = transform[:, np.newaxis, :3, :3], transform[:, np.newaxis, :3, 3]
+        starts = (rotation @ np.array([c["from"] for c in local])[..., np.newaxis])[..., 0]
+        ends = (rotation @ np.array([c["to"] for c in local])[..., np.newaxis])[..., 0]
+        starts, ends = (starts + translation).tolist(), (ends + translation).tolist()
+        for k in range(len(transform)):
+            for c, start, end in zip(local, starts[k], ends[k]):
+                cylinder = dict(c, **{"from": tuple(start), "to": tuple(end)})
+                cylinder.pop("parent", None)
+                cylinders.append(cylinder)
+    # Remove the duplicates of overlapping instances, like `Graphics.compute` does. Their composed
+    # transforms differ by rounding, so they are compared like `compute` compares the turtle's.
+    first = {}
+    for key, cylinder in zip(keys(cylinders), cylinders):
+        first.setdefault(key, cylinder)
+    return list(first.values())
@@ -0,0 +1,254 @@
+"""Render Lindenmayer cylinders to PNG or SVG images with NumPy alone, without Blender."""
+import functools
+import os
+
+import numpy as np
+
+from natural.image import write_png
+
+# The diffuse colors `Graphics.draw` gives each material in Blender.
+MATERIALS = {"Branch": (51 / 255, 26 / 255, 0.0), "Leaf": (0.0, 102 / 255, 0.0)}
+
+
+def segments(cylinders):
+    """Convert a list of cylinder dictionaries to arrays.
+
+    :param cylinders: A list of cylinders, as from `Graphics.compute`
+    :returns: A tuple of (n, 3) start points, (n, 3) end points, (n,) radii, and (n, 3) colors
+    """
+    starts = np.array([c["from"] for c in cylinders], dtype=float).reshape(-1, 3)
+    ends = np.array([c["to"] for c in cylinders], dtype=float).reshape(-1, 3)
+    radii = np.array([c["radius"] for c in cylinders], dtype=float)
+    colors = np.array([MATERIALS.get(c["material"], (0.5, 0.5, 0.5)) for c in cylinders])
+    return starts, ends, radii, colors.reshape(-1, 3)
+
+
+def camera(azimuth=0, elevation=0):
+    """Get the orientation of a camera orbiting the origin.
+
+    At zero azimuth and elevation the camera looks down the -X axis with +Z up, which is the plane
+    the 2D configs are drawn in.
+
+    :param azimuth: The angle of the camera around the Z axis, in degrees
+    :param elevation: The angle of the camera above the XY plane, in degrees
+    :returns: A 3x3 array whose rows are the right, up, and backwards unit vectors
+    """
+    az, el = np.radians(azimuth), np.radians(elevation)
+    return np.array(
+        [
+            (-np.sin(az), np.cos(az), 0.0),
+            (-np.sin(el) * np.cos(az), -np.sin(el) * np.sin(az), np.cos(el)),
+            (np.cos(el) * np.cos(az), np.cos(el) * np.sin(az), np.sin(el)),
+        ]
+    )
+
+
+def project(points, azimuth=0, elevation=0, perspective=None):
+    """Project 3D points onto the camera's image plane.
+
+    :param points: An (n, 3) array of points
+    :param azimuth, elevation: The camera orientation, see `camera`
+    :param perspective: If not None, the camera's distance from the center of the points, in
+        multiples of their bounding radius. Otherwise use an orthographic projection.
+    :returns: A tuple of (n, 2) image plane coordinates, (n,) depths that increase towards the
+        camera, and (n,) magnifications to scale lengths at each point by
+    """
+    center = (points.min(axis=0) + points.max(axis=0)) / 2 if len(points) else np.zeros(3)
+    view = (points - center) @ camera(azimuth, elevation).T
+    xy, depth = view[:, :2], view[:, 2]
+
+    magnify = np.ones(len(points))
+    if perspective is not None:
+        radius = np.max(np.linalg.norm(view, axis=1), initial=1e-12)
+        distance = perspective * radius
+        if distance <= np.max(depth, initial=0):
+            raise ValueError("The camera must be outside the scene, increase `perspective`.")
+        magnify = distance / (distance - depth)
+        xy = xy * magnify[:, np.newaxis]
+    return xy, depth, magnify
+
+
+def _fit(xy, width, height, margin):
+    """Map image plane coordinates to pixels, scaling uniformly to fit inside the image.
+
+    :returns: The (n, 2) pixel coordinates (x right, y down) and the pixels per unit length
+    """
+    if not len(xy):
+        return xy, 1.0
+    low, high = xy.min(axis=0), xy.max(axis=0)
+    extent = np.maximum(high - low, 1e-12)
+    scale = np.min((1 - 2 * margin) * np.array([width - 1, height - 1]) / extent)
+    center = (low + high) / 2
+    pixels = np.empty_like(xy)
+    pixels[:, 0] = (width - 1) / 2 + (xy[:, 0] - center[0]) * scale
+    pixels[:, 1] = (height - 1) / 2 - (xy[:, 1] - center[1]) * scale
+    return pixels, scale
+
+
+@functools.lru_cache(maxsize=None)
+def _disc(radius):
+    """Get the (k, 2) integer pixel offsets covered by a disc of the given integer radius."""
+    dy, dx = np.mgrid[-radius : radius + 1, -radius : radius + 1]
+    inside = dx ** 2 + dy ** 2 <= radius * (radius + 1)
+    return np.stack([dx[inside], dy[inside]], axis=-1)
+
+
+def _splat(p0, p1, z0, z1, radii, width, height):
+    """Sample thick lines as pixel discs.
+
+    :returns: The flat pixel indices, depths, and (chunk local) line index of each sample
+    """
+    # Space the samples at most a radius apart, so consecutive discs overlap.
+    length = np.linalg.norm(p1 - p0, axis=1)
+    count = np.ceil(length / radii).astype(np.intp) + 1
+    line = np.repeat(np.arange(len(p0)), count)
+    first = np.cumsum(count) - count
+    t = (np.arange(len(line)) - first[line]) / np.maximum(count - 1, 1)[line]
+    centers = np.rint(p0[line] + t[:, np.newaxis] * (p1 - p0)[line]).astype(np.intp)
+    depth = z0[line] + t * (z1 - z0)[line]
+
+    # Stamp a disc around each sample, grouping the samples by their rounded pixel radius.
+    rounded = np.rint(radii - 0.5).astype(np.intp)[line]
+    indices, depths, lines = [], [], []
+    for radius in np.unique(rounded):
+        selected = rounded == radius
+        disc = _disc(int(radius))
+        pixels = (centers[selected][:, np.newaxis, :] + disc).reshape(-1, 2)
+        keep = (
+            (pixels[:, 0] >= 0)
+            & (pixels[:, 0] < width)
+            & (pixels[:, 1] >= 0)
+            & (pixels[:, 1] < height)
+        )
+        indices.append((pixels[:, 1] * width + pixels[:, 0])[keep])
+        depths.append(np.repeat(depth[selected], len(disc))[keep])
+        lines.append(np.repeat(line[selected], len(disc))[keep])
+    return np.concatenate(indices), np.concatenate(depths), np.concatenate(lines)
+
+
+def rasterize(
+    starts,
+    ends,
+    radii,
+    colors,
+    width=800,
+    height=800,
+    azimuth=0,
+    elevation=0,
+    perspective=None,
+    margin=0.05,
+    background=(1.0, 1.0, 1.0),
+    chunksize=1 << 14,
+):
+    """Rasterize line segments as thick lines, hiding the occluded ones with a depth buffer.
+
+    Lines are shaded darker the further they are from the camera.
+
+    :param starts, ends: The (n, 3) end points of each line segment
+    :param radii: The (n,) radius of each line segment
+    :param colors: The (n, 3) RGB color of each line segment
+    :param width, height: The size of the image in pixels
+    :param azimuth, elevation, perspective: The camera, see `project`
+    :param margin: The fraction of the image to leave empty around each side
+    :param background: The RGB background color
+    :param chunksize: The number of line segments to rasterize at once, to bound memory
+    :returns: A (height, width, 3) array of RGB colors in [0, 1]
+    """
+    n = len(starts)
+    image = np.empty((height * width, 3))
+    image[:] = background
+    if not n:
+        return image.reshape(height, width, 3)
+
+    xy, depth, magnify = project(np.concatenate([starts, ends]), azimuth, elevation, perspective)
+    pixels, scale = _fit(xy, width, height, margin)
+    p0, p1 = pixels[:n], pixels[n:]
+    z0, z1 = depth[:n], depth[n:]
+    radii = np.maximum(radii * scale * (magnify[:n] + magnify[n:]) / 2, 0.5)
+
+    near, far = depth.max(), depth.min()
+    shade = 0.55 + 0.45 * ((z0 + z1) / 2 - far) / max(near - far, 1e-12)
+
+    zbuffer = np.full(height * width, -np.inf)
+    for lo in range(0, n, chunksize):
+        hi = min(lo + chunksize, n)
+        index, z, line = _splat(
+            p0[lo:hi], p1[lo:hi], z0[lo:hi], z1[lo:hi], radii[lo:hi], width, height
+        )
+        # Keep only the nearest sample of each pixel, then those nearer than the previous chunks.
+        order = np.lexsort((z, index))
+        index, z, line = index[order], z[order], line[order]
+        nearest = np.append(index[1:] != index[:-1], True)
+        index, z, line = index[nearest], z[nearest], line[nearest] + lo
+        visible = z > zbuffer[index]
+        index, line = index[visible], line[visible]
+        zbuffer[index] = z[visible]
+        image[index] = colors[line] * shade[line, np.newaxis]
+    return image.reshape(height, width, 3)
+
+
+def write_svg(
+    filename,
+    starts,
+    ends,
+    radii,
+    colors,
+    width=800,
+    height=800,
+    azimuth=0,
+    elevation=0,
+    perspective=None,
+    margin=0.05,
+    background=(1.0, 1.0, 1.0),
+):
+    """Write line segments to an SVG file as round capped lines, painted back to front.
+
+    :param filename: The SVG file to write
+    :param starts, ends, radii, colors: The line segments, see `rasterize`
+    :param width, height, azimuth, elevation, perspective, margin, background: See `rasterize`
+    """
+    n = len(starts)
+    lines = []
+    if n:
+        xy, depth, magnify = project(
+            np.concatenate([starts, ends]), azimuth, elevation, perspective
+        )
+        pixels, scale = _fit(xy, width, height, margin)
+        strokes = 2 * radii * scale * (magnify[:n] + magnify[n:]) / 2
+        order = np.argsort(depth[:n] + depth[n:], kind="stable")
+        hexes = ["#{:02x}{:02x}{:02x}".format(*rgb) for rgb in np.rint(colors * 255).astype(int)]
+        for i in order:
+            lines.append(
+                '<line x1="{:.2f}" y1="{:.2f}" x2="{:.2f}" y2="{:.2f}" stroke="{}" '
+                'stroke-width="{:.2f}"/>'.format(*pixels[i], *pixels[n + i], hexes[i], strokes[i])
+            )
+
+    with open(filename, "w") as outfile:
+        outfile.write(
+            '<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" '
+            'viewBox="0 0 {0} {1}">\n'.format(width, height)
+        )
+        outfile.write(
+            '<rect width="100%" height="100%" fill="#{:02x}{:02x}{:02x}"/>\n'.format(
+                *np.rint(np.asarray(background) * 255).astype(int)
+            )
+        )
+        outfile.write('<g stroke-linecap="round">\n')
+        outfile.write("\n".join(lines))
+        outfile.write("\n</g>\n</svg>\n")
+
+
+def render(cylinders, filename, **kwargs):
+    """Render cylinders to a PNG or SVG image, picking the format from the filename's extension.
+
+    :param cylinders: A list of cylinders, as from `Graphics.compute`
+    :param filename: The PNG or SVG file to write
+    :param kwargs: Passed to `rasterize` or `write_svg`
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".png":
+        write_png(filename, rasterize(*segments(cylinders), **kwargs))
+    elif extension == ".svg":
+        write_svg(filename, *segments(cylinders), **kwargs)
+    else:
+        raise ValueError("Unknown image format '{}', expected '.png' or '.svg'".format(extension))
@@ -0,0 +1,92 @@
+"""Write the blocks of cylinders from `Graphics.icompute` out as they are generated.
+
+A sink has a `write(block)` method taking a dict of cylinder arrays, and a `close()` method. Sinks
+are context managers that close themselves.
+"""
+import json
+
+
+def cylinders(block):
+    """Convert a block of cylinder arrays to a list of dicts, like those from `Graphics.compute`."""
+    return [
+        {
+            "from": tuple(start),
+            "to": tuple(end),
+            "material": material,
+            "length": length,
+            "radius": radius,
+            "parent": parent,
+        }
+        for start, end, material, length, radius, parent in zip(
+            block["from"].tolist(),
+            block["to"].tolist(),
+            block["material"].tolist(),
+            block["length"].tolist(),
+            block["radius"].tolist(),
+            block["parent"].tolist(),
+        )
+    ]
+
+
+class JSONSink:
+    """Stream the cylinders into a JSON list, in the same format as `Graphics.dump`."""
+
+    def __init__(self, filename):
+        """Open the given JSON file for writing."""
+        self.filename = filename
+        self.file = open(filename, "w")
+        self.count = 0
+
+    def write(self, block):
+        """Append a block of cylinders to the list."""
+        if not len(block["length"]):
+            return
+        # Splice the block's list into the file's list.
+        text = json.dumps(cylinders(block))[1:-1]
+        self.file.write(("[" if self.count == 0 else ", ") + text)
+        self.count += len(block["length"])
+
+    def close(self):
+        """Finish the list and close the file."""
+        if self.file.closed:
+            return
+        self.file.write("[]" if self.count == 0 else "]")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PartitionSink:
+    """Deal the blocks out in turn to a JSON file for each render job.
+
+    Each block is a contiguous stretch of the turtle's path, so the jobs draw compact regions
+    without having to sort every cylinder first. Parent indices still count every cylinder.
+    """
+
+    def __init__(self, basename, parts):
+        """Open a '<basename>-<part>.json' file for each part."""
+        self.sinks = [JSONSink("{}-{}.json".format(basename, part)) for part in range(parts)]
+        self.blocks = 0
+
+    @property
+    def count(self):
+        return sum(sink.count for sink in self.sinks)
+
+    def write(self, block):
+        """Append a block of cylinders to the next part."""
+        self.sinks[self.blocks % len(self.sinks)].write(block)
+        self.blocks += 1
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
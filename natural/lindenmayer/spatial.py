@@ -0,0 +1,291 @@
+"""Index Lindenmayer cylinders by their bounding boxes to query, cull, and prune them in bulk.
+
+The bounding volume hierarchy is built without any per node Python code. The segments are sorted
+along a Morton curve, so that consecutive segments are close in space, grouped into fixed size
+leaves, and then the boxes of each level are merged pairwise up to the root. Queries walk down
+the levels for every query at once, keeping only the (query, node) pairs whose boxes pass a test.
+"""
+import numpy as np
+
+from .hierarchy import reparent
+from .raster import segments
+
+# The number of bits to quantize each coordinate to in the Morton codes.
+MORTON_BITS = 10
+
+
+def boxes(starts, ends, radii):
+    """Get the axis aligned bounding boxes of cylinders.
+
+    :param starts, ends: The (n, 3) end points of the cylinder axes
+    :param radii: The (n,) cylinder radii
+    :returns: The (n, 3) lower and upper corners of the boxes
+    """
+    radii = np.asarray(radii, dtype=float)[:, np.newaxis]
+    return np.minimum(starts, ends) - radii, np.maximum(starts, ends) + radii
+
+
+def _spread(x):
+    """Insert two zero bits between each of the low 10 bits of x."""
+    x = x.astype(np.uint32) & np.uint32(0x3FF)
+    x = (x | (x << np.uint32(16))) & np.uint32(0x030000FF)
+    x = (x | (x << np.uint32(8))) & np.uint32(0x0300F00F)
+    x = (x | (x << np.uint32(4))) & np.uint32(0x030C30C3)
+    x = (x | (x << np.uint32(2))) & np.uint32(0x09249249)
+    return x
+
+
+def morton(points):
+    """Get the Morton codes of points quantized to a grid over their bounding box.
+
+    Sorting by the codes orders the points along a Z-order curve, which keeps nearby points close.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    if not len(points):
+        return np.empty(0, dtype=np.uint32)
+    lo = points.min(axis=0)
+    extent = points.max(axis=0) - lo
+    extent[extent == 0] = 1
+    grid = ((points - lo) / extent * (2 ** MORTON_BITS - 1)).astype(np.uint32)
+    return _spread(grid[:, 0]) | (_spread(grid[:, 1]) << 1) | (_spread(grid[:, 2]) << 2)
+
+
+def frustum(matrix):
+    """Get the planes of the view frustum of a camera's projection matrix.
+
+    :param matrix: The 4x4 matrix from world space to clip space, such as Blender's
+        `projection_matrix @ view_matrix`
+    :returns: A (6, 4) array of planes (a, b, c, d) where points inside have ax + by + cz + d >= 0
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    return np.array([matrix[3] + sign * matrix[axis] for axis in range(3) for sign in (1, -1)])
+
+
+def _overlaps(lo, hi, other_lo, other_hi):
+    return np.all((lo <= other_hi) & (other_lo <= hi), axis=-1)
+
+
+def _contains(lo, hi, other_lo, other_hi):
+    return np.all((lo <= other_lo) & (other_hi <= hi), axis=-1)
+
+
+def _inside(planes, lo, hi):
+    """Check whether boxes are at least partly on the inner side of every plane."""
+    # The corner of each box furthest along each plane's normal.
+    corners = np.where(planes[..., :3] >= 0, hi, lo)
+    return np.all(np.sum(planes[..., :3] * corners, axis=-1) + planes[..., 3] >= 0, axis=0)
+
+
+class BVH:
+    """A bounding volume hierarchy over the bounding boxes of line segments or cylinders."""
+
+    def __init__(self, lo, hi, leaf_size=4):
+        """Build the hierarchy.
+
+        :param lo, hi: The (n, 3) lower and upper corners of the boxes to index, see `boxes`
+        :param leaf_size: The number of boxes in each leaf
+        """
+        lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+        self.leaf_size = leaf_size
+        self.order = np.argsort(morton((lo + hi) / 2), kind="mergesort")
+        self.lo, self.hi = lo[self.order], hi[self.order]
+
+        # The levels of node boxes, from the leaves up. Node i has children 2i and 2i + 1.
+        self.levels = []
+        if len(lo):
+            starts = np.arange(0, len(lo), leaf_size)
+            level = (
+                np.minimum.reduceat(self.lo, starts, axis=0),
+                np.maximum.reduceat(self.hi, starts, axis=0),
+            )
+            self.levels.append(level)
+            while len(level[0]) > 1:
+                pairs = np.arange(0, len(level[0]), 2)
+                level = (
+                    np.minimum.reduceat(level[0], pairs, axis=0),
+                    np.maximum.reduceat(level[1], pairs, axis=0),
+                )
+                self.levels.append(level)
+        self.levels.reverse()
+
+    @classmethod
+    def from_cylinders(cls, cylinders, leaf_size=4):
+        """Build the hierarchy over a list of cylinders, as from `Graphics.compute`."""
+        starts, ends, radii, _ = segments(cylinders)
+        return cls(*boxes(starts, ends, radii), leaf_size=leaf_size)
+
+    def __len__(self):
+        return len(self.order)
+
+    def _traverse(self, count, node_test, box_test):
+        """Find the boxes that pass a test for each of several queries.
+
+        :param count: The number of queries
+        :param node_test: Given query indices and node corners, whether to descend into the nodes
+        :param box_test: Given query indices and box corners, whether the boxes match
+        :returns: The query indices and the indices of the boxes they match
+        """
+        queries = np.arange(count)
+        nodes = np.zeros(count, dtype=int)
+        for depth, (lo, hi) in enumerate(self.levels):
+            if depth > 0:
+                queries = np.repeat(queries, 2)
+                nodes = (2 * nodes[:, np.newaxis] + (0, 1)).ravel()
+                valid = nodes < len(lo)
+                queries, nodes = queries[valid], nodes[valid]
+            hit = node_test(queries, lo[nodes], hi[nodes])
+            queries, nodes = queries[hit], nodes[hit]
+
+        queries = np.repeat(queries, self.leaf_size)
+        indices = (self.leaf_size * nodes[:, np.newaxis] + np.arange(self.leaf_size)).ravel()
+        valid = indices < len(self)
+        queries, indices = queries[valid], indices[valid]
+        hit = box_test(queries, self.lo[indices], self.hi[indices])
+        return queries[hit], self.order[indices[hit]]
+
+    def overlapping(self, lo, hi):
+        """Get the indices of the boxes that overlap the box from `lo` to `hi`."""
+        lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+
+        def test(_, other_lo, other_hi):
+            return _overlaps(lo, hi, other_lo, other_hi)
+
+        return np.sort(self._traverse(1, test, test)[1])
+
+    def within(self, lo, hi):
+        """Get the indices of the boxes that lie entirely inside the box from `lo` to `hi`."""
+        lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+
+        def descend(_, other_lo, other_hi):
+            return _overlaps(lo, hi, other_lo, other_hi)
+
+        def match(_, other_lo, other_hi):
+            return _contains(lo, hi, other_lo, other_hi)
+
+        return np.sort(self._traverse(1, descend, match)[1])
+
+    def visible(self, planes):
+        """Get the indices of the boxes that are at least partly inside a view frustum.
+
+        Boxes that straddle a corner of the frustum may be kept despite being outside of it, but no
+        box inside is ever culled.
+
+        :param planes: The planes of the frustum, see `frustum`
+        """
+        planes = np.asarray(planes, dtype=float)[:, np.newaxis]
+
+        def test(_, lo, hi):
+            return _inside(planes, lo, hi)
+
+        return np.sort(self._traverse(1, test, test)[1])
+
+    def pairs(self, chunksize=1 << 14):
+        """Get every pair of distinct boxes that overlap.
+
+        Rather than querying each box, the hierarchy is walked against itself, so pairs of nodes
+        that don't overlap are skipped along with every pair of boxes beneath them.
+
+        :param chunksize: The number of pairs of leaves to compare the boxes of at once, to bound
+            memory
+        :returns: Two arrays of the indices of the overlapping boxes, where the first is the lower
+        """
+        firsts, seconds = [], []
+        # The pairs of overlapping nodes at each level. Each unordered pair is only kept once.
+        a = b = np.zeros(1 if len(self) else 0, dtype=int)
+        for depth, (lo, hi) in enumerate(self.levels):
+            if depth > 0:
+                a = (2 * a[:, np.newaxis] + (0, 0, 1, 1)).ravel()
+                b = (2 * b[:, np.newaxis] + (0, 1, 0, 1)).ravel()
+                valid = (a <= b) & (b < len(lo))
+                a, b = a[valid], b[valid]
+            hit = _overlaps(lo[a], hi[a], lo[b], hi[b])
+            a, b = a[hit], b[hit]
+
+        offsets = np.arange(self.leaf_size)
+        for start in range(0, len(a), chunksize):
+            # Compare every box of the first leaf with every box of the second.
+            i, j = np.broadcast_arrays(
+                self.leaf_size * a[start : start + chunksize, np.newaxis, np.newaxis]
+                + offsets[:, np.newaxis],
+                self.leaf_size * b[start : start + chunksize, np.newaxis, np.newaxis] + offsets,
+            )
+            i, j = i.ravel(), j.ravel()
+            valid = (i < j) & (j < len(self))
+            i, j = i[valid], j[valid]
+            hit = _overlaps(self.lo[i], self.hi[i], self.lo[j], self.hi[j])
+            i, j = self.order[i[hit]], self.order[j[hit]]
+            firsts.append(np.minimum(i, j))
+            seconds.append(np.maximum(i, j))
+        if not firsts:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _covers(starts, ends, radii, i, j, tolerance):
+    """Check whether each cylinder i contains cylinder j, to within the tolerance."""
+    axis = ends[i] - starts[i]
+    length = np.linalg.norm(axis, axis=-1)
+    covered = (length > 0) & (radii[j] <= radii[i] + tolerance)
+    axis = axis / np.where(length > 0, length, 1)[:, np.newaxis]
+    for point in (starts[j], ends[j]):
+        offset = point - starts[i]
+        along = np.sum(offset * axis, axis=-1)
+        across = np.linalg.norm(offset - along[:, np.newaxis] * axis, axis=-1)
+        covered &= (along >= -tolerance) & (along <= length + tolerance) & (across <= tolerance)
+    return covered
+
+
+def redundant(starts, ends, radii, tolerance=1e-6, bvh=None):
+    """Find the cylinders that lie entirely inside another cylinder along its axis.
+
+    Such cylinders add nothing to the drawing. Of several identical cylinders, all but the first
+    are redundant.
+
+    :param starts, ends: The (n, 3) end points of the cylinder axes
+    :param radii: The (n,) cylinder radii
+    :param tolerance: The distance within which points are considered to coincide
+    :param bvh: The `BVH` over the cylinders' boxes, built if None
+    :returns: An (n,) boolean mask of the redundant cylinders
+    """
+    starts, ends = np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    if bvh is None:
+        bvh = BVH(*boxes(starts, ends, radii))
+    i, j = bvh.pairs()
+    i_covers_j = _covers(starts, ends, radii, i, j, tolerance)
+    j_covers_i = _covers(starts, ends, radii, j, i, tolerance)
+    mask = np.zeros(len(starts), dtype=bool)
+    # Since i < j, the first of two identical cylinders is the one kept.
+    mask[j[i_covers_j]] = True
+    mask[i[j_covers_i & ~i_covers_j]] = True
+    return mask
+
+
+def prune(cylinders, tolerance=1e-6):
+    """Remove the cylinders that lie inside another cylinder. See `redundant`.
+
+    The 'parent' of each kept cylinder, if any, is pointed at its nearest kept ancestor in the
+    returned list. The given cylinders are not modified.
+    """
+    starts, ends, radii, _ = segments(cylinders)
+    keep = ~redundant(starts, ends, radii, tolerance)
+    kept = [c for c, kept in zip(cylinders, keep) if kept]
+    if not kept or "parent" not in kept[0]:
+        return kept
+    parents = reparent([c["parent"] for c in cylinders], keep)
+    return [dict(c, parent=parent) for c, parent in zip(kept, parents.tolist())]
+
+
+def partition(cylinders, parts):
+    """Split a list of cylinders into spatially compact parts of nearly equal size.
+
+    The cylinders are ordered along a Morton curve through their midpoints, so each part covers a
+    compact region, and the parts' bounding boxes overlap much less than those of arbitrary slices.
+
+    :param cylinders: A list of cylinders, as from `Graphics.compute`
+    :param parts: The number of parts to split the cylinders into
+    :returns: A list of `parts` lists of cylinders
+    """
+    starts, ends, _, _ = segments(cylinders)
+    order = np.argsort(morton((starts + ends) / 2), kind="mergesort")
+    return [[cylinders[k] for k in part] for part in np.array_split(order, parts)]
@@ -1,64 +1,144 @@
-import sys
+import functools
 
 import numpy as np
 
-import bpy
-from mathutils import Matrix, Vector
 
+@functools.lru_cache(maxsize=64)
+def rotation(angle, axis):
+    """Get the 3x3 matrix rotating by `angle` radians around the given local axis.
 
-def __matmul35(left, right):
-    return left * right
-
-
-def __matmul36(left, right):
-    return left @ right
+    Matches the rotation part of `mathutils.Matrix.Rotation(angle, 4, axis)`.
+    """
+    c, s = np.cos(angle), np.sin(angle)
+    i, j = {"X": (1, 2), "Y": (2, 0), "Z": (0, 1)}[axis]
+    mat = np.identity(3)
+    mat[i, i], mat[i, j] = c, -s
+    mat[j, i], mat[j, j] = s, c
+    mat.flags.writeable = False
+    return mat
 
 
-matmul = __matmul36 if sys.version_info[0] == 3 and sys.version_info[1] >= 6 else __matmul35
+# The layout of the turtle state vector.
+POSITION = slice(0, 3)
+ORIENTATION = slice(3, 12)
+RADIUS = 12
+MATERIAL = 13
+SEGMENT = 14
+STATE_SIZE = 15
 
 
 class Turtle:
     """A Turtle object that swims around in 3D space.
 
+    The turtle's state is a single vector of its position, its 3x3 orientation matrix, whose columns
+    are its heading, left, and up directions, its radius, its material index, and the index of the
+    last segment it drew, which its next segment branches from. The saved states live in a
+    preallocated array that doubles when it fills up, so pushing and popping only copy a row rather
+    than allocating.
+
     Shamelessly and thankfully stolen from https://github.com/lemurni/lpy-lsystems-blender-addon.
     """
 
-    def __init__(self):
-        """Initialize a Turtle."""
-        # turtle state consists of a 4x4 matrix and some drawing attributes
-        self.mat = Matrix()
-        # stack to save and restore turtle state
-        self.stack = []
+    def __init__(self, radius=0.2, material=0, capacity=64):
+        """Initialize a Turtle.
+
+        :param radius: The initial radius to draw with
+        :param material: The initial material index to draw with
+        :param capacity: The initial number of states the stack can hold before growing
+        """
+        self.state = np.zeros(STATE_SIZE)
+        # Views into the state, which stay valid because the state is only modified in place.
+        self._position = self.state[POSITION]
+        self._orientation = self.state[ORIENTATION].reshape(3, 3)
+        self._heading = self._orientation[:, 0]
         # rotate such that heading is in +Z (we want to grow upwards in blender)
         # we thus have heading = +Z, left = -Y, up = +X
-        self.mat = matmul(self.mat, Matrix.Rotation(3 * np.pi / 2, 4, "Y"))
+        self._orientation[:] = rotation(3 * np.pi / 2, "Y")
+        self.radius = radius
+        self.material = material
+        self.segment = -1
+
+        # stack to save and restore turtle state
+        self.stack = np.empty((max(capacity, 1), STATE_SIZE))
+        self.depth = 0
 
     @property
     def position(self):
         """Get the Turtle's current position."""
-        return self.mat.col[3].xyz.to_tuple()
+        return tuple(self._position.tolist())
+
+    @property
+    def orientation(self):
+        """Get a copy of the Turtle's 3x3 orientation matrix."""
+        return self._orientation.copy()
+
+    @property
+    def mat(self):
+        """Get the Turtle's 4x4 transformation matrix."""
+        mat = np.identity(4)
+        mat[:3, :3] = self._orientation
+        mat[:3, 3] = self._position
+        return mat
+
+    @mat.setter
+    def mat(self, mat):
+        """Move and orient the Turtle with a rigid 4x4 transformation matrix."""
+        self._orientation[:] = mat[:3, :3]
+        self._position[:] = mat[:3, 3]
+
+    @property
+    def radius(self):
+        return self.state[RADIUS]
+
+    @radius.setter
+    def radius(self, radius):
+        self.state[RADIUS] = radius
+
+    @property
+    def material(self):
+        return int(self.state[MATERIAL])
+
+    @material.setter
+    def material(self, material):
+        self.state[MATERIAL] = material
+
+    @property
+    def segment(self):
+        """Get the index of the last segment drawn, or -1 if there is none."""
+        return int(self.state[SEGMENT])
+
+    @segment.setter
+    def segment(self, segment):
+        self.state[SEGMENT] = segment
 
     def push(self):
         """Push turtle state to stack."""
-        self.stack.append(self.mat.copy())
+        if self.depth == len(self.stack):
+            stack = np.empty((2 * len(self.stack), STATE_SIZE))
+            stack[: self.depth] = self.stack
+            self.stack = stack
+        self.stack[self.depth] = self.state
+        self.depth += 1
 
     def pop(self):
         """Pop and restore last turtle state from stac."""
-        self.mat = self.stack.pop()
+        if self.depth == 0:
+            raise IndexError("pop from an empty turtle stack")
+        self.depth -= 1
+        self.state[:] = self.stack[self.depth]
 
     def move(self, stepsize):
         """Move turtle in its heading direction."""
-        vec = matmul(self.mat, Vector((stepsize, 0, 0, 0)))
-        self.mat.col[3] += vec
+        self._position += stepsize * self._heading
 
     def yaw(self, angle):
         """Yaw the Turtle around its local Z axis."""
-        self.mat = matmul(self.mat, Matrix.Rotation(angle, 4, "Z"))
+        self._orientation[:] = self._orientation @ rotation(angle, "Z")
 
     def pitch(self, angle):
         """Pitch the Turtle around its local Y axis."""
-        self.mat = matmul(self.mat, Matrix.Rotation(angle, 4, "Y"))
+        self._orientation[:] = self._orientation @ rotation(angle, "Y")
 
     def roll(self, angle):
         """Roll the Turtle around its local X axis."""
-        self.mat = matmul(self.mat, Matrix.Rotation(angle, 4, "X"))
+        self._orientation[:] = self._orientation @ rotation(angle, "X")
@@ -0,0 +1,103 @@
+"""Write triangle meshes to common 3D file formats with NumPy alone."""
+import os
+
+import numpy as np
+
+from .image import to_uint8
+
+
+def face_normals(vertices, faces):
+    """Compute the unit normal of each triangle.
+
+    :param vertices: An (n, 3) array of vertex positions
+    :param faces: An (m, 3) array of vertex indices, counterclockwise when viewed from outside
+    :returns: An (m, 3) array of unit normals
+    """
+    v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return normals / np.where(length > 0, length, 1)
+
+
+def write_ply(filename, vertices, faces, colors=None):
+    """Write a triangle mesh to a binary PLY file.
+
+    :param filename: The file to write
+    :param vertices: An (n, 3) array of vertex positions
+    :param faces: An (m, 3) array of vertex indices
+    :param colors: An optional (n, 3) array of RGB vertex colors in [0, 1]
+    """
+    fields = [("position", "<f4", (3,))]
+    if colors is not None:
+        fields.append(("color", "u1", (3,)))
+    vertex_records = np.empty(len(vertices), dtype=fields)
+    vertex_records["position"] = vertices
+    if colors is not None:
+        vertex_records["color"] = to_uint8(colors)
+
+    face_records = np.empty(len(faces), dtype=[("count", "u1"), ("indices", "<i4", (3,))])
+    face_records["count"] = 3
+    face_records["indices"] = faces
+
+    properties = ["property float x", "property float y", "property float z"]
+    if colors is not None:
+        properties += ["property uchar red", "property uchar green", "property uchar blue"]
+    header = "\n".join(
+        ["ply", "format binary_little_endian 1.0", "element vertex {}".format(len(vertices))]
+        + properties
+        + [
+            "element face {}".format(len(faces)),
+            "property list uchar int vertex_indices",
+            "end_header",
+            "",
+        ]
+    )
+    with open(filename, "wb") as outfile:
+        outfile.write(header.encode("ascii"))
+        outfile.write(vertex_records.tobytes())
+        outfile.write(face_records.tobytes())
+
+
+def write_stl(filename, vertices, faces):
+    """Write a triangle mesh to a binary STL file.
+
+    :param filename: The file to write
+    :param vertices: An (n, 3) array of vertex positions
+    :param faces: An (m, 3) array of vertex indices
+    """
+    records = np.zeros(
+        len(faces), dtype=[("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attr", "<u2")]
+    )
+    records["normal"] = face_normals(vertices, faces)
+    records["vertices"] = vertices[faces]
+
+    with open(filename, "wb") as outfile:
+        outfile.write(b"Binary STL".ljust(80, b"\0"))
+        outfile.write(np.array(len(faces), dtype="<u4").tobytes())
+        outfile.write(records.tobytes())
+
+
+def write_obj(filename, vertices, faces):
+    """Write a triangle mesh to a Wavefront OBJ file.
+
+    :param filename: The file to write
+    :param vertices: An (n, 3) array of vertex positions
+    :param faces: An (m, 3) array of vertex indices
+    """
+    with open(filename, "w") as outfile:
+        np.savetxt(outfile, vertices, fmt="v %.6g %.6g %.6g")
+        # OBJ indices are one based.
+        np.savetxt(outfile, faces + 1, fmt="f %d %d %d")
+
+
+WRITERS = {".ply": write_ply, ".stl": write_stl, ".obj": write_obj}
+
+
+def write_mesh(filename, vertices, faces):
+    """Write a triangle mesh, picking the format from the filename's extension."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(
+            "Unknown mesh format '{}', expected one of {}".format(extension, sorted(WRITERS))
+        )
+    WRITERS[extension](filename, vertices, faces)
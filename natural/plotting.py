@@ -0,0 +1,27 @@
+"""Configure matplotlib for the package's plots."""
+_configured = False
+
+
+def configure():
+    """Apply the seaborn style and the larger default figure size and DPI.
+
+    Importing matplotlib and seaborn is slow, so this is deferred until something is plotted.
+    Calling it again is a no-op.
+    """
+    global _configured
+    if _configured:
+        return
+
+    import matplotlib as mpl
+
+    # Apparently, SNS stands for "Samuel Norman Seaborn", a fictional
+    # character from The West Wing
+    import seaborn as sns
+
+    sns.set()
+    # Increase default figure size and DPI
+    scale = 1.8
+    mpl.rcParams["figure.figsize"] = (scale * 6, scale * 4)
+    mpl.rcParams["figure.dpi"] = 300
+    mpl.rcParams["savefig.bbox"] = "tight"
+    _configured = True
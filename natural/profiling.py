@@ -0,0 +1,110 @@
+"""Record the wall time, CPU time, and peak memory of pipeline stages to a JSON lines trace.
+
+Library code marks its stages with `stage`, which does nothing until a script calls `enable`.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # The resource module is Unix only.
+    resource = None
+
+# The environment variable that groups the traces of several processes into one run.
+RUN_VARIABLE = "NATURAL_PROFILE_RUN"
+
+
+def peak_rss():
+    """Get the peak resident set size of this process in MiB, or None if it is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, but macOS reports bytes.
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+class Profiler:
+    """Append a JSON record for each completed stage to a trace file.
+
+    Each record holds the run, script, pid, '/' separated stage path, wall and CPU seconds, the peak
+    RSS at the end of the stage, and how much the peak grew during the stage. Records are written
+    with a single append, so several processes may share a trace file.
+    """
+
+    def __init__(self, filename, run=None):
+        """Open the trace file for appending.
+
+        :param filename: The JSON lines file to append to
+        :param run: The name of this run, defaulting to the NATURAL_PROFILE_RUN environment
+            variable, or else a name made from the script and the start time
+        """
+        self.script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+        self.run = run or os.environ.get(RUN_VARIABLE)
+        if self.run is None:
+            self.run = "{}-{}".format(self.script, time.strftime("%Y%m%dT%H%M%S"))
+        self.stack = []
+        self.file = open(filename, "a")
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        """Time the enclosed block as a stage, nested in any enclosing stages.
+
+        :param name: The name of the stage
+        :param info: Extra JSON serializable fields to record, such as item counts
+        """
+        self.stack.append(name)
+        peak = peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "run": self.run,
+                "script": self.script,
+                "pid": os.getpid(),
+                "stage": "/".join(self.stack),
+                "wall": time.perf_counter() - wall,
+                "cpu": time.process_time() - cpu,
+                "peak_rss_mb": peak_rss(),
+                "peak_rss_growth_mb": peak_rss() - peak if peak is not None else None,
+            }
+            record.update(info)
+            self.stack.pop()
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+_active = None
+
+
+def enable(filename, run=None):
+    """Start recording stages to the given trace file. See `Profiler`."""
+    global _active
+    disable()
+    _active = Profiler(filename, run)
+    return _active
+
+
+def disable():
+    """Stop recording stages."""
+    global _active
+    if _active is not None:
+        _active.close()
+        _active = None
+
+
+@contextlib.contextmanager
+def stage(name, **info):
+    """Time the enclosed block with the active profiler, if there is one. See `Profiler.stage`."""
+    if _active is None:
+        yield
+    else:
+        with _active.stage(name, **info):
+            yield
@@ -0,0 +1,163 @@
+"""Report the progress, throughput, and memory use of long loops without printing every item."""
+import datetime
+import os
+import sys
+import threading
+import time
+
+from .profiling import peak_rss
+
+
+def rss():
+    """Get the current resident set size of this process in MiB, or its peak if unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return peak_rss()
+
+
+def crossed(last, step, every):
+    """Check whether a multiple of `every` lies in the steps after `last`, up to `step`.
+
+    Loops that act every so many steps, such as writing checkpoints or frames, may be told of
+    several steps at once, so check for any multiple in between rather than only `step` itself.
+    """
+    return step // every > last // every
+
+
+class Progress:
+    """Count completed items, reporting the rate, ETA, and memory at most every `interval` seconds.
+
+    Calling `update` only increments a counter and reads the clock, so it is cheap enough to call
+    once per item in hot loops. Progress can either be written to a stream, or forwarded through a
+    queue from worker processes to a `Monitor` in the parent.
+    """
+
+    def __init__(self, total=None, label="progress", interval=None, stream=None, queue=None, job=0):
+        """Initialize a Progress bar.
+
+        :param total: The total number of items, if known
+        :param label: The text to prefix each report with
+        :param interval: The minimum number of seconds between reports. Defaults to a quarter
+            second on a terminal or queue, and five seconds otherwise, such as when logging to a
+            file
+        :param stream: The stream to report to, defaults to stderr
+        :param queue: If not None, put (job, count, total) tuples on this queue instead of
+            writing reports, for a `Monitor` to collect
+        :param job: The identifier of this job in the forwarded tuples
+        """
+        self.total = total
+        self.label = label
+        self.stream = stream if stream is not None else sys.stderr
+        self.queue = queue
+        self.job = job
+        self.tty = queue is None and hasattr(self.stream, "isatty") and self.stream.isatty()
+        if interval is None:
+            interval = 0.25 if self.tty or queue is not None else 5.0
+        self.interval = interval
+        self.count = 0
+        self.start = time.monotonic()
+        self._last = self.start
+        self._closed = False
+
+    def update(self, n=1):
+        """Mark another `n` items as complete."""
+        self.count += n
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report(now)
+
+    def format(self, now=None):
+        """Format the current progress as a single line of text."""
+        elapsed = (now if now is not None else time.monotonic()) - self.start
+        rate = self.count / elapsed if elapsed > 0 else 0.0
+        parts = ["{}: {}".format(self.label, self.count)]
+        if self.total:
+            parts[0] += "/{} ({}%)".format(self.total, 100 * self.count // self.total)
+        parts.append("{:.4g} items/s".format(rate))
+        if self.total and rate > 0:
+            remaining = max(self.total - self.count, 0) / rate
+            parts.append("ETA {}".format(datetime.timedelta(seconds=round(remaining))))
+        memory = rss()
+        if memory is not None:
+            parts.append("{:.0f} MiB".format(memory))
+        return ", ".join(parts)
+
+    def report(self, now=None):
+        """Report the current progress, regardless of when it was last reported."""
+        if self.queue is not None:
+            self.queue.put((self.job, self.count, self.total))
+        elif self.tty:
+            # Overwrite the previous report, padding over any leftover characters.
+            self.stream.write("\r" + self.format(now).ljust(79))
+            self.stream.flush()
+        else:
+            self.stream.write(self.format(now) + "\n")
+            self.stream.flush()
+
+    def close(self):
+        """Report the final progress."""
+        if self._closed:
+            return
+        self._closed = True
+        self.report()
+        if self.tty:
+            self.stream.write("\n")
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Monitor:
+    """Combine the progress forwarded by worker processes into one report from a background thread.
+
+    Pass `monitor.queue` to each worker's `Progress`, which should be a `multiprocessing.Queue`
+    or a `multiprocessing.Manager().Queue()` for process pools.
+    """
+
+    def __init__(self, queue, total=None, label="progress", interval=None, stream=None):
+        """Start monitoring the given queue.
+
+        :param queue: The queue the workers' `Progress` objects put their counts on
+        :param total: The total number of items across every job, if known. Defaults to the sum of
+            the totals the jobs report
+        :param label, interval, stream: See `Progress`
+        """
+        self.queue = queue
+        self.progress = Progress(total, label, interval, stream)
+        self._total = total
+        self._jobs = {}
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            job, count, total = item
+            self._jobs[job] = (count, total)
+            self.progress.count = sum(count for count, _ in self._jobs.values())
+            if self._total is None and all(t is not None for _, t in self._jobs.values()):
+                self.progress.total = sum(total for _, total in self._jobs.values())
+            self.progress.update(0)
+
+    def close(self):
+        """Stop monitoring once every forwarded report has been read, and report the final total."""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+        self.progress.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,324 @@
+"""Run the scripts as jobs in long lived worker processes, so batches only pay to start up once.
+
+A `Service` listens on a Unix socket for jobs, queues them, and runs at most `jobs` of them at once
+in worker processes forked from it. The service imports the scripts and plotting libraries, and
+loads the compiled kernels, before forking, and each worker keeps whatever it loads afterwards,
+such as the Laplacians of the grid sizes it has seen.
+
+A job is a JSON object naming one of the scripts and its command line arguments, such as
+``{"script": "reaction", "args": ["--size", "256", "--output", "gs.png"]}``. It may also hold
+a "config", such as the contents of one of the L-system configurations in data/, which is saved to
+the job's directory as "config_name" and passed as the first argument. Scripts name their outputs
+after their config file, so keep its original basename. A job runs in its "cwd", and with the extra
+environment variables in "env". Its spec, log, and result are written to a numbered directory of
+the results directory.
+
+Requests and replies are single lines of JSON. See `request` for the operations.
+"""
+import concurrent.futures
+import concurrent.futures.process
+import importlib.util
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+# The scripts that run in any Python, and those that must run in Blender.
+SCRIPTS = ("generate", "reaction", "heat", "automaton", "landscapes")
+BLENDER_SCRIPTS = ("render", "join")
+
+# Small runs of the scripts that load the compiled kernels each precision and solver uses.
+WARM_UP = [
+    (script, [*args, "--dtype", dtype, *tracking])
+    for dtype in ("float32", "float64")
+    for tracking in ((), ("--epsilon", "0", "--tile", "4"))
+    for script, args in (
+        ("reaction", ["--size", "8", "--iterations", "2"]),
+        ("heat", ["--rows", "8", "--cols", "8", "--timestep", "1", "--prows", "1", "--pcols", "1"]),
+        ("automaton", ["--model", "gray-scott", "--size", "8", "--iterations", "1"]),
+        ("automaton", ["--model", "fitzhugh-nagumo", "--size", "8", "--iterations", "1"]),
+    )
+] + [("automaton", ["--model", "life", "--size", "8", "--iterations", "1"])]
+
+_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+_modules = {}
+
+
+def load_script(name):
+    """Import one of the scripts as a module, once per process."""
+    if name not in _modules:
+        spec = importlib.util.spec_from_file_location(
+            "natural_scripts." + name, os.path.join(_DIRECTORY, name + ".py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[name] = module
+    return _modules[name]
+
+
+def blender():
+    """Check whether this process is running in Blender, so can run the Blender scripts."""
+    return importlib.util.find_spec("bpy") is not None
+
+
+def _reset(script):
+    """Undo the global state a script leaves behind, so it does not leak into the next job."""
+    from natural import profiling
+
+    profiling.disable()
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close("all")
+    if script in BLENDER_SCRIPTS:
+        import bpy
+
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+
+
+def run(spec, directory):
+    """Run a job in this process, writing its output to a log in the job's directory.
+
+    :param spec: The job, as described in the module docstring.
+    :param directory: The directory to write the job's config and log to.
+    :returns: A dict with the job's 'status', either 'done' or 'failed', the 'error' it failed
+        with, the 'log' filename, and the wall 'seconds' it took.
+    """
+    args = [str(arg) for arg in spec.get("args", ())]
+    if "config" in spec:
+        # Only the basename, so the config stays in the job's directory.
+        name = os.path.basename(spec.get("config_name") or "config.json")
+        config = os.path.join(directory, name)
+        with open(config, "w") as outfile:
+            json.dump(spec["config"], outfile, indent=4)
+        args.insert(0, config)
+
+    log = os.path.join(directory, "log.txt")
+    result = {"status": "done", "error": None, "log": log}
+    env = {name: str(value) for name, value in spec.get("env", {}).items()}
+    cwd, argv, stdout, stderr = os.getcwd(), sys.argv, sys.stdout, sys.stderr
+    environ = {name: os.environ.get(name) for name in env}
+    start = time.perf_counter()
+    with open(log, "w") as outfile:
+        sys.stdout = sys.stderr = outfile
+        try:
+            os.chdir(spec.get("cwd", cwd))
+            os.environ.update(env)
+            module = load_script(spec["script"])
+            sys.argv = [module.__file__] + args
+            module.main(module.parse_args(args))
+        except SystemExit as exit:
+            # argparse exits on bad arguments, after printing why to the log.
+            if exit.code not in (None, 0):
+                result.update(status="failed", error="Exited with status {}".format(exit.code))
+        except Exception as error:
+            traceback.print_exc()
+            result.update(status="failed", error="{}: {}".format(type(error).__name__, error))
+        finally:
+            os.chdir(cwd)
+            sys.argv, sys.stdout, sys.stderr = argv, stdout, stderr
+            for name, value in environ.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            _reset(spec["script"])
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def warm(scripts):
+    """Import the given scripts and the plotting libraries, and run `WARM_UP` in this process."""
+    import matplotlib
+
+    # Jobs never open windows, so `--gui` is ignored.
+    matplotlib.use("Agg")
+    for name in scripts:
+        load_script(name)
+    with tempfile.TemporaryDirectory() as directory:
+        for script, args in WARM_UP:
+            result = run({"script": script, "args": args, "cwd": directory}, directory)
+            if result["status"] != "done":
+                print("Warming up {} failed: {}".format(script, result["error"]), file=sys.stderr)
+
+
+def _initialize():
+    # Forked workers would otherwise all draw the same random numbers as the service.
+    import numpy as np
+
+    np.random.seed()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.service.handle(json.loads(line))
+            except Exception as error:
+                # Always reply, so the client is never left waiting for a dead handler.
+                reply = {"error": "{}: {}".format(type(error).__name__, error)}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class Service:
+    """Queue the jobs submitted to a Unix socket, and run them in a pool of warm processes."""
+
+    def __init__(self, path, jobs=1, results="results", warm_up=True):
+        """Start the worker processes, and listen on the socket.
+
+        :param path: The filename of the Unix socket to listen on.
+        :param jobs: The number of jobs to run at once.
+        :param results: The directory to write each job's spec, log, and result to.
+        :param warm_up: Whether to run `WARM_UP` before forking the workers, so the first jobs
+            start warm too.
+        """
+        if jobs < 1:
+            raise ValueError("'jobs' must be a positive number of processes.")
+        self.scripts = SCRIPTS + (BLENDER_SCRIPTS if blender() else ())
+        self.results = os.path.abspath(results)
+        os.makedirs(self.results, exist_ok=True)
+        ids = [int(name) for name in os.listdir(self.results) if name.isdigit()]
+        self._next = max(ids, default=0) + 1
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        if warm_up:
+            warm(self.scripts)
+        self._size = jobs
+        # Fork every worker now, before the server starts any threads.
+        self._executor = self._start()
+
+        if os.path.exists(path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                if sock.connect_ex(path) == 0:
+                    raise RuntimeError("A service is already listening on '{}'".format(path))
+            os.remove(path)
+        self.path = path
+        self._server = _Server(path, _Handler)
+        self._server.service = self
+
+    def _start(self):
+        executor = concurrent.futures.ProcessPoolExecutor(
+            self._size, multiprocessing.get_context("fork"), _initialize
+        )
+        executor.submit(os.getpid).result()
+        return executor
+
+    def submit(self, spec):
+        """Queue a job, returning its id."""
+        if spec.get("script") not in self.scripts:
+            raise ValueError(
+                "Unknown script '{}', expected one of {}".format(spec.get("script"), self.scripts)
+            )
+        with self._lock:
+            job, self._next = self._next, self._next + 1
+            directory = os.path.join(self.results, str(job))
+            os.makedirs(directory)
+            with open(os.path.join(directory, "job.json"), "w") as outfile:
+                json.dump(spec, outfile, indent=4)
+            try:
+                future = self._executor.submit(run, spec, directory)
+            except concurrent.futures.process.BrokenProcessPool:
+                # A job killed its worker, such as by crashing or running out of memory, which
+                # fails the jobs it was running with it. Replace the pool to run the rest.
+                self._executor.shutdown(wait=False)
+                self._executor = self._start()
+                future = self._executor.submit(run, spec, directory)
+            self._jobs[job] = (directory, future)
+        future.add_done_callback(lambda _: self._record(job))
+        return job
+
+    def _result(self, job):
+        directory, future = self._jobs[job]
+        try:
+            result = future.result()
+        except Exception as error:
+            # Such as the worker process dying.
+            result = {"status": "failed", "error": "{}: {}".format(type(error).__name__, error)}
+        return {"id": job, "directory": directory, **result}
+
+    def _record(self, job):
+        directory, _ = self._jobs[job]
+        with open(os.path.join(directory, "result.json"), "w") as outfile:
+            json.dump(self._result(job), outfile, indent=4)
+
+    def status(self, job):
+        """Get whether a job is 'queued', 'running', 'done', or 'failed', and its result if any."""
+        directory, future = self._jobs[job]
+        if future.done():
+            return self._result(job)
+        # Jobs count as running as soon as they are handed to the pool.
+        status = "running" if future.running() else "queued"
+        return {"id": job, "directory": directory, "status": status}
+
+    def wait(self, job):
+        """Wait for a job to finish, returning its result."""
+        _, future = self._jobs[job]
+        concurrent.futures.wait([future])
+        return self._result(job)
+
+    def handle(self, message):
+        """Reply to a request. See `request`."""
+        op = message["op"]
+        if op == "submit":
+            return {"id": self.submit(message["job"])}
+        if op == "status":
+            return self.status(int(message["id"]))
+        if op == "wait":
+            return self.wait(int(message["id"]))
+        if op == "shutdown":
+            # Shutting down waits for the request loop, which is waiting for this reply.
+            threading.Thread(target=self._server.shutdown).start()
+            return {}
+        raise ValueError("Unknown operation '{}'".format(op))
+
+    def serve_forever(self):
+        """Handle requests until a shutdown request, then wait for the queued jobs to finish."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.remove(self.path)
+            self._executor.shutdown(wait=True)
+
+
+def request(path, op, **fields):
+    """Send a request to the service listening on `path`, and return its reply.
+
+    The operations are:
+
+    * 'submit', with the `job` spec, which replies with the job's 'id'.
+    * 'status', with the job's `id`, which replies with the job's 'status' and result, if any.
+    * 'wait', with the job's `id`, which waits for the job to finish and replies with its result.
+    * 'shutdown', which stops accepting requests and exits once the queued jobs finish.
+
+    :raises ConnectionError: If no service is listening on `path`, or it closed the connection
+        without replying.
+    :raises RuntimeError: If the service rejected the request.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError) as error:
+            raise ConnectionError("No worker listening on '{}'".format(path)) from error
+        with sock.makefile("rwb") as stream:
+            stream.write((json.dumps({"op": op, **fields}) + "\n").encode())
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError(
+            "The worker on '{}' closed the connection without replying".format(path)
+        )
+    reply = json.loads(line)
+    if "error" in reply and "status" not in reply:
+        raise RuntimeError(reply["error"])
+    return reply
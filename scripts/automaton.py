@@ -0,0 +1,156 @@
+"""Run the cellular automata and reaction-diffusion models declared as stencils."""
+import argparse
+import math
+
+import numpy as np
+
+from natural.automata.life import LIFE
+from natural.automata.life import random as random_life
+from natural.automata.precision import resolve
+from natural.automata.reaction_diffusion import FITZHUGH_NAGUMO, GRAY_SCOTT, init
+from natural.automata.stencil import Stencil
+from natural.frames import frame_writer
+from natural.plotting import configure
+from natural.progress import Progress
+
+
+def life(size, dtype, args):
+    return random_life(size, size, args.density)
+
+
+def gray_scott(size, dtype, args):
+    return GRAY_SCOTT.pad(*init(size, 0.02, max(size // 10, 1), 0.5, 0.25, dtype))
+
+
+def fitzhugh_nagumo(size, dtype, args):
+    return FITZHUGH_NAGUMO.pad(
+        *(np.random.uniform(-1, 1, (size, size)).astype(dtype) for _ in range(2))
+    )
+
+
+# The model, its parameters, the function to create its initial state, and the colormaps to plot
+# and to write frames of its first field with.
+MODELS = {
+    "life": (LIFE, (), life, "binary", "gray"),
+    "gray-scott": (GRAY_SCOTT, (0.14, 0.06, 0.035, 0.065), gray_scott, "jet", "jet"),
+    # The Turing patterns from the IPython Cookbook, on a 100x100 grid of a 2x2 domain.
+    "fitzhugh-nagumo": (
+        FITZHUGH_NAGUMO,
+        (0.7, 12.5, 0.1, -0.005, 0.001),
+        fitzhugh_nagumo,
+        "RdBu",
+        "cubehelix",
+    ),
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument("--model", choices=tuple(MODELS), default="life", help="The model to run.")
+    parser.add_argument("--size", "-n", type=int, default=128, help="The grid size.")
+    parser.add_argument(
+        "--iterations", "-i", type=int, default=1000, help="The number of steps to take."
+    )
+    parser.add_argument("--seed", type=int, default=None, help="The random seed.")
+    parser.add_argument(
+        "--density", type=float, default=0.3, help="The fraction of Life cells initially alive."
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=("float32", "float64"),
+        default=None,
+        help="The precision to simulate the reaction-diffusion models in.",
+    )
+    parser.add_argument(
+        "--epsilon",
+        type=float,
+        default=None,
+        help="Only update the tiles that changed by more than this in the last step.",
+    )
+    parser.add_argument(
+        "--tile", type=int, default=32, help="The size of the tiles to track the activity of."
+    )
+    parser.add_argument(
+        "--parallel", action="store_true", default=False, help="Update the grid in parallel."
+    )
+
+    parser.add_argument(
+        "--frames", type=str, default=None, help="The directory to write PNG frames to."
+    )
+    parser.add_argument(
+        "--video", type=str, default=None, help="The video file to encode frames to."
+    )
+    parser.add_argument(
+        "--frame-every", type=int, default=10, help="The number of steps between frames."
+    )
+    parser.add_argument("--fps", type=int, default=30, help="The video frame rate.")
+    parser.add_argument(
+        "--frame-scale", type=int, default=1, help="Repeat each cell this many times in the frames."
+    )
+
+    parser.add_argument("--title", type=str, default=None, help="The plot title.")
+    parser.add_argument(
+        "--output", "-o", type=str, default=None, help="The filename to save the plot as."
+    )
+    parser.add_argument(
+        "--gui", action="store_true", default=False, help="Open a GUI window displaying the plot."
+    )
+
+    args = parser.parse_args(argv)
+    if args.frames is not None and args.video is not None:
+        parser.error("Write either --frames or a --video, not both.")
+    return args
+
+
+def main(args):
+    if args.seed is not None:
+        np.random.seed(args.seed)
+    model, params, initial, cmap, frame_cmap = MODELS[args.model]
+    if args.parallel:
+        model = Stencil(model.name, model.update, model.fields, model.boundary, parallel=True)
+    grid = initial(args.size, resolve(args.dtype, args.size ** 2), args)
+
+    frames = frame_writer(
+        args.frames, args.video, args.fps, args.frame_every, cmap=frame_cmap, scale=args.frame_scale
+    )
+
+    # Yield every so often to report the progress, and to write the frames.
+    stride = math.gcd(args.iterations, 100)
+    if frames is not None:
+        stride = math.gcd(stride, args.frame_every)
+    states = model.iterate(grid, params, stride, args.epsilon, args.tile)
+    progress = Progress(args.iterations, label=args.model)
+    try:
+        for i in range(stride, args.iterations + 1, stride):
+            grid = next(states)
+            progress.update(stride)
+            if frames is not None:
+                frames(i, grid[0, 1:-1, 1:-1])
+    finally:
+        progress.close()
+        if frames is not None:
+            frames.close()
+
+    configure()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.heatmap(
+        grid[0, 1:-1, 1:-1],
+        square=True,
+        xticklabels=False,
+        yticklabels=False,
+        cmap=cmap,
+        cbar=False,
+    )
+    if args.title is not None:
+        plt.title(args.title)
+    if args.output is not None:
+        plt.savefig(args.output)
+    if args.gui:
+        plt.show()
+
+
+if __name__ == "__main__":
+    main(parse_args())
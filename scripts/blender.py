@@ -1,9 +1,8 @@
 import argparse
-import itertools
 import json
 import sys
 
-from natural.lindenmayer import Grammar, Graphics
+from natural.lindenmayer.config import expand, graphics_from_config
 
 
 def parse_args(argv):
@@ -33,22 +32,13 @@ def main(args):
     basename = args.config.replace(".json", "")
 
     # Run the L-system rules for the given number of iterations.
-    grammar = Grammar(config["rules"])
     print("Running", config["iterations"], "iterations on axiom:", config["axiom"])
-    lstrings = grammar.iapply(config["axiom"])
-    # Get the nth iteration, skipping all the intermediate forms.
-    lstring = next(itertools.islice(lstrings, config["iterations"], config["iterations"] + 1))
+    lstring = expand(config)
     # print("L-string:")
     # print(lstring)
 
     # Crunch the L-strings into a series of cylinders.
-    graphics = Graphics(
-        unit=config["unit"],
-        angle=config["angle"],
-        radius=config["radius"],
-        proportion=config["proportion"],
-        randomness=config["randomness"],
-    )
+    graphics = graphics_from_config(config)
     print("Computing all the cylinders.")
     clist = graphics.compute(lstring)
     cylinders = {}
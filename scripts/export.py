@@ -0,0 +1,44 @@
+import argparse
+import os
+
+from natural.lindenmayer.config import load_cylinders
+from natural.lindenmayer.export import export
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Export L-system cylinders to a glTF or PLY mesh without Blender."
+    )
+
+    parser.add_argument(
+        "input",
+        type=str,
+        help="The configuration, or generated cylinders or instances JSON file to export.",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default=None,
+        help="The .glb, .ply, .stl, or .obj file to write. Defaults to the input with a .glb "
+        "extension.",
+    )
+    parser.add_argument(
+        "--sides", type=int, default=8, help="The number of vertices around each cylinder."
+    )
+    parser.add_argument("--no-caps", action="store_true", help="Leave the cylinder ends open.")
+
+    return parser.parse_args()
+
+
+def main(args):
+    # Accept the configurations, and the cylinders or instances generate.py dumps.
+    clist = load_cylinders(args.input)
+    output = args.output or os.path.splitext(args.input)[0] + ".glb"
+
+    print("Exporting {} cylinders to {}".format(len(clist), output))
+    export(clist, output, sides=args.sides, caps=not args.no_caps)
+
+
+if __name__ == "__main__":
+    main(parse_args())
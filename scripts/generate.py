@@ -1,17 +1,77 @@
 import argparse
-import itertools
 import json
 import sys
 
-from natural.lindenmayer import Grammar, Graphics
+from natural import profiling
+from natural.lindenmayer import Grammar
+from natural.lindenmayer.config import expand, graphics_from_config
+from natural.lindenmayer.instancing import instance
+from natural.lindenmayer.sinks import JSONSink, PartitionSink
+from natural.lindenmayer.spatial import prune
+from natural.progress import Progress
 
 
 def parse_args(argv):
     parser = argparse.ArgumentParser(description="Draw a collection of cylinders on Blender.")
 
     parser.add_argument("config", type=str, help="The configuration JSON file to use.")
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Append the time and memory used by each stage to the given JSON lines file.",
+    )
+    parser.add_argument(
+        "--instanced",
+        action="store_true",
+        help="Save each repeated subtree once, with the transforms of its instances, to "
+        "<config>-instances.json instead of saving every cylinder. Requires no randomness.",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Drop the cylinders that lie entirely inside another cylinder before saving them.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Stream the cylinders to disk in blocks of this many as they are generated, so memory "
+        "doesn't grow with the fractal. Duplicate cylinders are kept.",
+    )
+    parser.add_argument(
+        "--parts",
+        type=int,
+        default=None,
+        help="With --chunksize, deal the blocks out to <config>-cylinders-<part>.json files, one "
+        "per render job, instead of a single file.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.chunksize is not None and args.prune:
+        parser.error("--prune needs every cylinder at once, so it can't be used with --chunksize")
+    if args.parts is not None and args.chunksize is None:
+        parser.error("--parts requires --chunksize")
+    return args
 
-    return parser.parse_args(argv)
+
+def stream(args, config, graphics, basename):
+    """Expand, interpret, and save the cylinders a block at a time."""
+    grammar = Grammar(config["rules"])
+    print("Streaming", config["iterations"], "iterations on axiom:", config["axiom"])
+    # The nth item of `Grammar.iapply` has had the rules applied n + 1 times.
+    commands = grammar.iexpand(config["axiom"], config["iterations"] + 1)
+    if args.parts is not None:
+        sink = PartitionSink(basename + "-cylinders", args.parts)
+        print("Saving cylinders to {}-cylinders-*.json".format(basename))
+    else:
+        sink = JSONSink(basename + "-cylinders.json")
+        print("Saving cylinders to {}-cylinders.json".format(basename))
+
+    with profiling.stage("stream"), Progress(label="compute") as progress, sink:
+        for block in graphics.icompute(commands, args.chunksize, progress):
+            sink.write(block)
+    print("Saved {} cylinders.".format(sink.count))
 
 
 def parse_json(filename):
@@ -20,31 +80,55 @@ def parse_json(filename):
 
 
 def main(args):
+    if args.profile is not None:
+        profiling.enable(args.profile)
+
     # TODO: Validate the JSON file.
     config = parse_json(args.config)
     # Extensionless filename to save everything as.
     basename = args.config.replace(".json", "")
 
+    graphics = graphics_from_config(config)
+
+    if args.instanced:
+        print("Instancing", config["iterations"], "iterations on axiom:", config["axiom"])
+        with profiling.stage("instance"):
+            # The nth item of `Grammar.iapply` has had the rules applied n + 1 times.
+            hierarchy = instance(
+                config["rules"], graphics, config["axiom"], config["iterations"] + 1
+            )
+        print(
+            "Saving {} prototypes to {}-instances.json".format(
+                len(hierarchy["prototypes"]), basename
+            )
+        )
+        with profiling.stage("dump"):
+            graphics.dump(hierarchy, basename + "-instances")
+        return
+
+    if args.chunksize is not None:
+        stream(args, config, graphics, basename)
+        return
+
     # Run the L-system rules for the given number of iterations.
-    grammar = Grammar(config["rules"])
     print("Running", config["iterations"], "iterations on axiom:", config["axiom"])
-    lstrings = grammar.iapply(config["axiom"])
-    # Get the nth iteration, skipping all the intermediate forms.
-    lstring = next(itertools.islice(lstrings, config["iterations"], config["iterations"] + 1))
-
-    graphics = Graphics(
-        unit=config["unit"],
-        angle=config["angle"],
-        radius=config["radius"],
-        proportion=config["proportion"],
-        randomness=config["randomness"],
-    )
+    with profiling.stage("expansion"):
+        lstring = expand(config)
 
     print("Computing all the cylinders.")
-    cylinders = graphics.compute(lstring)
+    with profiling.stage("compute", commands=len(lstring)):
+        with Progress(len(lstring), label="compute") as progress:
+            cylinders = graphics.compute(lstring, progress)
+
+    if args.prune:
+        with profiling.stage("prune", cylinders=len(cylinders)):
+            count = len(cylinders)
+            cylinders = prune(cylinders)
+        print("Pruned {} hidden cylinders.".format(count - len(cylinders)))
 
     print("Saving {} cylinders to {}-cylinders.json".format(len(cylinders), basename))
-    graphics.dump(cylinders, basename + "-cylinders")
+    with profiling.stage("dump", cylinders=len(cylinders)):
+        graphics.dump(cylinders, basename + "-cylinders")
 
 
 if __name__ == "__main__":
@@ -1,13 +1,17 @@
 """Generate 2D heat diffusion plots with CAs."""
 import argparse
-
-import matplotlib.pyplot as plt
-import seaborn as sns
+import math
 
 from natural.automata import istep
+from natural.automata.checkpoint import Checkpointer, load_checkpoint
+from natural.automata.heat import initial, steady_state
+from natural.automata.precision import resolve
+from natural.frames import frame_writer
+from natural.plotting import configure
+from natural.progress import Progress
 
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description=__doc__)
 
     ca_args = parser.add_argument_group()
@@ -19,6 +23,40 @@ def parse_args():
     ca_args.add_argument(
         "--cols", type=int, default=25, help="The number of cells to use along the x axis."
     )
+    ca_args.add_argument(
+        "--stencil",
+        choices=("von-neumann", "diagonal"),
+        default="von-neumann",
+        help="Average the four adjacent or the four diagonal neighbors.",
+    )
+    ca_args.add_argument(
+        "--solver",
+        choices=("step", "spectral"),
+        default="step",
+        help="Step the CA, or compute each time slice directly with fast transforms.",
+    )
+    ca_args.add_argument(
+        "--dtype",
+        choices=("float32", "float64"),
+        default=None,
+        help="The precision to simulate in. Defaults to float32 for large domains.",
+    )
+    ca_args.add_argument(
+        "--epsilon",
+        type=float,
+        default=None,
+        help="Only update the tiles that changed by more than this in the last step. "
+        "Zero is exact, and skips the quiescent parts of the domain.",
+    )
+    ca_args.add_argument(
+        "--tile", type=int, default=32, help="The size of the tiles to track the activity of."
+    )
+    ca_args.add_argument(
+        "--steady",
+        action="store_true",
+        default=False,
+        help="Plot only the steady state the diffusion converges to.",
+    )
 
     plot_args = parser.add_argument_group()
     plot_args.add_argument(
@@ -32,20 +70,126 @@ def parse_args():
         "--gui", action="store_true", default=False, help="Open the plot in a GUI window."
     )
 
-    return parser.parse_args()
+    frame_args = parser.add_argument_group()
+    frame_args.add_argument(
+        "--frames", type=str, default=None, help="The directory to write PNG frames to."
+    )
+    frame_args.add_argument(
+        "--video", type=str, default=None, help="The video file to encode frames to."
+    )
+    frame_args.add_argument(
+        "--frame-every", type=int, default=1, help="The number of time steps between frames."
+    )
+    frame_args.add_argument("--fps", type=int, default=30, help="The video frame rate.")
+    frame_args.add_argument(
+        "--frame-scale", type=int, default=1, help="Repeat each cell this many times in the frames."
+    )
+
+    state_args = parser.add_argument_group()
+    state_args.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="The filename to periodically save the simulation state to.",
+    )
+    state_args.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=1000,
+        help="The number of time steps between checkpoints.",
+    )
+    state_args.add_argument(
+        "--resume", type=str, default=None, help="The checkpoint filename to resume from."
+    )
+
+    args = parser.parse_args(argv)
+    if args.frames is not None and args.video is not None:
+        parser.error("Write either --frames or a --video, not both.")
+    if args.steady and (args.frames is not None or args.video is not None):
+        parser.error("--steady has no frames to write.")
+    return args
+
+
+def plot_steady(args):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    dtype = resolve(args.dtype, args.rows * args.cols)
+    domain = steady_state(initial(args.rows, args.cols, args.ymin, args.ymax, dtype), args.stencil)
+    sns.heatmap(domain, linewidths=0, square=True, xticklabels=False, yticklabels=False)
+    plt.title(args.title if args.title is not None else r"$t = \infty$")
+
+    if args.output is not None:
+        plt.savefig(args.output)
+
+    if args.gui:
+        plt.show()
 
 
 def main(args):
+    configure()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    if args.steady:
+        plot_steady(args)
+        return
+
     _, axes = plt.subplots(args.prows, args.pcols)
-    axes = iter(axes.flatten()) if args.prows * args.pcols != 1 else iter([axes])
-    for i, domain in zip(
-        range(1, args.timestep * args.prows * args.pcols + 1),
-        istep(args.rows, args.cols, args.ymin, args.ymax),
-    ):
-        if i % args.timestep == 0:
-            axis = next(axes)
-            sns.heatmap(domain, linewidths=0, square=True, xticklabels=False, yticklabels=False, ax=axis)
-            axis.set_title(r"$t = {}$".format(i))
+    axes = axes.flatten() if args.prows * args.pcols != 1 else [axes]
+
+    start = load_checkpoint(args.resume)["step"] if args.resume is not None else 0
+    checkpoint = None
+    if args.checkpoint is not None:
+        checkpoint = Checkpointer(args.checkpoint, args.checkpoint_every, start)
+    frames = frame_writer(
+        args.frames,
+        args.video,
+        args.fps,
+        args.frame_every,
+        start,
+        cmap="cubehelix",
+        scale=args.frame_scale,
+    )
+
+    # Step straight from one subplot to the next, unless resuming from an unaligned checkpoint.
+    stride = math.gcd(start, args.timestep)
+    if frames is not None:
+        stride = math.gcd(stride, args.frame_every)
+    progress = Progress(args.timestep * args.prows * args.pcols - start, label="heat")
+    try:
+        for i, domain in zip(
+            range(start + stride, args.timestep * args.prows * args.pcols + 1, stride),
+            istep(
+                args.rows,
+                args.cols,
+                args.ymin,
+                args.ymax,
+                stencil=args.stencil,
+                stride=stride,
+                solver=args.solver,
+                checkpoint=checkpoint,
+                resume=args.resume,
+                progress=progress,
+                dtype=args.dtype,
+                epsilon=args.epsilon,
+                tile=args.tile,
+            ),
+        ):
+            if i % args.timestep == 0:
+                axis = axes[i // args.timestep - 1]
+                sns.heatmap(
+                    domain, linewidths=0, square=True, xticklabels=False, yticklabels=False, ax=axis
+                )
+                axis.set_title(r"$t = {}$".format(i))
+            if frames is not None:
+                frames(i, domain)
+    finally:
+        progress.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if frames is not None:
+            frames.close()
 
     if args.title is not None:
         plt.title(args.title)
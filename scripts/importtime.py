@@ -0,0 +1,79 @@
+"""Measure how long the natural package and its subpackages take to import."""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["natural", "natural.automata", "natural.landscape", "natural.lindenmayer"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "modules", nargs="*", default=MODULES, help="The modules to import, each in a new process."
+    )
+    parser.add_argument(
+        "--top", type=int, default=5, help="The number of slowest imports to list per module."
+    )
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Exit with an error if any module takes longer than this many milliseconds.",
+    )
+
+    return parser.parse_args()
+
+
+def importtime(module):
+    """Import the given module in a fresh interpreter with `-X importtime`.
+
+    :returns: A list of (self us, cumulative us, module name) tuples, in import order.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        timings.append((int(self_us), int(cumulative_us), name.strip()))
+    return timings
+
+
+def main(args):
+    slow = []
+    for module in args.modules:
+        try:
+            timings = importtime(module)
+        except subprocess.CalledProcessError as error:
+            print("{}: failed to import\n{}".format(module, error.stderr.strip()))
+            slow.append(module)
+            continue
+
+        total = next(cumulative for _, cumulative, name in timings if name == module) / 1000
+        print("{}: {:.1f} ms".format(module, total))
+        # Only list the top level packages, since their cumulative times include their children.
+        toplevel = [t for t in timings if not t[2].startswith(module) and "." not in t[2]]
+        for _, cumulative, name in sorted(toplevel, reverse=True, key=lambda t: t[1])[: args.top]:
+            print("    {:>10.1f} ms  {}".format(cumulative / 1000, name))
+
+        if args.max_ms is not None and total > args.max_ms:
+            slow.append(module)
+
+    if slow:
+        print("Too slow to import:", ", ".join(slow))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,15 +1,33 @@
 import argparse
 import json
 import sys
+import time
+
+import numpy as np
 
 import bpy
 
+from natural import profiling
+
 
 def parse_args(argv):
     parser = argparse.ArgumentParser(description="Draw a collection of cylinders on Blender.")
 
     parser.add_argument("blendfiles", type=str, nargs="+", help="The Blender files to join.")
     parser.add_argument("output", type=str, help="The output filename.")
+    parser.add_argument(
+        "--strategy",
+        choices=["bulk", "tree", "join"],
+        default="bulk",
+        help="Append the raw mesh buffers of every file into one mesh, join the objects pairwise "
+        "in a tree, or join every object at once with a single operator.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Append the time and memory used by each stage to the given JSON lines file.",
+    )
 
     return parser.parse_args(argv)
 
@@ -19,25 +37,203 @@ def parse_json(filename):
         return json.load(f)
 
 
-def main(args):
-    bpy.ops.wm.read_factory_settings(use_empty=True)
-    for file in args.blendfiles:
-        with bpy.data.libraries.load(file) as (data_from, data_to):
-            data_to.objects = [name for name in data_from.objects if name.startswith("template")]
+def load(filename):
+    """Load the joined cylinder objects from a job's Blender file."""
+    with bpy.data.libraries.load(filename) as (data_from, data_to):
+        data_to.objects = [name for name in data_from.objects if name.startswith("template")]
+    return [obj for obj in data_to.objects if obj is not None]
+
+
+def buffers(obj, materials):
+    """Read an object's mesh into NumPy arrays in world space, then delete the object.
+
+    :param obj: The mesh object to read
+    :param materials: A dict of material names to their slot in the joined mesh, which is updated
+        with any new materials
+    :returns: A tuple of vertex positions, loop vertex indices, polygon loop starts, polygon loop
+        totals, and polygon material slots
+    """
+    mesh = obj.data
+    co = np.empty(3 * len(mesh.vertices), dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loops)
+    starts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", starts)
+    totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", totals)
+    # Blender only reads integer properties straight into buffers of its own 32 bit ints.
+    slots = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", slots)
+
+    # Each job creates its own copies of the materials, which are renamed 'name.001' on loading.
+    remap = []
+    for material in mesh.materials:
+        name = material.name.split(".")[0] if material is not None else None
+        if name not in materials:
+            materials[name] = (len(materials), material)
+        remap.append(materials[name][0])
+    if remap:
+        slots = np.array(remap, dtype=np.int32)[slots]
+
+    matrix = np.array(obj.matrix_world, dtype=np.float32)
+    co = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+    bpy.data.objects.remove(obj, do_unlink=True)
+    if mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+    return co, loops, starts, totals, slots
+
+
+def bulk(filenames):
+    """Join the files by appending their raw mesh buffers into a single new mesh.
+
+    Only one file's objects are loaded at a time, and no join operators or scene updates are run,
+    so the cost is linear in the total size of the meshes.
+    """
+    materials = {}
+    parts = []
+    for filename in filenames:
+        start = time.time()
+        with profiling.stage("load", file=filename):
+            loaded = [buffers(obj, materials) for obj in load(filename)]
+        parts.extend(loaded)
+        print(
+            "{}: {} objects, {} vertices in {:.2f} s".format(
+                filename, len(loaded), sum(len(p[0]) for p in loaded), time.time() - start
+            )
+        )
+    if not parts:
+        return
+
+    with profiling.stage("build", parts=len(parts)):
+        build(parts, materials)
+
+
+def build(parts, materials):
+    """Create a single mesh object from the buffers of many meshes."""
+    start = time.time()
+    # Offset each part's vertex and loop indices past the previous parts.
+    vertex_offsets = np.cumsum([0] + [len(p[0]) for p in parts[:-1]])
+    loop_offsets = np.cumsum([0] + [len(p[1]) for p in parts[:-1]])
+    co = np.concatenate([p[0] for p in parts])
+    loops = np.concatenate([p[1] + offset for p, offset in zip(parts, vertex_offsets)])
+    starts = np.concatenate([p[2] + offset for p, offset in zip(parts, loop_offsets)])
+    totals = np.concatenate([p[3] for p in parts])
+    slots = np.concatenate([p[4] for p in parts])
+
+    mesh = bpy.data.meshes.new("cylinders")
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set("vertex_index", loops)
+    mesh.polygons.add(len(starts))
+    mesh.polygons.foreach_set("loop_start", starts)
+    mesh.polygons.foreach_set("loop_total", totals)
+    mesh.polygons.foreach_set("material_index", slots)
+    # Equivalent to the shade_smooth operator, without needing the object to be selected.
+    mesh.polygons.foreach_set("use_smooth", np.ones(len(starts), dtype=bool))
+    for _, material in sorted(materials.values(), key=lambda m: m[0]):
+        mesh.materials.append(material)
+    mesh.update(calc_edges=True)
+
+    obj = bpy.data.objects.new("cylinders", mesh)
+    bpy.context.scene.objects.link(obj)
+    print("Built {} vertices in {:.2f} s".format(len(co), time.time() - start))
+
 
-        for obj in data_to.objects:
-            if obj is not None:
+def link(filenames):
+    """Load every file's objects and link them into the scene."""
+    objs = []
+    for filename in filenames:
+        start = time.time()
+        with profiling.stage("load", file=filename):
+            loaded = load(filename)
+            for obj in loaded:
                 bpy.context.scene.objects.link(obj)
+        objs.extend(loaded)
+        print("{}: {} objects in {:.2f} s".format(filename, len(loaded), time.time() - start))
+    return objs
 
-    bpy.context.scene.update()
-    bpy.context.scene.objects.active = data_to.objects[0]
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.join()
-    bpy.context.scene.update()
-    bpy.ops.object.shade_smooth()
+
+def select(objs):
+    """Select only the given objects, making the first one active."""
     bpy.ops.object.select_all(action="DESELECT")
+    for obj in objs:
+        obj.select = True
+    bpy.context.scene.objects.active = objs[0]
+
+
+def tree(filenames):
+    """Join the files' objects pairwise, halving the number of objects each round.
+
+    Every object is copied once per round, rather than the whole scene once per object.
+    """
+    objs = link(filenames)
+
+    while len(objs) > 1:
+        start = time.time()
+        joined = []
+        with profiling.stage("join", objects=len(objs)):
+            for pair in (objs[i : i + 2] for i in range(0, len(objs), 2)):
+                if len(pair) == 2:
+                    select(pair)
+                    bpy.ops.object.join()
+                joined.append(pair[0])
+        print(
+            "Joined {} objects into {} in {:.2f} s".format(
+                len(objs), len(joined), time.time() - start
+            )
+        )
+        objs = joined
+
+    if objs:
+        select(objs)
+        bpy.ops.object.shade_smooth()
+        bpy.ops.object.select_all(action="DESELECT")
+
+
+def join(filenames):
+    """Join all of the files' objects at once with a single join operator."""
+    objs = link(filenames)
+
+    start = time.time()
+    with profiling.stage("join", objects=len(objs)):
+        bpy.context.scene.update()
+        bpy.context.scene.objects.active = objs[0]
+        bpy.ops.object.select_all(action="SELECT")
+        bpy.ops.object.join()
+        bpy.context.scene.update()
+        bpy.ops.object.shade_smooth()
+        bpy.ops.object.select_all(action="DESELECT")
+    print("Joined {} objects in {:.2f} s".format(len(objs), time.time() - start))
+
+
+STRATEGIES = {"bulk": bulk, "tree": tree, "join": join}
+
+
+def counts():
+    """Count the vertices and faces of the meshes in the scene.
+
+    Every strategy should give the same counts for the same files.
+    """
+    meshes = [obj.data for obj in bpy.context.scene.objects if obj.type == "MESH"]
+    return sum(len(mesh.vertices) for mesh in meshes), sum(len(mesh.polygons) for mesh in meshes)
+
+
+def main(args):
+    if args.profile is not None:
+        profiling.enable(args.profile)
+
+    start = time.time()
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    with profiling.stage(args.strategy, files=len(args.blendfiles)):
+        STRATEGIES[args.strategy](args.blendfiles)
+    print("Joined {} vertices and {} faces".format(*counts()))
 
-    bpy.ops.wm.save_mainfile(filepath=args.output)
+    with profiling.stage("save"):
+        bpy.ops.wm.save_mainfile(filepath=args.output)
+    print("Saved '{}' after {:.2f} s".format(args.output, time.time() - start))
 
 
 if __name__ == "__main__":
@@ -1,19 +1,25 @@
 """Generate fractal landscapes with the random midpoint displacement algorithm."""
 import argparse
+import contextlib
 import itertools
+import multiprocessing
+import os
 
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-from mpl_toolkits.mplot3d import Axes3D
 
-from natural.landscape import rand_displacement_1d, rand_displacement_2d
+from natural import profiling
+from natural.landscape import TiledLandscape, generate_batch, igenerate_batch
+from natural.landscape.mesh import save_mesh
+from natural.landscape.random_displacement import squares
+from natural.landscape.raster import decimate, save_heightmap
+from natural.plotting import configure
+from natural.progress import Monitor, Progress
 
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description=__doc__,
-        epilog="""If multiple values for recursions, scale, or hurst are given,
+        epilog="""If multiple values for recursions, scale, hurst, or seed are given,
     every combination of the given parameters will be plotted on the same axis.
     It is advisable to avoid plotting multiple 3D surface plots on the same axis.""",
     )
@@ -36,7 +42,37 @@ def parse_args():
         "--hurst", "-H", nargs="+", type=float, default=[0.5], help="The Hurst roughness exponent."
     )
     parser.add_argument(
-        "--seed", type=int, default=np.random.randint(2 ** 32 - 1), help="The random seed."
+        "--seed",
+        nargs="+",
+        type=int,
+        default=[np.random.randint(2 ** 32 - 1)],
+        help="The random seed.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="The number of processes to generate heightmaps with. Defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--save",
+        type=str,
+        default=None,
+        help="Save the generated heightmaps stacked into the given .npy file instead of plotting.",
+    )
+    parser.add_argument(
+        "--algorithm",
+        "-a",
+        choices=("midpoint", "diamond-square"),
+        default="midpoint",
+        help="The 2D heightmap generation algorithm.",
+    )
+    parser.add_argument(
+        "--wrap",
+        action="store_true",
+        default=False,
+        help="Generate a tileable 2D heightmap. Requires --algorithm diamond-square.",
     )
     parser.add_argument(
         "--sealevel", "-l", type=float, default=None, help="The landscape sealevel."
@@ -54,19 +90,147 @@ def parse_args():
     parser.add_argument(
         "--output", "-o", type=str, default=None, help="The file to save the plot to."
     )
+    parser.add_argument(
+        "--resolution",
+        type=int,
+        default=256,
+        help="Decimate 2D heightmaps to at most this many cells per side before plotting them or "
+        "writing them with --raster.",
+    )
+    parser.add_argument(
+        "--raster",
+        action="store_true",
+        default=False,
+        help="Write hillshaded 2D heightmaps straight to PNG files, skipping matplotlib.",
+    )
+    parser.add_argument(
+        "--mesh",
+        type=str,
+        default=None,
+        help="Export 2D heightmaps as meshes to the given .ply, .stl, or .obj file.",
+    )
+    parser.add_argument(
+        "--mesh-resolution",
+        type=int,
+        default=None,
+        help="Decimate 2D heightmaps to at most this many cells per side before exporting them "
+        "with --mesh. Defaults to the full resolution.",
+    )
+    parser.add_argument(
+        "--tiled",
+        type=str,
+        default=None,
+        help="Generate the 2D heightmap tile by tile into the given .npy file instead of plotting.",
+    )
+    parser.add_argument(
+        "--tile-recursions",
+        type=int,
+        default=8,
+        help="The number of recursive subdivisions within each tile.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Append the time and memory used by each stage to the given JSON lines file.",
+    )
 
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.tiled is not None and (
+        args.one
+        or len(args.scale) > 1
+        or len(args.hurst) > 1
+        or len(args.recursions) > 1
+        or len(args.seed) > 1
+    ):
+        parser.error("--tiled generates a single 2D heightmap.")
+    if args.raster and (args.one or args.output is None):
+        parser.error("--raster requires a 2D heightmap and an --output filename.")
+    if args.mesh is not None and args.one:
+        parser.error("--mesh requires a 2D heightmap.")
+    if args.save is not None and len(args.recursions) > 1:
+        parser.error("--save requires a single number of recursions.")
+    return args
 
 
-def plot_1d(args):
-    width = None
-    for scale, hurst, recursions in itertools.product(args.scale, args.hurst, args.recursions):
-        heightmap = rand_displacement_1d(
-            recursions=recursions, scale=scale, hurst=hurst, seed=args.seed
+def combinations(args):
+    """Get the heightmap parameters for every combination of the given arguments."""
+    return [
+        {"recursions": recursions, "scale": scale, "hurst": hurst, "seed": seed}
+        for scale, hurst, recursions, seed in itertools.product(
+            args.scale, args.hurst, args.recursions, args.seed
         )
-        if args.sealevel is not None:
+    ]
+
+
+@contextlib.contextmanager
+def reporting(args, params):
+    """Report the progress of generating the given heightmaps.
+
+    1D heightmaps are quick, so they are counted as they finish. The squares subdivided in each 2D
+    heightmap are forwarded from the worker processes, and combined into one report.
+
+    :returns: The `Progress` and `Monitor` to pass to `igenerate_batch`, either of which is None
+    """
+    if args.one:
+        with Progress(len(params), label="heightmaps") as progress:
+            yield progress, None
+        return
+
+    total = sum(squares(p["recursions"]) for p in params)
+    with multiprocessing.Manager() as manager:
+        with Monitor(manager.Queue(), total, label="squares") as monitor:
+            yield None, monitor
+
+
+def heightmaps(args):
+    """Generate each combination of heightmap parameters in parallel, yielding them in order."""
+    params = combinations(args)
+    with reporting(args, params) as (progress, monitor):
+        for p, heightmap in zip(
+            params,
+            igenerate_batch(
+                params,
+                one=args.one,
+                algorithm=args.algorithm,
+                wrap=args.wrap,
+                jobs=args.jobs,
+                progress=progress,
+                monitor=monitor,
+            ),
+        ):
+            if args.sealevel is not None:
+                heightmap[heightmap < args.sealevel] = args.sealevel
+            yield p, heightmap
+
+
+def save_batch(args):
+    params = combinations(args)
+    print("Saving {} heightmaps to {}".format(len(params), args.save))
+    with reporting(args, params) as (progress, monitor):
+        stack = generate_batch(
+            params,
+            one=args.one,
+            algorithm=args.algorithm,
+            wrap=args.wrap,
+            jobs=args.jobs,
+            filename=args.save,
+            progress=progress,
+            monitor=monitor,
+        )
+    if args.sealevel is not None:
+        for heightmap in stack:
             heightmap[heightmap < args.sealevel] = args.sealevel
+        stack.flush()
+
+
+def plot_1d(args):
+    configure()
+    import matplotlib.pyplot as plt
 
+    width = None
+    for params, heightmap in heightmaps(args):
+        scale, hurst, recursions = params["scale"], params["hurst"], params["recursions"]
         if width is None:
             width = len(heightmap)
 
@@ -78,6 +242,8 @@ def plot_1d(args):
             label.append(r"$H = {}$".format(hurst))
         if len(args.recursions) > 1:
             label.append(r"$nrc = {}$".format(recursions))
+        if len(args.seed) > 1:
+            label.append(r"$seed = {}$".format(params["seed"]))
 
         label = ", ".join(label) if label else None
 
@@ -97,20 +263,39 @@ def plot_1d(args):
         plt.show()
 
 
+def filenames(args, filename):
+    """Number the given filename for each combination of parameters, if there are several."""
+    count = len(combinations(args))
+    if count == 1:
+        return [filename]
+    root, ext = os.path.splitext(filename)
+    return ["{}-{}{}".format(root, i, ext) for i in range(count)]
+
+
+def raster_2d(args):
+    for filename, (_, heightmap) in zip(filenames(args, args.output), heightmaps(args)):
+        save_heightmap(filename, heightmap, resolution=args.resolution)
+
+
+def mesh_2d(args):
+    for filename, (_, heightmap) in zip(filenames(args, args.mesh), heightmaps(args)):
+        print("Saving mesh to", filename)
+        save_mesh(filename, heightmap, resolution=args.mesh_resolution)
+
+
 def plot_2d(args):
+    configure()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from mpl_toolkits.mplot3d import Axes3D
+
     width, height = None, None
     floor = 0
     fig = plt.figure()
     ax = fig.add_subplot(111, projection="3d")
     # NOTE: I would avoid plotting multiple surface plots together
-    for scale, hurst, recursions in itertools.product(args.scale, args.hurst, args.recursions):
-        heightmap = rand_displacement_2d(
-            recursions=recursions, scale=scale, hurst=hurst, seed=args.seed
-        )
-
-        if args.sealevel is not None:
-            heightmap[heightmap < args.sealevel] = args.sealevel
-
+    for _, heightmap in heightmaps(args):
+        heightmap = decimate(heightmap, args.resolution)
         if width is None or height is None:
             width, height = heightmap.shape
 
@@ -125,7 +310,7 @@ def plot_2d(args):
             antialiased=False,
             cmap=sns.cubehelix_palette(reverse=True, dark=0.1, as_cmap=True),
         )
-        if len(args.scale) == 1 and len(args.hurst) == 1 and len(args.recursions) == 1:
+        if len(combinations(args)) == 1:
             ax.contour(
                 X,
                 Y,
@@ -149,12 +334,46 @@ def plot_2d(args):
         plt.show()
 
 
+def save_tiled(args):
+    landscape = TiledLandscape(
+        recursions=args.recursions[0],
+        scale=args.scale[0],
+        seed=args.seed[0],
+        hurst=args.hurst[0],
+        tile_recursions=args.tile_recursions,
+    )
+    print(
+        "Saving {0}x{0} heightmap as {1}x{1} tiles to {2}".format(
+            landscape.size, landscape.tiles, args.tiled
+        )
+    )
+    heightmap = landscape.save(args.tiled)
+    if args.sealevel is not None:
+        for row in heightmap:
+            row[row < args.sealevel] = args.sealevel
+        heightmap.flush()
+
+
 def main(args):
-    print("seed:", args.seed)
-    if args.one:
-        plot_1d(args)
+    if args.profile is not None:
+        profiling.enable(args.profile)
+
+    print("seed:", " ".join(str(seed) for seed in args.seed))
+    if args.tiled is not None:
+        stage = save_tiled
+    elif args.save is not None:
+        stage = save_batch
+    elif args.mesh is not None:
+        stage = mesh_2d
+    elif args.raster:
+        stage = raster_2d
+    elif args.one:
+        stage = plot_1d
     else:
-        plot_2d(args)
+        stage = plot_2d
+
+    with profiling.stage(stage.__name__, heightmaps=len(combinations(args))):
+        stage(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+"""Report the accuracy and speed of the automata in single precision against double precision."""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from natural.automata.heat import istep
+from natural.automata.reaction_diffusion import gray_scott
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument(
+        "--model",
+        choices=("heat", "gray-scott"),
+        nargs="+",
+        default=["heat", "gray-scott"],
+        help="The automata to compare.",
+    )
+    parser.add_argument(
+        "--size", "-n", type=int, nargs="+", default=[256, 1024], help="The grid sizes to compare."
+    )
+    parser.add_argument(
+        "--iterations", "-i", type=int, default=1000, help="The number of time steps to take."
+    )
+    parser.add_argument("--seed", type=int, default=1, help="The Gray-Scott random seed.")
+
+    return parser.parse_args()
+
+
+def heat(size, iterations, dtype, seed):
+    """Get the final heat domain."""
+    return (next(istep(size, size, 0, 10, stride=iterations, dtype=dtype)).copy(),)
+
+
+def reaction(size, iterations, dtype, seed):
+    """Get the final Gray-Scott U and V concentrations."""
+    np.random.seed(seed)
+    return gray_scott(
+        size, iterations, 0.14, 0.06, 0.035, 0.065, 0.02, size // 8, 0.5, 0.25, dtype=dtype
+    )
+
+
+MODELS = {"heat": heat, "gray-scott": reaction}
+
+
+def run(model, size, iterations, dtype, seed):
+    start = time.perf_counter()
+    result = MODELS[model](size, iterations, dtype, seed)
+    return result, time.perf_counter() - start
+
+
+def main(args):
+    print(
+        "{:<10} {:>6} {:>10} {:>10} {:>8} {:>10} {:>12} {:>12}".format(
+            "model", "size", "f64 [s]", "f32 [s]", "speedup", "f32 [MiB]", "max error", "rel L2"
+        )
+    )
+    for model, size in itertools.product(args.model, args.size):
+        # Run each precision once beforehand to compile the kernels.
+        for dtype in (np.float64, np.float32):
+            run(model, 8, 1, dtype, args.seed)
+        reference, reference_time = run(model, size, args.iterations, np.float64, args.seed)
+        single, single_time = run(model, size, args.iterations, np.float32, args.seed)
+
+        error = max(np.abs(r - s.astype(np.float64)).max() for r, s in zip(reference, single))
+        relative = np.sqrt(
+            sum(np.sum((r - s) ** 2) for r, s in zip(reference, single))
+            / sum(np.sum(r ** 2) for r in reference)
+        )
+        print(
+            "{:<10} {:>6} {:>10.3f} {:>10.3f} {:>7.2f}x {:>10.1f} {:>12.3g} {:>12.3g}".format(
+                model,
+                size,
+                reference_time,
+                single_time,
+                reference_time / single_time,
+                sum(s.nbytes for s in single) / 1024 ** 2,
+                error,
+                relative,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,61 @@
+import argparse
+import os
+
+from natural.lindenmayer.config import load_cylinders
+from natural.lindenmayer.raster import render
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Render a preview of an L-system configuration without Blender."
+    )
+
+    parser.add_argument(
+        "input",
+        type=str,
+        help="The configuration, or generated cylinders or instances JSON file to render.",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default=None,
+        help="The .png or .svg file to write. Defaults to the input with a .png extension.",
+    )
+    parser.add_argument("--width", type=int, default=800, help="The image width in pixels.")
+    parser.add_argument("--height", type=int, default=800, help="The image height in pixels.")
+    parser.add_argument(
+        "--azimuth", type=float, default=0, help="The camera angle around the Z axis, in degrees."
+    )
+    parser.add_argument(
+        "--elevation", type=float, default=0, help="The camera angle above the ground, in degrees."
+    )
+    parser.add_argument(
+        "--perspective",
+        type=float,
+        default=None,
+        help="Use a perspective camera this many scene radii away, instead of an orthographic one.",
+    )
+
+    return parser.parse_args()
+
+
+def main(args):
+    # Accept the configurations, and the cylinders or instances generate.py dumps.
+    clist = load_cylinders(args.input)
+    output = args.output or os.path.splitext(args.input)[0] + ".png"
+
+    print("Rendering {} cylinders to {}".format(len(clist), output))
+    render(
+        clist,
+        output,
+        width=args.width,
+        height=args.height,
+        azimuth=args.azimuth,
+        elevation=args.elevation,
+        perspective=args.perspective,
+    )
+
+
+if __name__ == "__main__":
+    main(parse_args())
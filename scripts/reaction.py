@@ -3,13 +3,15 @@ import argparse
 import sys
 from datetime import datetime
 
-import matplotlib.pyplot as plt
-import seaborn as sns
-
+from natural import profiling
+from natural.automata.checkpoint import Checkpointer, load_checkpoint
 from natural.automata.reaction_diffusion import gray_scott
+from natural.frames import frame_writer
+from natural.plotting import configure
+from natural.progress import Progress
 
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description=__doc__)
     plot = parser.add_argument_group()
 
@@ -34,6 +36,38 @@ def parse_args():
         "--iterations", "-i", type=int, default=1000, help="The number of iterations."
     )
 
+    runtime.add_argument(
+        "--dtype",
+        choices=("float32", "float64"),
+        default=None,
+        help="The precision to simulate in. Defaults to float32 for large grids.",
+    )
+    runtime.add_argument(
+        "--epsilon",
+        type=float,
+        default=None,
+        help="Only update the tiles that changed by more than this in the last step. "
+        "Zero is exact, and skips the quiescent parts of the grid.",
+    )
+    runtime.add_argument(
+        "--tile", type=int, default=32, help="The size of the tiles to track the activity of."
+    )
+
+    frames = parser.add_argument_group()
+    frames.add_argument(
+        "--frames", type=str, default=None, help="The directory to write PNG frames of U to."
+    )
+    frames.add_argument(
+        "--video", type=str, default=None, help="The video file to encode frames of U to."
+    )
+    frames.add_argument(
+        "--frame-every", type=int, default=10, help="The number of iterations between frames."
+    )
+    frames.add_argument("--fps", type=int, default=30, help="The video frame rate.")
+    frames.add_argument(
+        "--frame-scale", type=int, default=1, help="Repeat each cell this many times in the frames."
+    )
+
     init = parser.add_argument_group()
     init.add_argument(
         "--radius",
@@ -62,23 +96,93 @@ def parse_args():
         help="The scale of the initial uniform distribution.",
     )
 
-    return parser.parse_args()
+    state = parser.add_argument_group()
+    state.add_argument(
+        "--checkpoint",
+        type=str,
+        default=None,
+        help="The filename to periodically save the model state to.",
+    )
+    state.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=1000,
+        help="The number of iterations between checkpoints.",
+    )
+    state.add_argument(
+        "--resume", type=str, default=None, help="The checkpoint filename to resume from."
+    )
+    state.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Append the time and memory used by each stage to the given JSON lines file.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.frames is not None and args.video is not None:
+        parser.error("Write either --frames or a --video, not both.")
+    return args
 
 
 def main(args):
-    u, v = gray_scott(
-        args.size,
-        args.iterations,
-        args.ru,
-        args.rv,
-        args.feed,
-        args.kill,
-        args.scale,
-        args.radius,
-        args.u0,
-        args.v0,
+    if args.profile is not None:
+        profiling.enable(args.profile)
+
+    start = load_checkpoint(args.resume)["step"] if args.resume is not None else 0
+    checkpoint = None
+    if args.checkpoint is not None:
+        checkpoint = Checkpointer(args.checkpoint, args.checkpoint_every, start)
+    frames = frame_writer(
+        args.frames,
+        args.video,
+        args.fps,
+        args.frame_every,
+        start,
+        cmap="jet",
+        vmin=0,
+        vmax=1,
+        scale=args.frame_scale,
     )
 
+    progress = Progress(label="gray-scott")
+    try:
+        with profiling.stage("simulate", size=args.size, iterations=args.iterations):
+            u, v = gray_scott(
+                args.size,
+                args.iterations,
+                args.ru,
+                args.rv,
+                args.feed,
+                args.kill,
+                args.scale,
+                args.radius,
+                args.u0,
+                args.v0,
+                checkpoint=checkpoint,
+                resume=args.resume,
+                progress=progress,
+                dtype=args.dtype,
+                epsilon=args.epsilon,
+                tile=args.tile,
+                frames=frames,
+            )
+    finally:
+        progress.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if frames is not None:
+            frames.close()
+
+    with profiling.stage("plot"):
+        plot(args, u, v)
+
+
+def plot(args, u, v):
+    configure()
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     if args.uv:
         _, axes = plt.subplots(1, 2)
         axes = iter(axes.flatten())
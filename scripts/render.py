@@ -2,18 +2,33 @@ import argparse
 import json
 import sys
 
+from natural import profiling
 from natural.lindenmayer import Graphics
+from natural.lindenmayer.spatial import partition
+from natural.progress import Progress
 
 
 def parse_args(argv):
     parser = argparse.ArgumentParser(description="Draw a collection of cylinders on Blender.")
 
-    parser.add_argument("cylinders", type=str, help="The cylinders JSON file to use.")
+    parser.add_argument("cylinders", type=str, help="The cylinders or instances JSON file to use.")
 
     parser.add_argument("--job", type=int, default=None, help="This script's job number.")
     parser.add_argument("--jobs", type=int, default=None, help="The total number of jobs.")
+    parser.add_argument(
+        "--partition",
+        choices=["slice", "spatial"],
+        default="slice",
+        help="Give each job a slice of the cylinders in file order, or a compact region of them.",
+    )
 
     parser.add_argument("output", type=str, help="The the output filename.")
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Append the time and memory used by each stage to the given JSON lines file.",
+    )
 
     return parser.parse_args(argv)
 
@@ -24,16 +39,30 @@ def parse_json(filename):
 
 
 def main(args):
+    if args.profile is not None:
+        profiling.enable(args.profile)
+
     # TODO: Validate the JSON file.
-    clist = parse_json(args.cylinders)
+    with profiling.stage("load"):
+        clist = parse_json(args.cylinders)
+
+    if "prototypes" in clist:
+        # The instances are drawn as linked duplicates, so there's no need to split them into jobs.
+        with profiling.stage("draw", prototypes=len(clist["prototypes"])):
+            Graphics.draw_instanced(clist, args.output)
+        return
 
     start = None
     stop = None
 
     if args.job is not None and args.jobs is not None:
-        chunksize = len(clist) // args.jobs
-        start = args.job * chunksize
-        stop = start + chunksize
+        if args.partition == "spatial":
+            # Give each job the cylinders of one region, so the jobs' objects don't overlap.
+            clist = partition(clist, args.jobs)[args.job]
+        else:
+            chunksize = len(clist) // args.jobs
+            start = args.job * chunksize
+            stop = start + chunksize
 
     if start is not None or stop is not None:
         clist = clist[start:stop]
@@ -44,7 +73,9 @@ def main(args):
             cylinders[c["length"]] = [c]
         else:
             cylinders[c["length"]].append(c)
-    Graphics.draw(cylinders, args.output)
+    with profiling.stage("draw", job=args.job, cylinders=len(clist)):
+        label = "job {}".format(args.job) if args.job is not None else "draw"
+        Graphics.draw(cylinders, args.output, Progress(label=label))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+"""Submit a job to a running scripts/worker.py service, and wait for it to finish."""
+import argparse
+import json
+import os
+import sys
+
+from natural.profiling import RUN_VARIABLE
+from natural.service import request
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        epilog="""Examples: `submit.py reaction --size 256 --output gs.png` or
+    `submit.py --config data/a.json generate --prune`""",
+    )
+
+    parser.add_argument(
+        "--socket", type=str, default="natural.sock", help="The worker's Unix socket."
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default=None,
+        help="Send the contents of this JSON file with the job, to pass as its first argument.",
+    )
+    parser.add_argument(
+        "--detach",
+        action="store_true",
+        default=False,
+        help="Print the job id and exit, rather than waiting for the job to finish.",
+    )
+    parser.add_argument(
+        "--wait", type=int, nargs="+", default=None, help="Wait for the given job ids to finish."
+    )
+    parser.add_argument(
+        "--status", type=int, nargs="+", default=None, help="Print the status of the given job ids."
+    )
+    parser.add_argument(
+        "--shutdown",
+        action="store_true",
+        default=False,
+        help="Stop the worker once its queued jobs finish.",
+    )
+    parser.add_argument("script", type=str, nargs="?", help="The script to run.")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="The script's arguments.")
+
+    args = parser.parse_args()
+    if args.script is None and args.wait is None and args.status is None and not args.shutdown:
+        parser.error("Nothing to do. Give a script to run, or --wait, --status, or --shutdown.")
+    return args
+
+
+def report(result):
+    """Print a job's result, returning whether it succeeded."""
+    print(
+        "Job {} {} in {:.2f} s, see {}".format(
+            result["id"], result["status"], result["seconds"], result["log"]
+        )
+    )
+    if result["error"] is not None:
+        print(result["error"], file=sys.stderr)
+    return result["status"] == "done"
+
+
+def main(args):
+    ok = True
+    if args.script is not None:
+        job = {"script": args.script, "args": args.args, "cwd": os.getcwd()}
+        if args.config is not None:
+            with open(args.config, "r") as infile:
+                job["config"] = json.load(infile)
+            # The scripts name their outputs after the config file.
+            job["config_name"] = os.path.basename(args.config)
+        # Group the profiles of the jobs of one batch under a single run.
+        if RUN_VARIABLE in os.environ:
+            job["env"] = {RUN_VARIABLE: os.environ[RUN_VARIABLE]}
+
+        job = request(args.socket, "submit", job=job)["id"]
+        if args.detach:
+            print(job)
+        else:
+            ok = report(request(args.socket, "wait", id=job))
+
+    for job in args.status or ():
+        print(json.dumps(request(args.socket, "status", id=job)))
+    for job in args.wait or ():
+        ok = report(request(args.socket, "wait", id=job)) and ok
+    if args.shutdown:
+        request(args.socket, "shutdown")
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main(parse_args())
+    except ConnectionError as error:
+        sys.exit(str(error))
+    except RuntimeError as error:
+        sys.exit("The worker rejected the request: {}".format(error))
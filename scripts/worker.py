@@ -0,0 +1,54 @@
+"""Run a long lived worker service for the jobs submitted by scripts/submit.py.
+
+Run it with Python for the L-system, reaction, heat, automaton, and landscape scripts, or in
+Blender to also run the Blender render and join scripts:
+
+    blender --background --python scripts/worker.py -- --socket natural.sock
+"""
+import argparse
+import sys
+
+from natural.service import Service
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+
+    parser.add_argument(
+        "--socket", type=str, default="natural.sock", help="The Unix socket to listen on."
+    )
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=1, help="The number of jobs to run at once."
+    )
+    parser.add_argument(
+        "--results",
+        type=str,
+        default="results",
+        help="The directory to write each job's spec, log, and result to.",
+    )
+    parser.add_argument(
+        "--no-warm-up",
+        action="store_true",
+        default=False,
+        help="Skip loading the compiled kernels with small runs of the scripts on start up.",
+    )
+
+    return parser.parse_args(argv)
+
+
+def main(args):
+    service = Service(args.socket, args.jobs, args.results, warm_up=not args.no_warm_up)
+    print("Listening on {} with {} jobs...".format(args.socket, args.jobs), flush=True)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    # Blender passes the script arguments after '--'.
+    if "--" in sys.argv:
+        argv = sys.argv[sys.argv.index("--") + 1 :]
+
+    main(parse_args(argv))
@@ -1,20 +1,135 @@
 #!/usr/bin/env python3
 import argparse
+import collections
+import json
 import pstats
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Analyze the profiler results.")
-    parser.add_argument("statsfile", help="The profiler output file.")
+    parser.add_argument(
+        "statsfiles",
+        nargs="+",
+        help="The profiler output file, or the JSON lines trace files written by --profile.",
+    )
+    parser.add_argument(
+        "--by",
+        choices=["run", "file"],
+        default="run",
+        help="Compare the runs recorded in the traces, or treat each trace file as a single run.",
+    )
 
     return parser.parse_args()
 
 
+def is_trace(filename):
+    """Check whether a file is a trace written by --profile, rather than a profiler output file.
+
+    Traces are recognized by their first line, since --profile accepts any filename.
+    """
+    with open(filename, "rb") as f:
+        line = f.readline(1 << 16)
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(record, dict) and "stage" in record
+
+
+def load_traces(filenames, by="run"):
+    """Group the records of the given trace files by run, in the order they were first seen."""
+    runs = collections.OrderedDict()
+    for filename in filenames:
+        with open(filename, "r") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    runs.setdefault(record["run"] if by == "run" else filename, []).append(record)
+    return runs
+
+
+def aggregate(records):
+    """Total each stage's calls, wall time, and CPU time, across every process of a run.
+
+    The longest single call is kept too, since parallel jobs overlap in wall time.
+    """
+    stages = {}
+    for record in records:
+        stage = stages.setdefault(
+            record["stage"], {"calls": 0, "wall": 0.0, "longest": 0.0, "cpu": 0.0, "rss": None}
+        )
+        stage["calls"] += 1
+        stage["wall"] += record["wall"]
+        stage["longest"] = max(stage["longest"], record["wall"])
+        stage["cpu"] += record["cpu"]
+        if record.get("peak_rss_mb") is not None:
+            stage["rss"] = max(stage["rss"] or 0, record["peak_rss_mb"])
+    return stages
+
+
+def print_summary(run, stages):
+    print(run)
+    print(
+        "    {:<32} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+            "stage", "calls", "wall [s]", "max [s]", "cpu [s]", "peak [MiB]"
+        )
+    )
+    # Sorting the '/' separated paths puts each stage just before its sub-stages.
+    for name in sorted(stages):
+        stage = stages[name]
+        print(
+            "    {:<32} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10}".format(
+                name,
+                stage["calls"],
+                stage["wall"],
+                stage["longest"],
+                stage["cpu"],
+                "{:.1f}".format(stage["rss"]) if stage["rss"] is not None else "-",
+            )
+        )
+
+
+def print_comparison(runs):
+    """Print each stage's total wall time per run, relative to the first run."""
+    totals = collections.OrderedDict((run, aggregate(records)) for run, records in runs.items())
+    names = sorted(set().union(*totals.values()))
+    baseline = next(iter(totals.values()))
+
+    print("Wall time [s] relative to", next(iter(totals)))
+    for i, run in enumerate(totals):
+        print("    [{}] {}".format(i, run))
+    print("    {:<32} ".format("stage") + " ".join("{:>18}".format(i) for i in range(len(totals))))
+    for name in names:
+        cells = []
+        for stages in totals.values():
+            if name not in stages:
+                cells.append("{:>18}".format("-"))
+                continue
+            wall = stages[name]["wall"]
+            if name in baseline and baseline[name]["wall"] > 0:
+                cells.append("{:>10.3f} ({:>5.2f}x)".format(wall, wall / baseline[name]["wall"]))
+            else:
+                cells.append("{:>18.3f}".format(wall))
+        print("    {:<32} ".format(name) + " ".join(cells))
+
+
 def main(args):
-    p = pstats.Stats(args.statsfile)
+    traces = [filename for filename in args.statsfiles if is_trace(filename)]
+    if traces:
+        runs = load_traces(traces, args.by)
+        for run, records in runs.items():
+            print_summary(run, aggregate(records))
+            print()
+        if len(runs) > 1:
+            print_comparison(runs)
+
+    for statsfile in args.statsfiles:
+        if statsfile in traces:
+            continue
+        p = pstats.Stats(statsfile)
 
-    p.strip_dirs().sort_stats("cumulative").print_stats(10)
-    p.strip_dirs().sort_stats("tottime").print_stats(10)
+        p.strip_dirs().sort_stats("cumulative").print_stats(10)
+        p.strip_dirs().sort_stats("tottime").print_stats(10)
 
 
 if __name__ == "__main__":